@@ -1,93 +1,43 @@
+from __future__ import annotations
+
 import argparse
 import os
-import subprocess
 import sys
+from typing import TYPE_CHECKING
 
-import tiktoken
-from pydantic import BaseModel, Field
-
-from .utils.config import read_config, read_version_from_pyproject
-from .utils.llm_wrapper import chat
-from .utils.prompts import (
-    COMMIT_PROMPT_SYSTEM,
-    COMMIT_PROMPT_WITH_DESCRIPTION,
+from .utils.amend import amend_base, incremental_amend_enabled, record_commit
+from .utils.diff import FormattedDiff, build_diff, format_diff
+from .utils.generate import (
+    generate_commit_message,
+    generate_for_diff,
+    update_commit_message,
 )
+from .utils.git import DiffSnapshot, Revisions, commit, head_commit, stream_diff
+from .utils.profiles import parse_profile
+from .utils.trace import enable as enable_tracing
+from .utils.trace import span
+from .utils.trivial import fast_path_enabled
 
-CONFIG: dict = read_config()
-MAX_LINE_LENGTH: int = CONFIG.get("MAX_LINE_LENGTH", 300)
-MAX_TOKENS_ALLOWED: int = CONFIG.get("MAX_TOKENS_ALLOWED", 30000)
-VERSION: str = read_version_from_pyproject()
-
-
-class CommitMessage(BaseModel):
-    thinking: str = Field(
-        ...,
-        description="A scratchpad to put your concise reasoning and chain of thought after looking at the diffs.",
-    )
-    commit_message: str = Field(
-        ..., description="Brief descriptive commit message in no longer than 10 words"
-    )
-    commit_description: str = Field(
-        ..., description="Hyphenated bullet point list of changes"
-    )
-
-
-def format_diff(diff_text: str) -> str:
-    file_changes: dict[str, list[tuple[str, str]]] = {}
-    current_file: str = ""
+if TYPE_CHECKING:
+    from .utils.schemas import CommitMessage
+    from .utils.trivial import TrivialChange
 
-    for line in diff_text.split("\n"):
-        if line.startswith("diff --git"):
-            current_file = line.split()[-1].lstrip("b/")
-            file_changes[current_file] = []
-        elif line.startswith("+") and not line.startswith("+++"):
-            if current_file:
-                file_changes[current_file].append(
-                    ("add", line[1:MAX_LINE_LENGTH].strip())
-                )
-        elif line.startswith("-") and not line.startswith("---"):
-            if current_file:
-                file_changes[current_file].append(
-                    ("remove", line[1:MAX_LINE_LENGTH].strip())
-                )
-
-    # Format into a structured output
-    formatted_diff_text: str = "### Git Changes Summary ###\n\n"
-    for filename, changes in file_changes.items():
-        formatted_diff_text += f"File: {filename}\n"
-        formatted_diff_text += "Changes:\n"
-        limit: int = 30 if filename.endswith(".lock") else 2000
-        for change_type, content in changes[:limit]:
-            prefix = "+" if change_type == "add" else "-"
-            formatted_diff_text += f"{prefix} {content}\n"
-        if len(changes) > limit:
-            formatted_diff_text += (
-                f"\n... ({len(changes) - limit} additional changes truncated)\n"
-            )
-        formatted_diff_text += "\n"
-
-    return formatted_diff_text
+# Heavy dependencies (tiktoken, openai, pydantic) and the config file are only
+# loaded by the phase that needs them, so `--version`, `--init` and the early
+# "nothing to commit" exits stay fast.
 
 
-def generate_commit_message(diff_text: str) -> CommitMessage:
-    tokenizer: tiktoken.Encoding = tiktoken.encoding_for_model("gpt-4o")
-    if not diff_text:
-        return "No changes to commit", ""
+class _VersionAction(argparse.Action):
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, help=None):
+        super().__init__(
+            option_strings, dest=dest, default=argparse.SUPPRESS, nargs=0, help=help
+        )
 
-    token_list: list[int] = tokenizer.encode(diff_text)
-    truncated_tokens: list[int] = token_list[:MAX_TOKENS_ALLOWED]
-    truncated_diff: str = tokenizer.decode(truncated_tokens)
+    def __call__(self, parser, namespace, values, option_string=None):
+        from .utils.config import read_version_from_pyproject
 
-    try:
-        llm_response: CommitMessage = chat(
-            system_prompt=COMMIT_PROMPT_SYSTEM(),
-            user_prompt=COMMIT_PROMPT_WITH_DESCRIPTION(truncated_diff),
-            response_model=CommitMessage,
-        )
-    except Exception as e:
-        print(f"Error generating commit message: {e}")
-        raise e
-    return llm_response
+        print(f"{parser.prog} {read_version_from_pyproject()}")
+        parser.exit()
 
 
 def _initialize() -> bool:
@@ -110,6 +60,12 @@ def _initialize() -> bool:
     return True
 
 
+def _show_title(name: str, value: object) -> None:
+    # Streamed: the title shows while the description is still being written
+    if name == "commit_message":
+        print(f"Commit message: {value}", flush=True)
+
+
 def gencommit():
     arg_parser: argparse.ArgumentParser = argparse.ArgumentParser()
     arg_parser.add_argument("-m", type=str, help="Override commit message")
@@ -118,9 +74,85 @@ def gencommit():
         "--init", "--initialize", action="store_true", help="Initialize gen-commit"
     )
     arg_parser.add_argument(
-        "--version", "--v", action="version", version=f"%(prog)s {VERSION}"
+        "--no-cache",
+        action="store_true",
+        help="Always ask the model, ignoring cached messages",
+    )
+    arg_parser.add_argument(
+        "--force-llm",
+        action="store_true",
+        help="Ask the model even for changes gencommit can describe on its own "
+        "(version bumps, lockfiles, formatting, renames, deletions)",
+    )
+    arg_parser.add_argument(
+        "--response-profile",
+        metavar="PROFILE",
+        help="What the model writes: full (with a reasoning scratchpad), lean, "
+        "title or bullets:N. Overrides RESPONSE_PROFILE",
+    )
+    arg_parser.add_argument(
+        "--reword",
+        metavar="REV_RANGE",
+        help="Regenerate messages for every commit in a range ending at HEAD",
+    )
+    arg_parser.add_argument(
+        "--split",
+        action="store_true",
+        help="Group the staged changes into related sets of files and commit "
+        "each set separately with its own message",
+    )
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of concurrent LLM requests for --reword, --split and --batch",
+    )
+    arg_parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Read JSON line requests (a diff, or a repo and rev range) from stdin "
+        "and write a JSON line with each message to stdout as it is ready",
+    )
+    arg_parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run a background server that keeps gencommit warm for faster commits",
+    )
+    arg_parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Generate in this process even if a daemon is running",
+    )
+    arg_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Pre-generate messages in the background whenever the index changes",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        metavar="TRACE_FILE",
+        help="Print where the time went; with TRACE_FILE, also write a trace "
+        "(.jsonl for JSON lines, otherwise Chrome trace format)",
+    )
+    arg_parser.add_argument(
+        "--version",
+        "--v",
+        action=_VersionAction,
+        help="show program's version number and exit",
     )
     found_args, unknown_args = arg_parser.parse_known_args()
+    enable_tracing(
+        summary=found_args.profile is not None, output=found_args.profile or None
+    )
+
+    profile: str | None = found_args.response_profile
+    if profile is not None:
+        try:
+            parse_profile(profile)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
 
     has_message: bool = found_args.m is not None
     has_description: bool = found_args.d is not None
@@ -134,61 +166,159 @@ def gencommit():
             print("gen-commit initialization failed.")
             sys.exit(1)
 
-    try:
-        # Check if there are any commits
-        subprocess.check_output(
-            ["git", "rev-parse", "--verify", "HEAD"], text=True
-        ).strip()
-        commits_exist = True
-    except subprocess.CalledProcessError:
-        commits_exist = False
-
-    if "-a" in unknown_args:
-        # Check for unstaged changes
-        unstaged_changes = subprocess.check_output(
-            ["git", "status", "--porcelain"],
-            text=True,
-        ).strip()
-        if not unstaged_changes:
-            print("No changes detected.")
-            sys.exit(1)
+    if found_args.daemon:
+        from .utils.daemon import serve
+
+        sys.exit(0 if serve() else 1)
+
+    if found_args.watch:
+        from .utils.watch import watch
+
+        sys.exit(0 if watch() else 1)
+
+    if found_args.batch:
+        from .utils.batch import batch
+
+        success = batch(
+            workers=found_args.workers,
+            use_cache=not found_args.no_cache,
+            fast_path=not found_args.force_llm,
+            profile=profile,
+        )
+        sys.exit(0 if success else 1)
+
+    if found_args.reword:
+        from .utils.reword import reword
+
+        success = reword(
+            found_args.reword,
+            workers=found_args.workers,
+            use_cache=not found_args.no_cache,
+            profile=profile,
+        )
+        sys.exit(0 if success else 1)
+
+    if found_args.split:
+        from .utils.split import split
 
-    staged_changes = subprocess.check_output(
-        ["git", "diff", "--staged", "--name-only"],
-        text=True,
-    ).strip()
-    if not staged_changes and "-a" not in unknown_args:
-        print("No changes staged for commit.")
-        sys.exit(1)
+        success = split(
+            unknown_args,
+            workers=found_args.workers,
+            use_cache=not found_args.no_cache,
+            fast_path=not found_args.force_llm,
+            profile=profile,
+        )
+        sys.exit(0 if success else 1)
+
+    commit_all: bool = "-a" in unknown_args
+    with span("git.head"):
+        head: str | None = head_commit()
+        commits_exist: bool = head is not None
+
+        # With -a, diff exactly what `git commit -a` would record: tracked
+        # changes against HEAD, staged or not
+        diff_args: list[str] = ["HEAD"] if commit_all and commits_exist else ["--staged"]
+        revisions: Revisions = Revisions("HEAD", None if commit_all else "")
+        previous_message: str | None = None
+        if "--amend" in unknown_args and commits_exist and incremental_amend_enabled():
+            # Only what changed since HEAD's message was written
+            previous_message, base_tree = amend_base()
+            diff_args = [base_tree] if commit_all else ["--staged", base_tree]
+            revisions = Revisions(base_tree, None if commit_all else "")
+
+    ready_message: dict | None = None
+    # A speculative message may have come from the fast path, and it
+    # describes a new commit on top of HEAD, never an amend. Finding it takes
+    # only HEAD and the staged tree, so on a hit the diff is never read.
+    if (
+        commits_exist
+        and not found_args.no_cache
+        and not commit_all
+        and not found_args.force_llm
+        and previous_message is None
+    ):
+        from .utils.watch import get_speculative_message
+
+        with span("speculative") as speculative_span:
+            ready_message = get_speculative_message(head, profile)
+            speculative_span.set(hit=ready_message is not None)
+
+    if ready_message is None:
+        with span("git.snapshot") as snapshot_span:
+            snapshot: DiffSnapshot = DiffSnapshot(*diff_args)
+            snapshot_span.set(files=len(snapshot.files))
+        if not snapshot.files:
+            snapshot.close()
+            if previous_message is not None:
+                print("No changes since the last commit message was written.")
+            else:
+                print(
+                    "No changes detected." if commit_all else "No changes staged for commit."
+                )
+            sys.exit(1)
 
     commit_message: str
     commit_description: str
     if commits_exist:
-        diff_output: str = subprocess.check_output(
-            ["git", "diff", "--staged"], text=True
-        ).strip()
-        formatted_diff: str = format_diff(diff_output)
-        commit_message_object: CommitMessage = generate_commit_message(
-            diff_text=formatted_diff
+        # A trivial amend still has to keep the rest of the message
+        fast_path: bool = (
+            not found_args.force_llm
+            and previous_message is None
+            and fast_path_enabled()
         )
-        commit_message = commit_message_object.commit_message
-        commit_description = commit_message_object.commit_description
+        if ready_message is None and not found_args.no_daemon:
+            from .utils.daemon import request_commit_message
+
+            with span("daemon") as daemon_span:
+                ready_message = request_commit_message(
+                    snapshot.chunks(),
+                    revisions,
+                    use_cache=not found_args.no_cache,
+                    fast_path=fast_path,
+                    previous_message=previous_message,
+                    response_profile=profile,
+                )
+                daemon_span.set(used=ready_message is not None)
+        if ready_message is not None:
+            commit_message = ready_message["commit_message"]
+            commit_description = ready_message["commit_description"]
+        else:
+            formatted_diff: FormattedDiff = build_diff(
+                snapshot.lines(), revisions=revisions
+            )
+            commit_message_object: CommitMessage | TrivialChange
+            if previous_message is not None:
+                commit_message_object = update_commit_message(
+                    previous_message,
+                    formatted_diff.text,
+                    use_cache=not found_args.no_cache,
+                    profile=profile,
+                )
+            elif formatted_diff.trivial is not None and fast_path:
+                # Nothing the model could add; no request, no API key needed
+                commit_message_object = formatted_diff.trivial
+            else:
+                commit_message_object = generate_for_diff(
+                    formatted_diff,
+                    lambda: stream_diff(*diff_args),
+                    use_cache=not found_args.no_cache,
+                    profile=profile,
+                    on_field=_show_title if sys.stdout.isatty() else None,
+                )
+            commit_message = commit_message_object.commit_message
+            commit_description = commit_message_object.commit_description
     else:
+        snapshot.close()
         commit_message: str = found_args.m if has_message else "Initial commit"
         commit_description: str = found_args.d if has_description else ""
 
-    commit_message = commit_message.replace('"', '\\"')
-    commit_description = commit_description.replace('"', '\\"')
-
-    commit_command: str
+    full_message: str = commit_message
     if commit_description:
-        commit_command = f"""git commit {" ".join(unknown_args)} -m "{commit_message}" -m "{commit_description}" """
-    else:
-        commit_command = (
-            f"""git commit {" ".join(unknown_args)} -m "{commit_message}" """
-        )
-
-    subprocess.run(commit_command, shell=True, check=True)
+        full_message += f"\n\n{commit_description}"
+    # Includes any commit hooks
+    with span("git.commit"):
+        commit(unknown_args, full_message)
+    record_commit()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+import subprocess
+
+from .cache import DiskCache, make_key
+from .config import get_config
+from .git import rev_parse, tree_and_message
+
+# After every commit gencommit remembers which tree its message describes.
+# `git commit --amend` keeps the parents and (with --no-edit) the message, so
+# an amend can look up the tree the current message was written for and send
+# only what changed since, instead of the whole commit again.
+
+
+def incremental_amend_enabled() -> bool:
+    return get_config().get("INCREMENTAL_AMEND", "on") != "off"
+
+
+def _key(parents: str, message: str) -> str:
+    return make_key("amend", parents, message)
+
+
+def record_commit() -> None:
+    try:
+        tree, parents, message = tree_and_message("HEAD")
+    except subprocess.CalledProcessError:
+        return
+    DiskCache("summarized").set(_key(parents, message), tree)
+
+
+def amend_base() -> tuple[str, str]:
+    # (message to update, tree it describes)
+    tree, parents, message = tree_and_message("HEAD")
+    base_tree: str | None = DiskCache("summarized").get(_key(parents, message))
+    if base_tree is None or base_tree == tree:
+        return message, tree
+    try:
+        # The tree may have been pruned along with the commit it came from
+        rev_parse(f"{base_tree}^{{tree}}")
+    except subprocess.CalledProcessError:
+        return message, tree
+    return message, base_tree
@@ -0,0 +1,155 @@
+import json
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import Iterable, Iterator, TextIO
+
+from .config import get_int
+from .diff import DIFF_HEADER, FormattedDiff, build_diff
+from .filters import FileFilter
+from .git import Revisions, merge_base, stream_commit_diff, stream_diff
+from .trivial import fast_path_enabled
+
+# `gencommit --batch` serves bots and CI from one process: a JSON request per
+# line on stdin, a JSON result per line on stdout as soon as it is ready (so
+# not necessarily in input order). A request carries a diff or a revision
+# range in a repository:
+#
+#   {"id": "pr-17", "diff": "diff --git a/app.py b/app.py\n..."}
+#   {"id": "pr-18", "repo": "/srv/app", "rev_range": "main...feature"}
+#
+# and gets back {"id", "commit_message", "commit_description"} or
+# {"id", "error"}. A request without an id is answered with its line number.
+# A request may also pick its own "response_profile".
+
+
+def _range_diff(rev_range: str, repo_dir: str | None) -> tuple[Iterator[str], Revisions]:
+    # "a..b" and "a...b" (from the merge base) as `git diff` reads them; a
+    # single revision is that commit's own changes
+    if "..." in rev_range:
+        first, second = rev_range.split("...", 1)
+        new: str = second or "HEAD"
+        old: str = merge_base(first or "HEAD", new, repo_dir=repo_dir)
+    elif ".." in rev_range:
+        old, new = (rev or "HEAD" for rev in rev_range.split("..", 1))
+    else:
+        return (
+            stream_commit_diff(rev_range, repo_dir=repo_dir),
+            Revisions(f"{rev_range}^", rev_range, repo_dir),
+        )
+    return stream_diff(old, new, repo_dir=repo_dir), Revisions(old, new, repo_dir)
+
+
+def _generate(
+    request: dict, use_cache: bool, fast_path: bool, profile: str | None
+) -> dict:
+    from .generate import generate_for_diff
+
+    repo_dir: str | None = request.get("repo")
+    revisions: Revisions | None = None
+    if isinstance(request.get("diff"), str):
+        lines: str | Iterator[str] = request["diff"]
+    elif isinstance(request.get("rev_range"), str):
+        lines, revisions = _range_diff(request["rev_range"], repo_dir)
+    else:
+        raise ValueError('A request needs a "diff" or a "rev_range"')
+
+    file_filter: FileFilter = FileFilter(repo_dir=repo_dir)
+    try:
+        formatted_diff: FormattedDiff = build_diff(
+            lines, file_filter=file_filter, revisions=revisions
+        )
+    finally:
+        file_filter.close()
+    if formatted_diff.text == DIFF_HEADER:
+        raise ValueError("No changes to describe")
+    if formatted_diff.trivial is not None and fast_path:
+        return {
+            "commit_message": formatted_diff.trivial.commit_message,
+            "commit_description": formatted_diff.trivial.commit_description,
+        }
+    def read_diff() -> Iterable[str]:
+        # Once more, to summarize a diff too large for one prompt
+        if revisions is None:
+            return request["diff"].splitlines()
+        return _range_diff(request["rev_range"], repo_dir)[0]
+
+    message = generate_for_diff(
+        formatted_diff,
+        read_diff,
+        use_cache=use_cache,
+        profile=request.get("response_profile") or profile,
+        repo_dir=repo_dir,
+    )
+    return {
+        "commit_message": message.commit_message,
+        "commit_description": message.commit_description,
+    }
+
+
+def _process(
+    line: str, line_number: int, use_cache: bool, fast_path: bool, profile: str | None
+) -> dict:
+    # Never raises: every failure becomes that request's error line
+    request_id: object = line_number
+    try:
+        request: object = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("Each line must be a JSON object")
+        request_id = request.get("id", line_number)
+        return {"id": request_id, **_generate(request, use_cache, fast_path, profile)}
+    except Exception as e:
+        return {"id": request_id, "error": str(e) or type(e).__name__}
+
+
+def batch(
+    workers: int | None = None,
+    use_cache: bool = True,
+    fast_path: bool = True,
+    profile: str | None = None,
+) -> bool:
+    from .generate import warm_up
+
+    if workers is None:
+        workers = get_int("BATCH_WORKERS", 8)
+    fast_path = fast_path and fast_path_enabled()
+    # Otherwise every worker builds its own client in the first requests
+    warm_up()
+
+    output: TextIO = sys.stdout
+    output_lock: threading.Lock = threading.Lock()
+    # A slot per request in flight. Reading waits for a free slot, so a
+    # producer faster than the model is held back by the pipe instead of
+    # piling requests up in memory.
+    slots: threading.BoundedSemaphore = threading.BoundedSemaphore(workers)
+    failures: int = 0
+    closed: bool = False
+
+    def write_result(future: Future) -> None:
+        nonlocal failures, closed
+        result: dict = future.result()
+        try:
+            with output_lock:
+                failures += "error" in result
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+        except BrokenPipeError:
+            closed = True  # Nobody is reading the results any more
+        finally:
+            slots.release()
+
+    # Anything else printed along the way (errors, warnings) would corrupt
+    # the JSON lines, so it goes to stderr
+    with redirect_stdout(sys.stderr), ThreadPoolExecutor(max_workers=workers) as executor:
+        for line_number, line in enumerate(sys.stdin, start=1):
+            if not line.strip():
+                continue
+            slots.acquire()
+            if closed:
+                break
+            future: Future = executor.submit(
+                _process, line, line_number, use_cache, fast_path, profile
+            )
+            future.add_done_callback(write_result)
+    return failures == 0 and not closed
@@ -0,0 +1,76 @@
+import math
+import os
+
+# Relative share of the token budget per kind of file. Anything not listed is
+# treated as source code (1.0).
+LOW_VALUE_NAMES: set[str] = {
+    "package-lock.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    "poetry.lock",
+    "uv.lock",
+    "Cargo.lock",
+    "go.sum",
+    "composer.lock",
+    "Gemfile.lock",
+}
+TYPE_WEIGHTS: dict[str, float] = {
+    ".lock": 0.1,
+    ".min.js": 0.1,
+    ".min.css": 0.1,
+    ".map": 0.1,
+    ".svg": 0.1,
+    ".snap": 0.2,
+    ".csv": 0.2,
+    ".tsv": 0.2,
+    ".json": 0.4,
+    ".xml": 0.4,
+    ".yaml": 0.6,
+    ".yml": 0.6,
+    ".toml": 0.6,
+    ".ini": 0.6,
+    ".cfg": 0.6,
+    ".md": 0.6,
+    ".rst": 0.6,
+    ".txt": 0.5,
+}
+
+
+def file_weight(path: str, total_changes: int) -> float:
+    name: str = os.path.basename(path)
+    type_weight: float = 1.0
+    if name in LOW_VALUE_NAMES:
+        type_weight = 0.1
+    else:
+        for suffix, weight in TYPE_WEIGHTS.items():
+            if name.endswith(suffix):
+                type_weight = weight
+                break
+    # Sublinear in size so one huge file can't starve the rest of the commit
+    return type_weight * math.sqrt(max(total_changes, 1))
+
+
+def allocate_budget(
+    needs: dict[str, int], weights: dict[str, float], budget: int
+) -> dict[str, int]:
+    # Water-filling: files that need less than their weighted share get exactly
+    # what they need, and the leftover is split again among the rest.
+    allocation: dict[str, int] = {path: 0 for path in needs}
+    remaining: dict[str, int] = {path: need for path, need in needs.items() if need > 0}
+
+    while remaining and budget > 0:
+        total_weight: float = sum(weights[path] for path in remaining)
+        satisfied: list[str] = [
+            path
+            for path, need in remaining.items()
+            if need <= budget * weights[path] / total_weight
+        ]
+        if not satisfied:
+            for path in remaining:
+                allocation[path] = int(budget * weights[path] / total_weight)
+            break
+        for path in satisfied:
+            allocation[path] = remaining.pop(path)
+            budget -= allocation[path]
+
+    return allocation
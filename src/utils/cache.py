@@ -0,0 +1,95 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from .config import get_cache_dir, get_int
+
+
+def make_key(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8", errors="replace"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    # One file per entry under <CACHE_DIR>/<namespace>. Reads refresh the
+    # entry's mtime, so eviction drops least recently used entries first.
+
+    def __init__(
+        self, namespace: str, max_bytes: int | None = None, max_age: float | None = None
+    ):
+        self.directory: str = os.path.join(get_cache_dir(), namespace)
+        self.max_bytes: int = (
+            max_bytes
+            if max_bytes is not None
+            else get_int("CACHE_MAX_MB", 50) * 1024 * 1024
+        )
+        self.max_age: float = (
+            max_age
+            if max_age is not None
+            else get_int("CACHE_MAX_AGE_DAYS", 30) * 24 * 60 * 60
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> str | None:
+        path: str = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                value: str = f.read()
+            os.utime(path)
+            return value
+        except OSError:
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        path: str = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write-then-rename so concurrent readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self.evict()
+
+    def delete(self, key: str) -> None:
+        _remove(self._path(key))
+
+    def evict(self) -> None:
+        now: float = time.time()
+        entries: list[tuple[float, int, str]] = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path: str = os.path.join(root, name)
+                try:
+                    stat: os.stat_result = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    _remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes: int = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            _remove(path)
+            total_bytes -= size
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,325 @@
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Iterable, Iterator
+
+from .diff import FileDiff
+
+# The compact encoding (DIFF_FORMAT=compact) rewrites collected file diffs so
+# the prompt spends its tokens on what changed, not on how much text moved:
+#
+#   File: src/api.py (renamed from src/handlers.py)
+#   Changes:
+#   @@ def create_user(request):
+#   ~ 12 lines changed whitespace only
+#   ~ moved 8 lines to src/validation.py: def validate_email(value):
+#   + return user (x3)
+#
+# Entries starting with "~ " summarize several change lines; `covers` records
+# how many, so elision counts stay exact. In files where indentation is
+# syntax (Python, YAML, ...) entries keep it, so a line that moved in or out
+# of a block is never counted as unchanged.
+
+# Shorter runs are too likely to match by accident
+MIN_MOVED_LINES: int = 3
+# A move never starts at a line this short (blank lines, closing braces)
+MIN_ANCHOR_CHARS: int = 4
+PREVIEW_CHARS: int = 80
+
+WHITESPACE_ONLY: str = "changed whitespace only"
+REORDERED: str = "reordered"
+
+_WHITESPACE: re.Pattern = re.compile(r"\s+")
+_COUNTED_SUMMARY: re.Pattern = re.compile(
+    rf"~ (\d+) lines? ({WHITESPACE_ONLY}|{REORDERED})"
+)
+
+Entry = list  # [text, covers]
+
+
+def _sign(entry: Entry) -> str:
+    return entry[0][:2] if entry[0][:2] in ("+ ", "- ") else ""
+
+
+def _normalized(entry: Entry) -> str:
+    # Whitespace removed, apart from any indentation the entry kept
+    text: str = entry[0][2:]
+    body: str = text.lstrip()
+    return text[: len(text) - len(body)] + _WHITESPACE.sub("", body)
+
+
+def _preview(entry: Entry) -> str:
+    return entry[0][2:].strip()[:PREVIEW_CHARS]
+
+
+def _summary(count: int, text: str, covers: int, kind: str = "") -> Entry:
+    # "~ 3 lines reordered", "~ 1 blank line added"
+    return [f"~ {count} {kind}{'line' if count == 1 else 'lines'} {text}", covers]
+
+
+def _sign_blocks(group: list[Entry]) -> list[list[Entry]]:
+    blocks: list[list[Entry]] = []
+    for entry in group:
+        if blocks and _sign(blocks[-1][0]) == _sign(entry):
+            blocks[-1].append(entry)
+        else:
+            blocks.append([entry])
+    return blocks
+
+
+def _collapse_pair(removed: list[Entry], added: list[Entry]) -> list[Entry]:
+    # A block of removals directly followed by a block of additions: the usual
+    # shape of an edit. Lines that match apart from whitespace (other than
+    # indentation that matters) are only counted.
+    matcher: SequenceMatcher = SequenceMatcher(
+        None,
+        [_normalized(e) for e in removed],
+        [_normalized(e) for e in added],
+        autojunk=False,
+    )
+    matched_old: set[int] = set()
+    matched_new: set[int] = set()
+    for old_start, new_start, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            if not _normalized(removed[old_start + offset]):
+                # Blank lines match anywhere; they say nothing about the edit
+                continue
+            matched_old.add(old_start + offset)
+            matched_new.add(new_start + offset)
+    reindented: int = len(matched_old)
+    kept: list[Entry] = [e for i, e in enumerate(removed) if i not in matched_old]
+    kept += [e for i, e in enumerate(added) if i not in matched_new]
+
+    if reindented:
+        kept.append(_summary(reindented, WHITESPACE_ONLY, 2 * reindented))
+    return kept
+
+
+def _merge_summaries(entries: list[Entry]) -> list[Entry]:
+    # "~ 2 lines changed whitespace only" once per re-indented method adds up
+    result: list[Entry] = []
+    for entry in entries:
+        match: re.Match | None = _COUNTED_SUMMARY.fullmatch(entry[0])
+        previous: re.Match | None = (
+            _COUNTED_SUMMARY.fullmatch(result[-1][0]) if result else None
+        )
+        if match and previous and match.group(2) == previous.group(2):
+            count: int = int(match.group(1)) + int(previous.group(1))
+            result[-1] = _summary(count, match.group(2), result[-1][1] + entry[1])
+        else:
+            result.append(entry)
+    return result
+
+
+def _collapse_edits(entries: list[Entry]) -> list[Entry]:
+    result: list[Entry] = []
+    group: list[Entry] = []
+    for entry in [*entries, ["", 0]]:
+        if _sign(entry):
+            group.append(entry)
+            continue
+        blocks: list[list[Entry]] = _sign_blocks(group)
+        index: int = 0
+        while index < len(blocks):
+            block: list[Entry] = blocks[index]
+            if (
+                _sign(block[0]) == "- "
+                and index + 1 < len(blocks)
+                and _sign(blocks[index + 1][0]) == "+ "
+            ):
+                result += _collapse_pair(block, blocks[index + 1])
+                index += 2
+            else:
+                result += block
+                index += 1
+        group = []
+        if entry[0]:
+            result.append(entry)
+    return result
+
+
+def _hunks(entries: list[Entry]) -> list[list[Entry]]:
+    hunks: list[list[Entry]] = [[]]
+    for entry in entries:
+        if entry[0].startswith("@@") and hunks[-1]:
+            hunks.append([])
+        hunks[-1].append(entry)
+    return hunks
+
+
+def _collapse_reorders(hunk: list[Entry]) -> list[Entry]:
+    # A line removed and added again within one hunk, at the same indentation,
+    # only moved past its context
+    moved: Counter = Counter(e[0][2:] for e in hunk if _sign(e) == "- ") & Counter(
+        e[0][2:] for e in hunk if _sign(e) == "+ "
+    )
+    moved.pop("", None)
+    if not moved:
+        return hunk
+    to_drop: dict[str, Counter] = {"- ": moved.copy(), "+ ": moved.copy()}
+    kept: list[Entry] = []
+    for entry in hunk:
+        sign: str = _sign(entry)
+        if sign and to_drop[sign][entry[0][2:]] > 0:
+            to_drop[sign][entry[0][2:]] -= 1
+        else:
+            kept.append(entry)
+    count: int = sum(moved.values())
+    return kept + [_summary(count, REORDERED, 2 * count)]
+
+
+def _mark_moves(files: list[FileDiff], entries: list[list[Entry]]) -> None:
+    # Blocks of removed lines that reappear as consecutive added lines
+    # (anywhere, ignoring indentation where it doesn't matter) become one
+    # line at each end
+    additions: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    for file_index, file_entries in enumerate(entries):
+        for index, entry in enumerate(file_entries):
+            if _sign(entry) == "+ ":
+                additions[_normalized(entry)].append((file_index, index))
+
+    used: set[tuple[int, int]] = set()
+    # (file, first index) -> (summary entry, entries replaced)
+    replacements: dict[tuple[int, int], tuple[Entry, int]] = {}
+    for file_index, file_entries in enumerate(entries):
+        index: int = 0
+        while index < len(file_entries):
+            if (
+                _sign(file_entries[index]) != "- "
+                or len(_normalized(file_entries[index]).lstrip()) < MIN_ANCHOR_CHARS
+            ):
+                index += 1
+                continue
+            best_length: int = 0
+            best_target: tuple[int, int] | None = None
+            for target_file, target_index in additions.get(_normalized(file_entries[index]), []):
+                length: int = 0
+                target_entries: list[Entry] = entries[target_file]
+                while (
+                    index + length < len(file_entries)
+                    and target_index + length < len(target_entries)
+                    and _sign(file_entries[index + length]) == "- "
+                    and _sign(target_entries[target_index + length]) == "+ "
+                    and (target_file, target_index + length) not in used
+                    and _normalized(file_entries[index + length])
+                    == _normalized(target_entries[target_index + length])
+                ):
+                    length += 1
+                if length > best_length:
+                    best_length, best_target = length, (target_file, target_index)
+            if best_length < MIN_MOVED_LINES:
+                index += 1
+                continue
+
+            target_file, target_index = best_target
+            used.update((target_file, target_index + k) for k in range(best_length))
+            preview: str = _preview(file_entries[index])
+            if target_file == file_index:
+                to_text, from_text = "elsewhere in this file", "elsewhere in this file"
+            else:
+                to_text, from_text = files[target_file].path, files[file_index].path
+            replacements[(file_index, index)] = (
+                [f"~ moved {best_length} lines to {to_text}: {preview}", best_length],
+                best_length,
+            )
+            replacements[(target_file, target_index)] = (
+                [f"~ {best_length} lines moved here from {from_text}: {preview}", best_length],
+                best_length,
+            )
+            index += best_length
+
+    for file_index, file_entries in enumerate(entries):
+        rebuilt: list[Entry] = []
+        index = 0
+        while index < len(file_entries):
+            replacement: tuple[Entry, int] | None = replacements.get((file_index, index))
+            if replacement is None:
+                rebuilt.append(file_entries[index])
+                index += 1
+            else:
+                rebuilt.append(replacement[0])
+                index += replacement[1]
+        entries[file_index] = rebuilt
+
+
+def _dedupe(entries: list[Entry]) -> list[Entry]:
+    counts: Counter = Counter(entry[0] for entry in entries if _sign(entry))
+    first: dict[str, Entry] = {}
+    blank: dict[str, int] = {"- ": 0, "+ ": 0}
+    result: list[Entry] = []
+    for entry in entries:
+        if _sign(entry) and not _normalized(entry):
+            blank[_sign(entry)] += entry[1]
+        elif not _sign(entry) or counts[entry[0]] == 1:
+            result.append(entry)
+        elif entry[0] in first:
+            first[entry[0]][1] += entry[1]
+        else:
+            first[entry[0]] = [f"{entry[0]} (x{counts[entry[0]]})", entry[1]]
+            result.append(first[entry[0]])
+    for sign, text in (("- ", "removed"), ("+ ", "added")):
+        if blank[sign]:
+            result.append(_summary(blank[sign], text, blank[sign], kind="blank "))
+    return result
+
+
+def _drop_redundant_hunks(entries: list[Entry]) -> list[Entry]:
+    # Hunk headers are kept only for their function context, once per function
+    result: list[Entry] = []
+    context: str | None = None
+    for entry in entries:
+        if entry[0].startswith("@@"):
+            if entry[0] == "@@" or entry[0] == context:
+                continue
+            context = entry[0]
+        result.append(entry)
+    return result
+
+
+def _describe(file_diff: FileDiff) -> None:
+    if file_diff.filtered is not None:
+        return
+    if file_diff.deleted_file:
+        file_diff.filtered = "deleted"
+    elif file_diff.old_path is not None and not file_diff.total_changes:
+        file_diff.filtered = f"renamed from {file_diff.old_path}"
+    elif file_diff.old_path is not None:
+        file_diff.note = f"renamed from {file_diff.old_path}"
+    elif file_diff.new_file:
+        file_diff.note = "new file"
+    if file_diff.filtered is not None:
+        file_diff.changes.clear()
+
+
+def compact_file_diffs(file_diffs: list[FileDiff]) -> None:
+    for file_diff in file_diffs:
+        _describe(file_diff)
+
+    entries: list[list[Entry]] = []
+    for file_diff in file_diffs:
+        file_entries: list[Entry] = _collapse_edits(
+            [[change, 1 if _sign([change]) else 0] for change in file_diff.changes]
+        )
+        entries.append(
+            [entry for hunk in _hunks(file_entries) for entry in _collapse_reorders(hunk)]
+        )
+    _mark_moves(file_diffs, entries)
+
+    for file_diff, file_entries in zip(file_diffs, entries):
+        file_entries = _merge_summaries(_drop_redundant_hunks(_dedupe(file_entries)))
+        if file_diff.new_file:
+            # Every line is an addition; the prefix would only cost tokens
+            file_entries = [
+                [entry[0][2:], entry[1]] if _sign(entry) == "+ " else entry
+                for entry in file_entries
+            ]
+        file_diff.changes = [entry[0] for entry in file_entries]
+        file_diff.covers = [entry[1] for entry in file_entries]
+
+
+def iter_compacted(file_diffs: Iterable[FileDiff]) -> Iterator[FileDiff]:
+    # For streamed diffs: each file is compacted on its own, so only moves
+    # within a file are found
+    for file_diff in file_diffs:
+        compact_file_diffs([file_diff])
+        yield file_diff
@@ -1,10 +1,12 @@
 import os
 import sys
-
-import tomli
+from functools import lru_cache
 
 HOME_DIR: str = os.path.expanduser("~")
 CONFIG_FILE: str = os.path.join(HOME_DIR, ".gen-commit")
+CACHE_DIR: str = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(HOME_DIR, ".cache"), "gen-commit"
+)
 
 
 def read_config() -> dict:
@@ -17,12 +19,37 @@ def read_config() -> dict:
     config: dict[str, str] = {}
     with open(CONFIG_FILE, "r") as f:
         for line in f:
-            key, value = line.strip().split("=", 1)
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            key, value = line.split("=", 1)
             config[key] = value
     return config
 
 
+@lru_cache(maxsize=1)
+def get_config() -> dict:
+    # Parsed once per process; every phase that needs a setting goes through here
+    return read_config()
+
+
+def get_int(key: str, default: int) -> int:
+    value: str | None = get_config().get(key)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{key} must be an integer, got {value!r}")
+
+
+def get_cache_dir() -> str:
+    return get_config().get("CACHE_DIR") or CACHE_DIR
+
+
 def read_version_from_pyproject() -> str:
+    import tomli
+
     try:
         with open("pyproject.toml", "rb") as f:
             pyproject_data: dict[str, any] = tomli.load(f)
@@ -0,0 +1,162 @@
+import json
+import os
+import signal
+import socket
+import socketserver
+from typing import Iterable
+
+from .config import get_cache_dir
+from .git import Revisions, diff_args, iter_lines, stream_diff
+
+# Wire protocol, one request per connection:
+#   client -> daemon: a JSON header line, then the raw `git diff` output, then EOF
+#   daemon -> client: one JSON line, {"ok": true, "message": {...}} or
+#                     {"ok": false, "error": "..."}
+
+
+def get_socket_path() -> str:
+    return os.path.join(get_cache_dir(), "daemon.sock")
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        from .diff import FormattedDiff, build_diff
+        from .filters import FileFilter
+        from .generate import generate_for_diff, update_commit_message
+
+        try:
+            header: dict = json.loads(self.rfile.readline() or b"{}")
+            repo_dir: str | None = header.get("cwd")
+            old, new = header.get("revisions") or ("HEAD", "")
+            revisions: Revisions = Revisions(old, new, repo_dir=repo_dir)
+            # .gitattributes lookups must run in the client's repository
+            file_filter: FileFilter = FileFilter(repo_dir=repo_dir)
+            try:
+                formatted_diff: FormattedDiff = build_diff(
+                    iter_lines(self.rfile),
+                    file_filter=file_filter,
+                    revisions=revisions,
+                )
+            finally:
+                file_filter.close()
+            previous_message: str | None = header.get("previous_message")
+            if previous_message is not None:
+                message_fields: dict = update_commit_message(
+                    previous_message,
+                    formatted_diff.text,
+                    use_cache=header.get("use_cache", True),
+                    profile=header.get("response_profile"),
+                ).model_dump()
+            elif formatted_diff.trivial is not None and header.get("fast_path", True):
+                message_fields = {
+                    "commit_message": formatted_diff.trivial.commit_message,
+                    "commit_description": formatted_diff.trivial.commit_description,
+                }
+            else:
+                # The diff sent over the socket is used up; a diff too large
+                # for one prompt is read again from the client's repository
+                message_fields = generate_for_diff(
+                    formatted_diff,
+                    lambda: stream_diff(*diff_args(revisions), repo_dir=repo_dir),
+                    use_cache=header.get("use_cache", True),
+                    profile=header.get("response_profile"),
+                    repo_dir=repo_dir,
+                ).model_dump()
+            response: dict = {"ok": True, "message": message_fields}
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _is_running(socket_path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def _raise_interrupt(signum, frame) -> None:
+    # Lets `kill` shut the daemon down through the same cleanup as Ctrl-C
+    raise KeyboardInterrupt
+
+
+def serve() -> bool:
+    socket_path: str = get_socket_path()
+    if _is_running(socket_path):
+        print(f"gencommit daemon is already running at {socket_path}")
+        return False
+    if os.path.exists(socket_path):
+        os.remove(socket_path)  # Left behind by a daemon that didn't exit cleanly
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+    from .generate import warm_up
+
+    warm_up()
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    with _DaemonServer(socket_path, _RequestHandler) as server:
+        os.chmod(socket_path, 0o600)
+        print(f"gencommit daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+    return True
+
+
+def request_commit_message(
+    diff_chunks: Iterable[bytes],
+    revisions: Revisions,
+    use_cache: bool = True,
+    fast_path: bool = True,
+    previous_message: str | None = None,
+    response_profile: str | None = None,
+) -> dict | None:
+    # Returns the message fields from a running daemon, or None if there is no
+    # daemon to talk to and the caller should generate in-process. The diff is
+    # only consumed once a connection is up, so a None leaves it untouched.
+    # With previous_message, the diff holds the changes made since it was
+    # written and the daemon updates it.
+    socket_path: str = get_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    client: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+
+    try:
+        with client:
+            header: dict = {
+                "use_cache": use_cache,
+                "cwd": os.getcwd(),
+                "revisions": [revisions.old, revisions.new],
+                "fast_path": fast_path,
+                "previous_message": previous_message,
+                "response_profile": response_profile,
+            }
+            client.sendall(json.dumps(header).encode("utf-8") + b"\n")
+            for chunk in diff_chunks:
+                client.sendall(chunk)
+            client.shutdown(socket.SHUT_WR)
+            with client.makefile("rb") as reader:
+                response_line: bytes = reader.readline()
+    except OSError as e:
+        raise RuntimeError(f"Lost connection to gencommit daemon: {e}")
+    if not response_line:
+        raise RuntimeError("gencommit daemon closed the connection without replying")
+
+    response: dict = json.loads(response_line)
+    if not response["ok"]:
+        print(f"Error generating commit message: {response['error']}")
+        raise RuntimeError(response["error"])
+    return response["message"]
@@ -0,0 +1,573 @@
+from __future__ import annotations
+
+import io
+import os
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+from .config import get_config, get_int
+from .filters import FileFilter
+from .tokenizer import CHARS_PER_TOKEN, byte_bound, count_tokens_batch
+from .trace import span
+
+if TYPE_CHECKING:
+    from .git import Revisions
+    from .trivial import TrivialChange
+
+DIFF_HEADER: str = "### Git Changes Summary ###\n\n"
+SYMBOLS_HEADER: str = "### Symbol Changes ###\n\n"
+# The symbol section may use at most this share of the budget
+SYMBOLS_BUDGET_SHARE: float = 0.5
+# Files the symbol section describes need less of the line diff budget
+DESCRIBED_FILE_WEIGHT: float = 0.25
+# Hard cap on change lines kept in memory for a single file
+MAX_FILE_CHANGES: int = 2000
+# How much more content than the budget to collect before keeping headers only.
+# The allocator needs some slack to rebalance between files.
+COLLECT_FACTOR: int = 4
+# Reserved per file for the "... elided" note
+ELISION_NOTE_TOKENS: int = 16
+# A run of changes longer than this isn't checked for being a reformat, so
+# at most this much of it is ever held
+MAX_RUN_CHARS: int = 64 * 1024
+# Files where leading whitespace carries meaning, so re-indenting is a change
+INDENTED_EXTENSIONS: frozenset[str] = frozenset(
+    [
+        ".py",
+        ".pyi",
+        ".md",
+        ".markdown",
+        ".rst",
+        ".yaml",
+        ".yml",
+        ".haml",
+        ".pug",
+        ".slim",
+        ".sass",
+        ".styl",
+        ".coffee",
+        ".nim",
+        ".mk",
+    ]
+)
+
+# String literals are compared as written
+_STRING: re.Pattern = re.compile(
+    r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`)"""
+)
+# Outside them, a space matters between two word tokens ("a b" vs "ab") and
+# between two operator characters ("= =" vs "=="). Next to brackets, commas
+# and semicolons, or between a word and an operator, it doesn't. "-" counts
+# as a word character, being part of names in shell, CSS and Lisp ("ls -l").
+_INSIGNIFICANT_SPACE: re.Pattern = re.compile(
+    r"(?<=[\w\"'`-]) (?![\w\"'`-])"
+    r"|(?<=[^\w\s()\[\]{},;\"'`-]) (?![^\w\s()\[\]{},;\"'`-])"
+    r"|(?<![\w\"'`-])(?<![^\w\s()\[\]{},;\"'`-]) "
+)
+_WHITESPACE: re.Pattern = re.compile(r"\s+")
+# INI-style files, where a change is only understood with its [section]
+SECTIONED_EXTENSIONS: frozenset[str] = frozenset([".toml", ".cfg", ".ini"])
+_SECTION_HEADER: re.Pattern = re.compile(r"^\s*\[+\s*([^\]]+?)\s*\]+\s*$")
+
+
+@dataclass
+class FileDiff:
+    path: str
+    changes: list[str] = field(default_factory=list)
+    additions: int = 0
+    deletions: int = 0
+    # Raw change-line stats, used by the content filters
+    raw_chars: int = 0
+    longest_line: int = 0
+    binary: bool = False
+    # Why the file's content is left out of the prompt (lockfile, generated, ...)
+    filtered: str | None = None
+    # From the extended header lines
+    old_path: str | None = None
+    new_file: bool = False
+    deleted_file: bool = False
+    # Shown after the path in the compact encoding ("new file", "renamed from ...")
+    note: str | None = None
+    # Change lines each entry stands for; empty means one per entry. Only the
+    # compact encoding has entries (summaries, hunk headers) that differ.
+    covers: list[int] = field(default_factory=list)
+    # Every run of removed lines reads the same as the added lines that replace
+    # it, apart from whitespace. Checked on the raw lines, before any trimming.
+    whitespace_only: bool = True
+    # For SECTIONED_EXTENSIONS, the [section] of every change line, or None
+    # where the hunk doesn't show which one it is in
+    sections: set[str | None] = field(default_factory=set)
+
+    @property
+    def total_changes(self) -> int:
+        return self.additions + self.deletions
+
+
+@dataclass
+class FormattedDiff:
+    text: str
+    # Path -> number of change lines left out of the prompt
+    elided: dict[str, int] = field(default_factory=dict)
+    # Paths whose changes the symbol section describes
+    described: set[str] = field(default_factory=set)
+    # Set when the change needs no model to describe (see trivial.py)
+    trivial: TrivialChange | None = None
+    # Path -> A(dded), D(eleted), R(enamed) or M(odified), like --name-status
+    statuses: dict[str, str] = field(default_factory=dict)
+
+
+def indentation_matters(path: str) -> bool:
+    return (
+        os.path.splitext(path)[1] in INDENTED_EXTENSIONS
+        or os.path.basename(path) == "Makefile"
+    )
+
+
+def _layout_free(lines: list[str], keep_indent: bool) -> str:
+    # Odd parts are string literals; each code part is rewritten with the
+    # quote characters around it in view, then sliced back out
+    parts: list[str] = _STRING.split(" ".join(lines))
+    for i in range(0, len(parts), 2):
+        before: str = parts[i - 1][-1:] if i else ""
+        after: str = parts[i + 1][:1] if i + 1 < len(parts) else ""
+        code: str = _INSIGNIFICANT_SPACE.sub(
+            "", before + _WHITESPACE.sub(" ", parts[i]) + after
+        )
+        parts[i] = code[len(before) : len(code) - len(after)]
+    text: str = "".join(parts)
+    if keep_indent:
+        indents: str = "|".join(line[: len(line) - len(line.lstrip())] for line in lines)
+        return f"{indents}|{text}"
+    return text
+
+
+@dataclass
+class _Run:
+    # The changed lines between two stretches of context: removed lines first,
+    # then the added ones, as git writes them
+    removed: list[str] = field(default_factory=list)
+    added: list[str] = field(default_factory=list)
+    chars: int = 0
+
+    def add(self, file_diff: FileDiff, prefix: str, line: str) -> None:
+        # Buffers the line only while the file may still be a reformat
+        if not file_diff.whitespace_only:
+            return
+        self.chars += len(line)
+        if (prefix == "+" and not self.removed and line.strip()) or (
+            self.chars > MAX_RUN_CHARS
+        ):
+            # Content added where nothing was removed is never a reformat, and
+            # a run too long to hold isn't treated as one
+            file_diff.whitespace_only = False
+            self.clear()
+            return
+        (self.removed if prefix == "-" else self.added).append(line)
+
+    def close(self, file_diff: FileDiff) -> None:
+        if file_diff.whitespace_only and (self.removed or self.added):
+            keep_indent: bool = indentation_matters(file_diff.path)
+            file_diff.whitespace_only = _layout_free(
+                self.removed, keep_indent
+            ) == _layout_free(self.added, keep_indent)
+        self.clear()
+
+    def clear(self) -> None:
+        self.removed.clear()
+        self.added.clear()
+        self.chars = 0
+
+
+def _finish_file(file_diff: FileDiff, file_filter: FileFilter | None) -> FileDiff:
+    if file_filter is not None and file_diff.filtered is None:
+        file_diff.filtered = file_filter.content_reason(file_diff)
+    if file_diff.filtered is not None:
+        file_diff.changes.clear()
+    return file_diff
+
+
+def iter_file_diffs(
+    lines: Iterable[str],
+    max_file_chars: int | None = None,
+    file_filter: FileFilter | None = None,
+    keep_hunks: bool = False,
+) -> Iterator[FileDiff]:
+    # With keep_hunks, each hunk also leaves an "@@ <function context>" entry
+    # and each run of context lines between changes an empty one, and change
+    # lines keep their indentation where it matters (see compact.py)
+    max_line_length: int = get_int("MAX_LINE_LENGTH", 300)
+    current: FileDiff | None = None
+    current_chars: int = 0
+    run: _Run = _Run()
+    sectioned: bool = False
+    section: str | None = None
+    keep_indent: bool = False
+
+    for line in lines:
+        if line.startswith("diff --git"):
+            if current is not None:
+                run.close(current)
+                yield _finish_file(current, file_filter)
+            current = FileDiff(path=line.split()[-1].removeprefix("b/"))
+            if file_filter is not None:
+                # Decided from the path alone, so none of the content is kept
+                current.filtered = file_filter.path_reason(current.path)
+            current_chars = 0
+            sectioned = os.path.splitext(current.path)[1] in SECTIONED_EXTENSIONS
+            keep_indent = keep_hunks and indentation_matters(current.path)
+            continue
+        if current is None:
+            continue
+
+        if line.startswith("Binary files ") or line.startswith("GIT binary patch"):
+            current.binary = True
+            continue
+        if line.startswith("@@"):
+            run.close(current)
+            section = None
+            if (
+                keep_hunks
+                and current.filtered is None
+                and len(current.changes) < MAX_FILE_CHANGES
+            ):
+                current.changes.append(f"@@ {line.split('@@', 2)[-1].strip()}".rstrip())
+            continue
+        if line.startswith("rename from "):
+            current.old_path = line[len("rename from ") :]
+            continue
+        if line.startswith("new file mode"):
+            current.new_file = True
+            continue
+        if line.startswith("deleted file mode"):
+            current.deleted_file = True
+            continue
+        if line.startswith("+") and not line.startswith("+++"):
+            current.additions += 1
+            prefix: str = "+"
+        elif line.startswith("-") and not line.startswith("---"):
+            current.deletions += 1
+            prefix = "-"
+        else:
+            if line.startswith(" "):
+                run.close(current)
+                if sectioned and (header := _SECTION_HEADER.match(line[1:])):
+                    section = header.group(1)
+            if (
+                keep_hunks
+                and line.startswith(" ")
+                and current.changes
+                and current.changes[-1]
+            ):
+                # Context between changes; an empty entry keeps them apart
+                current.changes.append("")
+            continue
+        if sectioned:
+            if header := _SECTION_HEADER.match(line[1:]):
+                section = header.group(1)
+            current.sections.add(section)
+        current.raw_chars += len(line) - 1
+        current.longest_line = max(current.longest_line, len(line) - 1)
+        if current.filtered is None:
+            run.add(current, prefix, line[1:])
+
+        # Past the caps only the counts are kept, so memory stays bounded no
+        # matter how large the diff is
+        if current.filtered is not None:
+            continue
+        if len(current.changes) >= MAX_FILE_CHANGES or (
+            max_file_chars is not None and current_chars >= max_file_chars
+        ):
+            # Trimmed files are never trivial, so stop checking for a reformat
+            current.whitespace_only = False
+            run.clear()
+            continue
+        text: str = line[1:max_line_length]
+        change: str = f"{prefix} {text.rstrip() if keep_indent else text.strip()}"
+        current.changes.append(change)
+        current_chars += len(change)
+
+    if current is not None:
+        run.close(current)
+        yield _finish_file(current, file_filter)
+
+
+def change_status(file_diff: FileDiff) -> str:
+    if file_diff.deleted_file:
+        return "D"
+    if file_diff.new_file:
+        return "A"
+    return "M" if file_diff.old_path is None else "R"
+
+
+def covered(file_diff: FileDiff, count: int) -> int:
+    # Change lines represented by the first `count` entries
+    if not file_diff.covers:
+        return count
+    return sum(file_diff.covers[:count])
+
+
+def _trim_changes(file_diff: FileDiff, max_chars: int) -> int:
+    kept_chars: int = 0
+    for index, change in enumerate(file_diff.changes):
+        if kept_chars + len(change) > max_chars:
+            del file_diff.changes[index:]
+            del file_diff.covers[index:]
+            break
+        kept_chars += len(change)
+    return kept_chars
+
+
+def collect_file_diffs(
+    lines: Iterable[str],
+    max_tokens: int,
+    file_filter: FileFilter | None = None,
+    keep_hunks: bool = False,
+) -> list[FileDiff]:
+    # Keeps at most COLLECT_FACTOR x the budget in memory. Whenever that fills
+    # up, every file is cut back to an equal share, which also becomes the cap
+    # for files still to come; later files never starve and memory stays flat.
+    max_chars: int = max_tokens * CHARS_PER_TOKEN * COLLECT_FACTOR
+    share: int = max_tokens * CHARS_PER_TOKEN
+    file_diffs: list[FileDiff] = []
+    collected_chars: int = 0
+
+    for file_diff in iter_file_diffs(
+        lines, max_file_chars=share, file_filter=file_filter, keep_hunks=keep_hunks
+    ):
+        collected_chars += _trim_changes(file_diff, share)
+        file_diffs.append(file_diff)
+        if collected_chars > max_chars:
+            share = max_chars // (2 * len(file_diffs))
+            collected_chars = sum(_trim_changes(kept, share) for kept in file_diffs)
+
+    return file_diffs
+
+
+def _file_header(file_diff: FileDiff) -> str:
+    if file_diff.filtered is not None:
+        counts: str = (
+            f"+{file_diff.additions}/-{file_diff.deletions} lines, "
+            if file_diff.total_changes
+            else ""
+        )
+        return f"File: {file_diff.path} ({file_diff.filtered}, {counts}content omitted)\n"
+    if file_diff.note is not None:
+        return f"File: {file_diff.path} ({file_diff.note})\nChanges:\n"
+    return f"File: {file_diff.path}\nChanges:\n"
+
+
+def _format_file(file_diff: FileDiff, shown: list[str], elided: int) -> str:
+    if file_diff.filtered is not None:
+        return _file_header(file_diff) + "\n"
+    parts: list[str] = [_file_header(file_diff)]
+    if shown:
+        parts.append("\n".join(shown) + "\n")
+    if elided:
+        parts.append(
+            f"\n... ({elided} of {file_diff.total_changes} changes elided)\n"
+        )
+    parts.append("\n")
+    return "".join(parts)
+
+
+def _elision_reserve(file_diff: FileDiff) -> int:
+    return 0 if file_diff.filtered is not None else ELISION_NOTE_TOKENS
+
+
+def format_file_diff(file_diff: FileDiff) -> str:
+    return _format_file(
+        file_diff,
+        file_diff.changes,
+        file_diff.total_changes - covered(file_diff, len(file_diff.changes)),
+    )
+
+
+def use_compact_encoding() -> bool:
+    return get_config().get("DIFF_FORMAT", "full") == "compact"
+
+
+def use_symbol_summaries() -> bool:
+    return get_config().get("SYMBOLS", "off") == "on"
+
+
+def _byte_counts(texts: list[str]) -> list[int]:
+    return [byte_bound(text) for text in texts]
+
+
+def _symbol_section(
+    symbols: dict[str, list[str]],
+    measure: Callable[[list[str]], list[int]],
+    max_tokens: int,
+) -> tuple[str, int, set[str]]:
+    # Whole files only, in diff order, for as many as fit
+    if not symbols:
+        return "", 0, set()
+    lines: list[str] = [f"{path}: {'; '.join(changes)}\n" for path, changes in symbols.items()]
+    costs: list[int] = measure([SYMBOLS_HEADER, *lines])
+    used: int = costs[0]
+    described: list[str] = []
+    for path, cost in zip(symbols, costs[1:]):
+        if used + cost > max_tokens:
+            break
+        described.append(path)
+        used += cost
+    if not described:
+        return "", 0, set()
+    text: str = SYMBOLS_HEADER + "".join(lines[: len(described)])
+    if len(described) < len(lines):
+        text += f"... ({len(lines) - len(described)} more files)\n"
+    text += "\n"
+    return text, measure([text])[0], set(described)
+
+
+def build_diff(
+    diff_text: str | Iterable[str],
+    max_tokens: int | None = None,
+    file_filter: FileFilter | None = None,
+    revisions: Revisions | None = None,
+) -> FormattedDiff:
+    # With revisions to read the files from and SYMBOLS=on, a symbol section
+    # comes first and the line diff gets the rest of the budget
+    from .budget import allocate_budget, file_weight
+
+    with span("format_diff") as format_span:
+        if max_tokens is None:
+            max_tokens = get_int("MAX_TOKENS_ALLOWED", 30000)
+        lines: Iterable[str] = (
+            (line.rstrip("\n") for line in io.StringIO(diff_text))
+            if isinstance(diff_text, str)
+            else diff_text
+        )
+
+        compact: bool = use_compact_encoding()
+        own_filter: bool = file_filter is None
+        if own_filter:
+            file_filter = FileFilter()
+        try:
+            file_diffs: list[FileDiff] = collect_file_diffs(
+                lines, max_tokens, file_filter, keep_hunks=compact
+            )
+        finally:
+            if hasattr(lines, "close"):
+                lines.close()
+            if own_filter:
+                file_filter.close()
+        # Before compaction, which rewrites the change lines it looks at
+        from .trivial import classify
+
+        trivial: TrivialChange | None = classify(file_diffs)
+        if compact:
+            from .compact import compact_file_diffs
+
+            compact_file_diffs(file_diffs)
+        symbols: dict[str, list[str]] = {}
+        if revisions is not None and use_symbol_summaries():
+            from .symbols import symbol_changes
+
+            symbols = symbol_changes(file_diffs, revisions)
+
+        headers: list[str] = [_file_header(file_diff) for file_diff in file_diffs]
+        # Byte length bounds the token count, so a diff that fits by bytes never
+        # needs the tokenizer loaded at all
+        total_bytes: int = (
+            byte_bound(DIFF_HEADER)
+            + sum(byte_bound(change) for changes in symbols.values() for change in changes)
+            + sum(byte_bound(header) for header in headers)
+            + sum(
+                byte_bound(change) + 1
+                for file_diff in file_diffs
+                for change in file_diff.changes
+            )
+        )
+        measure: Callable[[list[str]], list[int]] = (
+            _byte_counts if total_bytes <= max_tokens else count_tokens_batch
+        )
+
+        symbol_text, symbol_tokens, described = _symbol_section(
+            symbols, measure, int(max_tokens * SYMBOLS_BUDGET_SHARE)
+        )
+        header_tokens: list[int] = measure(headers)
+        budget: int = (
+            max_tokens
+            - symbol_tokens
+            - measure([DIFF_HEADER])[0]
+            - sum(header_tokens)
+            - sum(_elision_reserve(file_diff) for file_diff in file_diffs)
+        )
+
+        line_tokens: dict[str, list[int]] = {}
+        needs: dict[str, int] = {}
+        weights: dict[str, float] = {}
+        for file_diff in file_diffs:
+            # +1 for the newline joining each change
+            counts: list[int] = [
+                count + 1 for count in measure(file_diff.changes)
+            ]
+            line_tokens[file_diff.path] = counts
+            needs[file_diff.path] = sum(counts)
+            weights[file_diff.path] = file_weight(file_diff.path, file_diff.total_changes)
+            if file_diff.path in described:
+                weights[file_diff.path] *= DESCRIBED_FILE_WEIGHT
+        allocation: dict[str, int] = allocate_budget(needs, weights, max(budget, 0))
+
+        pieces: list[str] = [DIFF_HEADER]
+        elided: dict[str, int] = {}
+        header_budget: int = max_tokens - symbol_tokens
+        for file_diff, header_cost in zip(file_diffs, header_tokens):
+            header_budget -= header_cost + _elision_reserve(file_diff)
+            if header_budget < 0:
+                # Too many files to even list; summarize the tail in one line
+                omitted: list[FileDiff] = file_diffs[len(pieces) - 1 :]
+                for skipped in omitted:
+                    elided[skipped.path] = skipped.total_changes
+                pieces.append(f"... ({len(omitted)} more files not shown)\n")
+                break
+
+            if file_diff.filtered is not None:
+                # Left out on purpose, not for lack of budget
+                pieces.append(_format_file(file_diff, [], 0))
+                continue
+
+            shown: list[str] = []
+            used: int = 0
+            for change, cost in zip(file_diff.changes, line_tokens[file_diff.path]):
+                if used + cost > allocation[file_diff.path]:
+                    break
+                shown.append(change)
+                used += cost
+            file_elided: int = file_diff.total_changes - covered(file_diff, len(shown))
+            if file_elided:
+                elided[file_diff.path] = file_elided
+            pieces.append(_format_file(file_diff, shown, file_elided))
+
+        text: str = symbol_text + "".join(pieces)
+        format_span.set(
+            files=len(file_diffs),
+            encoding="compact" if compact else "full",
+            filtered=sum(file_diff.filtered is not None for file_diff in file_diffs),
+            changes=sum(file_diff.total_changes for file_diff in file_diffs),
+            measured="bytes" if measure is _byte_counts else "tokens",
+            output_bytes=byte_bound(text),
+            elided_files=len(elided),
+            described_files=len(described),
+            trivial=trivial.kind if trivial is not None else None,
+        )
+        return FormattedDiff(
+            text=text,
+            elided=elided,
+            described=described,
+            trivial=trivial,
+            statuses={
+                file_diff.path: change_status(file_diff) for file_diff in file_diffs
+            },
+        )
+
+
+def format_diff(
+    diff_text: str | Iterable[str],
+    max_tokens: int | None = None,
+    file_filter: FileFilter | None = None,
+    revisions: Revisions | None = None,
+) -> str:
+    return build_diff(diff_text, max_tokens, file_filter, revisions).text
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import math
+import os
+import subprocess
+from collections import Counter
+from fnmatch import fnmatch
+from typing import TYPE_CHECKING, Callable
+
+from .config import get_config, get_int
+
+if TYPE_CHECKING:
+    from .diff import FileDiff
+
+# Files matching these are reduced to a single summary line. A pattern without
+# a slash matches the file name; one with a slash matches the path from the
+# repo root or from any directory below it.
+DEFAULT_PATTERNS: dict[str, str] = {
+    "package-lock.json": "lockfile",
+    "npm-shrinkwrap.json": "lockfile",
+    "yarn.lock": "lockfile",
+    "pnpm-lock.yaml": "lockfile",
+    "*.lock": "lockfile",
+    "go.sum": "lockfile",
+    "*.min.js": "minified",
+    "*.min.css": "minified",
+    "*.map": "source map",
+    "*_pb2.py": "generated",
+    "*_pb2_grpc.py": "generated",
+    "*_pb2.pyi": "generated",
+    "*.pb.go": "generated",
+    "*.pb.cc": "generated",
+    "*.pb.h": "generated",
+    "*_pb.js": "generated",
+    "*_pb.d.ts": "generated",
+    "*.generated.*": "generated",
+    "*.snap": "snapshot",
+    "__snapshots__/*": "snapshot",
+    "vendor/*": "vendored",
+    "third_party/*": "vendored",
+    "node_modules/*": "vendored",
+}
+
+PathFilter = Callable[[str], "str | None"]
+ContentFilter = Callable[["FileDiff"], "str | None"]
+
+# Extension points: each returns a short reason when the file should be
+# filtered, or None to keep it. Path filters run on the file header before any
+# content is stored; content filters run once the whole file has been read.
+PATH_FILTERS: dict[str, PathFilter] = {}
+CONTENT_FILTERS: dict[str, ContentFilter] = {}
+
+
+def register_path_filter(name: str, path_filter: PathFilter) -> None:
+    PATH_FILTERS[name] = path_filter
+
+
+def register_content_filter(name: str, content_filter: ContentFilter) -> None:
+    CONTENT_FILTERS[name] = content_filter
+
+
+def _split_list(value: str | None) -> list[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def matches(path: str, pattern: str) -> bool:
+    if "/" in pattern:
+        return fnmatch(path, pattern) or fnmatch(path, f"*/{pattern}")
+    return fnmatch(os.path.basename(path), pattern)
+
+
+def _glob_filter(path: str) -> str | None:
+    for pattern, reason in DEFAULT_PATTERNS.items():
+        if matches(path, pattern):
+            return reason
+    return None
+
+
+def _user_glob_filter(path: str) -> str | None:
+    for pattern in _split_list(get_config().get("FILTER_EXCLUDE")):
+        if matches(path, pattern):
+            return "excluded"
+    return None
+
+
+def _binary_filter(file_diff: FileDiff) -> str | None:
+    return "binary" if file_diff.binary else None
+
+
+def _minified_filter(file_diff: FileDiff) -> str | None:
+    if not file_diff.total_changes:
+        return None
+    max_line_length: int = get_int("FILTER_MAX_LINE_LENGTH", 500)
+    if file_diff.longest_line > max_line_length * 4:
+        return "minified"
+    if file_diff.raw_chars / file_diff.total_changes > max_line_length:
+        return "minified"
+    return None
+
+
+def _entropy_filter(file_diff: FileDiff) -> str | None:
+    # Base64/hex blobs and embedded binaries: dense, whitespace-free text with
+    # close to uniformly distributed characters
+    sample: str = "".join(change[2:] for change in file_diff.changes[:200])
+    if len(sample) < 512:
+        return None
+    if sum(char.isspace() for char in sample) / len(sample) > 0.02:
+        return None
+    counts: Counter = Counter(sample)
+    entropy: float = -sum(
+        count / len(sample) * math.log2(count / len(sample)) for count in counts.values()
+    )
+    return "encoded data" if entropy > 4.5 else None
+
+
+register_path_filter("globs", _glob_filter)
+register_path_filter("exclude", _user_glob_filter)
+register_content_filter("binary", _binary_filter)
+register_content_filter("minified", _minified_filter)
+register_content_filter("entropy", _entropy_filter)
+
+
+class _AttributeReader:
+    # One long-lived `git check-attr --stdin` answers every path as it streams
+    # past; git flushes after each path, so lookups don't wait for the diff.
+
+    ATTRIBUTES: list[str] = ["linguist-generated", "linguist-vendored", "diff"]
+
+    def __init__(self, repo_dir: str | None):
+        self.repo_dir: str | None = repo_dir
+        self.process: subprocess.Popen | None = None
+        self.failed: bool = False
+        self.buffer: bytes = b""
+
+    def reason(self, path: str) -> str | None:
+        if self.failed:
+            return None
+        try:
+            values: dict[str, str] = self._query(path)
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            self.failed = True
+            return None
+        if values.get("linguist-generated") in ("set", "true"):
+            return "generated"
+        if values.get("linguist-vendored") in ("set", "true"):
+            return "vendored"
+        if values.get("diff") == "unset":
+            return "-diff"
+        return None
+
+    def _query(self, path: str) -> dict[str, str]:
+        if self.process is None:
+            git_args: list[str] = ["git"]
+            if self.repo_dir:
+                git_args += ["-C", self.repo_dir]
+            # Diff paths are relative to the top level, wherever gencommit runs
+            top_level: str = subprocess.check_output(
+                [*git_args, "rev-parse", "--show-toplevel"],
+                text=True,
+                stderr=subprocess.DEVNULL,
+            ).strip()
+            self.process = subprocess.Popen(
+                ["git", "-C", top_level, "check-attr", "-z", "--stdin", *self.ATTRIBUTES],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        self.process.stdin.write(path.encode("utf-8") + b"\0")
+        self.process.stdin.flush()
+
+        # Three NUL-terminated fields (path, attribute, value) per attribute
+        fields_needed: int = 3 * len(self.ATTRIBUTES)
+        while self.buffer.count(b"\0") < fields_needed:
+            chunk: bytes = self.process.stdout.read1(4096)
+            if not chunk:
+                raise ValueError("git check-attr exited")
+            self.buffer += chunk
+        fields: list[bytes] = self.buffer.split(b"\0", fields_needed)
+        self.buffer = fields.pop()
+        return {
+            fields[index + 1].decode(): fields[index + 2].decode()
+            for index in range(0, fields_needed, 3)
+        }
+
+    def close(self) -> None:
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+
+class FileFilter:
+    def __init__(self, repo_dir: str | None = None):
+        config: dict = get_config()
+        self.include: list[str] = _split_list(config.get("FILTER_INCLUDE"))
+        self.disabled: set[str] = set(_split_list(config.get("FILTER_DISABLE")))
+        self.attributes: _AttributeReader | None = (
+            None if "gitattributes" in self.disabled else _AttributeReader(repo_dir)
+        )
+
+    def _included(self, path: str) -> bool:
+        return any(matches(path, pattern) for pattern in self.include)
+
+    def path_reason(self, path: str) -> str | None:
+        if self._included(path):
+            return None
+        for name, path_filter in PATH_FILTERS.items():
+            if name not in self.disabled:
+                reason: str | None = path_filter(path)
+                if reason:
+                    return reason
+        if self.attributes is not None:
+            return self.attributes.reason(path)
+        return None
+
+    def content_reason(self, file_diff: FileDiff) -> str | None:
+        if self._included(file_diff.path):
+            return None
+        for name, content_filter in CONTENT_FILTERS.items():
+            if name not in self.disabled:
+                reason: str | None = content_filter(file_diff)
+                if reason:
+                    return reason
+        return None
+
+    def close(self) -> None:
+        if self.attributes is not None:
+            self.attributes.close()
@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from .cache import DiskCache, make_key
+from .config import get_config, get_int
+from .prompts import (
+    COMMIT_PROMPT_FROM_SUMMARIES,
+    COMMIT_PROMPT_SYSTEM,
+    COMMIT_PROMPT_UPDATE,
+    COMMIT_PROMPT_WITH_DESCRIPTION,
+    PROMPT_VERSION,
+)
+from .profiles import ResponseProfile, get_profile, max_output_tokens
+from .routing import models_key, route_model
+from .tokenizer import approx_token_count, truncate_to_tokens
+from .trace import span
+
+if TYPE_CHECKING:
+    from .diff import FormattedDiff
+    from .llm_wrapper import FieldCallback
+    from .schemas import CommitMessage
+
+
+def warm_up() -> None:
+    # Everything a request would otherwise pay for on a cold start
+    from .llm_wrapper import _get_client, _get_params
+    from .routing import configured_models
+    from .schemas import CommitMessage  # noqa: F401
+    from .tokenizer import get_encoding
+
+    get_encoding()
+    for model in configured_models():
+        provider_params, _ = _get_params(model or None)
+        _get_client(**provider_params)
+
+
+def _prepare_request(
+    diff_text: str, profile: ResponseProfile, examples: list[str] | None = None
+) -> tuple[str, str, str, str]:
+    # Returns (system prompt, user prompt, model, cache key).
+    # format_diff already fits the budget; this only guards raw callers
+    truncated_diff: str = truncate_to_tokens(
+        diff_text, get_int("MAX_TOKENS_ALLOWED", 30000)
+    )
+    model: str = route_model(truncated_diff)
+    # Keys without examples stay as they were before there were any
+    cache_key: str = make_key(
+        PROMPT_VERSION, models_key(), profile.name, *(examples or []), truncated_diff
+    )
+    return (
+        COMMIT_PROMPT_SYSTEM(),
+        COMMIT_PROMPT_WITH_DESCRIPTION(truncated_diff, examples),
+        model,
+        cache_key,
+    )
+
+
+def _cached_commit_message(
+    cache_key: str, profile: ResponseProfile
+) -> CommitMessage | None:
+    from .schemas import response_model
+
+    cache: DiskCache = DiskCache("responses")
+    cached: str | None = cache.get(cache_key)
+    if cached is None:
+        return None
+    try:
+        return response_model(profile).model_validate_json(cached)
+    except ValueError:
+        # Cut short, or written for an older schema: ask the model again
+        cache.delete(cache_key)
+        return None
+
+
+def _cap_bullets(message: CommitMessage, profile: ResponseProfile) -> CommitMessage:
+    # The schema asks for at most max_bullets; this makes sure of it
+    if profile.max_bullets is None:
+        return message
+    lines: list[str] = message.commit_description.splitlines()
+    bullets: list[int] = [i for i, line in enumerate(lines) if line.lstrip().startswith("-")]
+    if len(bullets) > profile.max_bullets:
+        message.commit_description = "\n".join(
+            lines[: bullets[profile.max_bullets]]
+        ).rstrip()
+    return message
+
+
+def _request_commit_message(
+    system_prompt: str,
+    user_prompt: str,
+    model: str,
+    cache_key: str,
+    use_cache: bool,
+    on_field: FieldCallback | None,
+    profile: ResponseProfile,
+) -> CommitMessage:
+    with span("generate", profile=profile.name) as generate_span:
+        from .schemas import response_model
+
+        if use_cache:
+            cached: CommitMessage | None = _cached_commit_message(cache_key, profile)
+            generate_span.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+
+        # Only pay for importing the client on a cache miss
+        with span("import.llm_client"):
+            from .llm_wrapper import chat
+
+        try:
+            llm_response: CommitMessage = chat(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                response_model=response_model(profile),
+                on_field=on_field,
+                model=model,
+                max_tokens=max_output_tokens(profile, approx_token_count(user_prompt)),
+            )
+        except Exception as e:
+            print(f"Error generating commit message: {e}")
+            raise e
+        llm_response = _cap_bullets(llm_response, profile)
+        DiskCache("responses").set(cache_key, llm_response.model_dump_json())
+        return llm_response
+
+
+def generate_commit_message(
+    diff_text: str,
+    use_cache: bool = True,
+    on_field: FieldCallback | None = None,
+    profile: str | None = None,
+    examples: list[str] | None = None,
+) -> CommitMessage:
+    # profile overrides RESPONSE_PROFILE for this request (see profiles.py);
+    # examples are earlier commit subjects to match (see history.py)
+    if not diff_text:
+        raise ValueError("No changes to describe")
+
+    response_profile: ResponseProfile = get_profile(profile)
+    system_prompt, user_prompt, model, cache_key = _prepare_request(
+        diff_text, response_profile, examples
+    )
+    return _request_commit_message(
+        system_prompt, user_prompt, model, cache_key, use_cache, on_field, response_profile
+    )
+
+
+def _needs_summary(formatted_diff: FormattedDiff) -> bool:
+    # Files the symbol section describes can do with part of their lines
+    unseen: set[str] = formatted_diff.elided.keys() - formatted_diff.described
+    return bool(unseen) and get_config().get("SUMMARIZE") != "off"
+
+
+def generate_for_diff(
+    formatted_diff: FormattedDiff,
+    read_diff: Callable[[], Iterable[str]],
+    use_cache: bool = True,
+    profile: str | None = None,
+    repo_dir: str | None = None,
+    on_field: FieldCallback | None = None,
+) -> CommitMessage:
+    # For a diff that isn't trivial, wherever it was read (the CLI, the
+    # daemon, the watcher, --split). read_diff returns the raw diff again:
+    # when changes had to be elided to fit one prompt, every part of the
+    # diff is summarized instead (see summarize.py). on_field only sees the
+    # fields of a single request; summaries aren't streamed.
+    from .history import few_shot_examples
+
+    # Earlier messages for similar changes, to match their style
+    examples: list[str] = few_shot_examples(
+        formatted_diff.statuses, repo_dir=repo_dir
+    )
+    if _needs_summary(formatted_diff):
+        from .summarize import summarize_diff
+
+        return summarize_diff(
+            read_diff(),
+            use_cache,
+            profile=profile,
+            examples=examples,
+            repo_dir=repo_dir,
+        )
+    return generate_commit_message(
+        diff_text=formatted_diff.text,
+        use_cache=use_cache,
+        on_field=on_field,
+        profile=profile,
+        examples=examples,
+    )
+
+
+def update_commit_message(
+    previous_message: str,
+    diff_text: str,
+    use_cache: bool = True,
+    profile: str | None = None,
+) -> CommitMessage:
+    # For amends: diff_text holds only the changes made since previous_message
+    # was written
+    response_profile: ResponseProfile = get_profile(profile)
+    truncated_diff: str = truncate_to_tokens(
+        diff_text, get_int("MAX_TOKENS_ALLOWED", 30000)
+    )
+    model: str = route_model(truncated_diff)
+    cache_key: str = make_key(
+        PROMPT_VERSION,
+        models_key(),
+        response_profile.name,
+        "update",
+        previous_message,
+        truncated_diff,
+    )
+    return _request_commit_message(
+        COMMIT_PROMPT_SYSTEM(),
+        COMMIT_PROMPT_UPDATE(previous_message, truncated_diff),
+        model,
+        cache_key,
+        use_cache,
+        None,
+        response_profile,
+    )
+
+
+async def agenerate_commit_message(
+    diff_text: str,
+    use_cache: bool = True,
+    on_field: FieldCallback | None = None,
+    profile: str | None = None,
+    examples: list[str] | None = None,
+) -> CommitMessage:
+    from .llm_wrapper import achat
+    from .schemas import response_model
+
+    if not diff_text:
+        raise ValueError("No changes to describe")
+
+    response_profile: ResponseProfile = get_profile(profile)
+    system_prompt, user_prompt, model, cache_key = _prepare_request(
+        diff_text, response_profile, examples
+    )
+    if use_cache:
+        cached: CommitMessage | None = _cached_commit_message(cache_key, response_profile)
+        if cached is not None:
+            return cached
+
+    llm_response: CommitMessage = await achat(
+        system_prompt=system_prompt,
+        user_prompt=user_prompt,
+        response_model=response_model(response_profile),
+        on_field=on_field,
+        model=model,
+        max_tokens=max_output_tokens(response_profile, approx_token_count(user_prompt)),
+    )
+    llm_response = _cap_bullets(llm_response, response_profile)
+    DiskCache("responses").set(cache_key, llm_response.model_dump_json())
+    return llm_response
+
+
+async def agenerate_for_diff(
+    formatted_diff: FormattedDiff,
+    read_diff: Callable[[], Iterable[str]],
+    use_cache: bool = True,
+    profile: str | None = None,
+) -> CommitMessage:
+    # generate_for_diff for the watcher: a single request stays cancellable,
+    # summaries run on a thread
+    import asyncio
+
+    from .history import few_shot_examples
+
+    if _needs_summary(formatted_diff):
+        return await asyncio.to_thread(
+            generate_for_diff, formatted_diff, read_diff, use_cache, profile
+        )
+    examples: list[str] = await asyncio.to_thread(
+        few_shot_examples, formatted_diff.statuses
+    )
+    return await agenerate_commit_message(
+        diff_text=formatted_diff.text,
+        use_cache=use_cache,
+        profile=profile,
+        examples=examples,
+    )
+
+
+def generate_from_summaries(
+    summaries: list[str],
+    use_cache: bool = True,
+    profile: str | None = None,
+    examples: list[str] | None = None,
+) -> CommitMessage:
+    response_profile: ResponseProfile = get_profile(profile)
+    joined: str = truncate_to_tokens(
+        "\n\n".join(summaries), get_int("MAX_TOKENS_ALLOWED", 30000)
+    )
+    model: str = route_model(joined)
+    cache_key: str = make_key(
+        PROMPT_VERSION,
+        models_key(),
+        response_profile.name,
+        "summaries",
+        *(examples or []),
+        joined,
+    )
+    return _request_commit_message(
+        COMMIT_PROMPT_SYSTEM(),
+        COMMIT_PROMPT_FROM_SUMMARIES(joined, examples),
+        model,
+        cache_key,
+        use_cache,
+        None,
+        response_profile,
+    )
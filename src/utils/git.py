@@ -0,0 +1,329 @@
+import os
+import subprocess
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator
+
+# Longest single diff line read from git; anything past this is discarded
+# before it reaches Python, so one enormous minified line can't blow up memory.
+MAX_LINE_BYTES: int = 64 * 1024
+
+
+@dataclass
+class FileStat:
+    path: str
+    # None for binary files
+    additions: int | None
+    deletions: int | None
+
+
+@dataclass
+class CommitInfo:
+    sha: str
+    tree: str
+    parents: list[str]
+    author_name: str
+    author_email: str
+    author_date: str
+    committer_name: str
+    committer_email: str
+    committer_date: str
+
+
+@dataclass(frozen=True)
+class Revisions:
+    # Where the two sides of a diff live: a revision, "" for the index or None
+    # for the working tree. repo_dir is where to run git (default: cwd).
+    old: str | None
+    new: str | None
+    repo_dir: str | None = None
+
+
+# Diffs exactly as iter_file_diffs and `git apply` read them, whatever the
+# user's config says (diff.noprefix, diff.mnemonicPrefix, diff.relative,
+# diff.external, color.diff=always)
+PLAIN_DIFF_OPTIONS: list[str] = [
+    "--no-color",
+    "--no-ext-diff",
+    "--no-relative",
+    "--src-prefix=a/",
+    "--dst-prefix=b/",
+]
+
+COMMIT_INFO_FORMAT: str = "%x1f".join(
+    ["%H", "%T", "%P", "%an", "%ae", "%ad", "%cn", "%ce", "%cd"]
+)
+
+
+def iter_lines(stream: BinaryIO) -> Iterator[str]:
+    while True:
+        raw_line: bytes = stream.readline(MAX_LINE_BYTES)
+        if not raw_line:
+            return
+        if not raw_line.endswith(b"\n"):
+            # Drop the rest of an overlong line
+            while True:
+                rest: bytes = stream.readline(MAX_LINE_BYTES)
+                if not rest or rest.endswith(b"\n"):
+                    break
+        yield raw_line.decode("utf-8", errors="replace").rstrip("\r\n")
+
+
+def stream_diff(*args: str, repo_dir: str | None = None) -> Iterator[str]:
+    return stream_git("diff", *PLAIN_DIFF_OPTIONS, *args, repo_dir=repo_dir)
+
+
+def diff_args(revisions: Revisions) -> list[str]:
+    # The `git diff` arguments comparing the two sides of revisions
+    if revisions.new == "":
+        return ["--staged", revisions.old]
+    if revisions.new is None:
+        return [revisions.old]
+    return [revisions.old, revisions.new]
+
+
+def stream_commit_diff(sha: str, repo_dir: str | None = None) -> Iterator[str]:
+    # Diff against the first parent, or the empty tree for a root commit
+    return stream_git(
+        "diff-tree",
+        "-p",
+        "--root",
+        "--no-commit-id",
+        "--diff-merges=first-parent",
+        *PLAIN_DIFF_OPTIONS,
+        sha,
+        repo_dir=repo_dir,
+    )
+
+
+def stream_git(*args: str, repo_dir: str | None = None) -> Iterator[str]:
+    return _stream_process(open_git(*args, repo_dir=repo_dir))
+
+
+def _stream_process(process: subprocess.Popen) -> Iterator[str]:
+    finished: bool = False
+    try:
+        yield from iter_lines(process.stdout)
+        finished = True
+    finally:
+        # The consumer may stop early once its budget is full; don't make git
+        # finish writing a diff nobody will read.
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        return_code: int = process.wait()
+        if finished and return_code != 0:
+            raise subprocess.CalledProcessError(return_code, process.args)
+
+
+class DiffSnapshot:
+    # Everything gencommit needs from the index comes out of this one
+    # `git diff --numstat --patch` run. The per-file stats (one short line per
+    # file) are read up front; the patch that follows is streamed on demand.
+
+    def __init__(self, *diff_args: str):
+        self.process: subprocess.Popen = open_git(
+            "diff", "--numstat", "--patch", *PLAIN_DIFF_OPTIONS, *diff_args
+        )
+        self.files: list[FileStat] = []
+        for line in iter_lines(self.process.stdout):
+            if not line:
+                break  # Blank line separates the stats from the patch
+            additions, deletions, path = line.split("\t", 2)
+            self.files.append(
+                FileStat(
+                    path=path,
+                    additions=None if additions == "-" else int(additions),
+                    deletions=None if deletions == "-" else int(deletions),
+                )
+            )
+
+    def lines(self) -> Iterator[str]:
+        return _stream_process(self.process)
+
+    def chunks(self, size: int = 64 * 1024) -> Iterator[bytes]:
+        try:
+            while chunk := self.process.stdout.read(size):
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.process.stdout.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+def open_git(*args: str, repo_dir: str | None = None) -> subprocess.Popen:
+    location: list[str] = ["-C", repo_dir] if repo_dir else []
+    return subprocess.Popen(["git", *location, *args], stdout=subprocess.PIPE)
+
+
+def head_commit() -> str | None:
+    result: subprocess.CompletedProcess = subprocess.run(
+        ["git", "rev-parse", "--verify", "-q", "HEAD"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None  # Unborn branch
+    return result.stdout.strip()
+
+
+def commit(args: list[str], message: str) -> None:
+    # The message goes over stdin, so it never needs shell quoting
+    subprocess.run(
+        ["git", "commit", *args, "-F", "-"], input=message, text=True, check=True
+    )
+
+
+def rev_parse(rev: str) -> str:
+    return subprocess.check_output(
+        ["git", "rev-parse", "--verify", "-q", rev], text=True
+    ).strip()
+
+
+def merge_base(first: str, second: str, repo_dir: str | None = None) -> str:
+    location: list[str] = ["-C", repo_dir] if repo_dir else []
+    return subprocess.check_output(
+        ["git", *location, "merge-base", first, second], text=True
+    ).strip()
+
+
+def list_commits(rev_range: str) -> list[CommitInfo]:
+    # Oldest first, parents always before their children
+    output: str = subprocess.check_output(
+        [
+            "git",
+            "log",
+            "--reverse",
+            "--topo-order",
+            "--date=raw",
+            f"--format={COMMIT_INFO_FORMAT}",
+            rev_range,
+        ],
+        text=True,
+    )
+    commits: list[CommitInfo] = []
+    for line in output.splitlines():
+        fields: list[str] = line.split("\x1f")
+        commits.append(
+            CommitInfo(
+                sha=fields[0],
+                tree=fields[1],
+                parents=fields[2].split(),
+                author_name=fields[3],
+                author_email=fields[4],
+                author_date=fields[5],
+                committer_name=fields[6],
+                committer_email=fields[7],
+                committer_date=fields[8],
+            )
+        )
+    return commits
+
+
+def commit_tree(commit: CommitInfo, parents: list[str], message: str) -> str:
+    # Recreates `commit` with a new message, keeping tree, authorship and dates
+    env: dict[str, str] = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": commit.author_name,
+        "GIT_AUTHOR_EMAIL": commit.author_email,
+        "GIT_AUTHOR_DATE": commit.author_date,
+        "GIT_COMMITTER_NAME": commit.committer_name,
+        "GIT_COMMITTER_EMAIL": commit.committer_email,
+        "GIT_COMMITTER_DATE": commit.committer_date,
+    }
+    parent_args: list[str] = [arg for parent in parents for arg in ("-p", parent)]
+    return subprocess.run(
+        ["git", "commit-tree", commit.tree, *parent_args, "-F", "-"],
+        input=message,
+        env=env,
+        text=True,
+        capture_output=True,
+        check=True,
+    ).stdout.strip()
+
+
+def update_ref(ref: str, new_sha: str, old_sha: str, reason: str) -> None:
+    subprocess.run(
+        ["git", "update-ref", "-m", reason, ref, new_sha, old_sha], check=True
+    )
+
+
+def write_tree() -> str:
+    # Hash of the tree the index would commit right now
+    return subprocess.check_output(
+        ["git", "write-tree"], text=True, stderr=subprocess.DEVNULL
+    ).strip()
+
+
+def git_path(name: str) -> str:
+    return subprocess.check_output(
+        ["git", "rev-parse", "--git-path", name], text=True
+    ).strip()
+
+
+def tree_and_message(rev: str) -> tuple[str, str, str]:
+    # (tree, space-separated parents, full message) of a commit
+    output: str = subprocess.check_output(
+        ["git", "log", "-1", "--format=%T%x1f%P%x1f%B", rev],
+        text=True,
+        stderr=subprocess.DEVNULL,
+    )
+    tree, parents, message = output.split("\x1f", 2)
+    return tree, parents, message.strip()
+
+
+def common_dir_and_head(repo_dir: str | None = None) -> tuple[str, str]:
+    # The .git directory shared by all worktrees, and the commit HEAD is at
+    location: list[str] = ["-C", repo_dir] if repo_dir else []
+    output: str = subprocess.check_output(
+        [
+            "git",
+            *location,
+            "rev-parse",
+            "--path-format=absolute",
+            "--git-common-dir",
+            "--verify",
+            "HEAD",
+        ],
+        text=True,
+        stderr=subprocess.DEVNULL,
+    )
+    common_dir, head = output.splitlines()
+    return common_dir, head
+
+
+def staged_patch() -> bytes:
+    # Unlike stream_diff, complete and byte for byte, so it can be applied.
+    # Plumbing, so no textconv filter or diff config changes what git prints
+    return subprocess.check_output(
+        [
+            "git",
+            "diff-index",
+            "--cached",
+            "--patch",
+            "-M",
+            "--binary",
+            *PLAIN_DIFF_OPTIONS,
+            "HEAD",
+        ]
+    )
+
+
+def apply_to_index(patch: bytes) -> None:
+    # From a subdirectory, `git apply` would skip every path outside it
+    top_level: str = subprocess.check_output(
+        ["git", "rev-parse", "--show-toplevel"], text=True
+    ).strip()
+    subprocess.run(
+        ["git", "apply", "--cached", "-"], input=patch, check=True, cwd=top_level
+    )
+
+
+def read_tree(tree: str) -> None:
+    # Sets the index to `tree`, leaving the work tree alone. --reset keeps the
+    # stat info of unchanged entries, so the next `git status` doesn't have to
+    # rehash the work tree, without -m's refusal to drop staged changes
+    subprocess.run(["git", "read-tree", "--reset", tree], check=True)
@@ -0,0 +1,231 @@
+import os
+import sqlite3
+import subprocess
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from .cache import make_key
+from .config import get_cache_dir, get_int
+from .git import common_dir_and_head, stream_git
+from .trace import span
+
+# HISTORY_EXAMPLES=N shows the model the subjects of N earlier commits that
+# touched the same files, so new messages pick up the repository's own
+# conventions (prefixes, scopes, tense). Reading `git log` on every commit
+# would be too slow on a large history, so each repository gets an index
+# under <CACHE_DIR>/history that is brought up to date from the last indexed
+# HEAD before each lookup:
+#
+#   commits  id (oldest first), sha, subject, kinds (A/D/R/M it made)
+#   touched  key -> commit id, for every path and its directory ("src/utils/")
+#
+# A lookup is a few indexed range reads, milliseconds however long the
+# history; only the first run in a repository reads its log.
+
+# Commits touching more files than this are indexed by the first ones only;
+# a sweeping change says little about any one file
+MAX_PATHS_PER_COMMIT: int = 20
+# Most recent commits considered per path or directory
+CANDIDATES_PER_KEY: int = 200
+# Paths of the current change used for the lookup
+MAX_LOOKUP_PATHS: int = 50
+
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS commits (
+    id INTEGER PRIMARY KEY,
+    sha TEXT UNIQUE NOT NULL,
+    subject TEXT NOT NULL,
+    kinds TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS touched (
+    key TEXT NOT NULL,
+    commit_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS touched_by_key ON touched (key, commit_id);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def _keys(path: str) -> list[str]:
+    directory: str = os.path.dirname(path)
+    return [path, f"{directory}/"] if directory else [path]
+
+
+def _parse_log(lines: Iterable[str]) -> Iterator[tuple[str, str, str, list[str]]]:
+    # `git log --name-status` output as (sha, subject, kinds, paths)
+    sha: str | None = None
+    subject: str = ""
+    kinds: set[str] = set()
+    paths: list[str] = []
+    for line in lines:
+        if line.startswith("\x1e"):
+            if sha is not None:
+                yield sha, subject, "".join(sorted(kinds)), paths
+            sha, subject = line[1:].split("\x1f", 1)
+            kinds, paths = set(), []
+        elif line and sha is not None:
+            # "M\tpath", or "R096\told\tnew" for renames and copies
+            fields: list[str] = line.split("\t")
+            kind: str = "M" if fields[0][0] in "CMT" else fields[0][0]
+            kinds.add(kind)
+            if len(paths) < MAX_PATHS_PER_COMMIT:
+                paths.append(fields[-1])
+    if sha is not None:
+        yield sha, subject, "".join(sorted(kinds)), paths
+
+
+def _index(
+    connection: sqlite3.Connection, rev_range: str, max_commits: int, repo_dir: str | None
+) -> int:
+    # Oldest first, so ids follow the history and a bigger id is more recent
+    log: Iterator[str] = stream_git(
+        "log",
+        "--no-merges",
+        "--reverse",
+        "-M",
+        f"--max-count={max_commits}",
+        "--format=%x1e%H%x1f%s",
+        "--name-status",
+        rev_range,
+        repo_dir=repo_dir,
+    )
+    indexed: int = 0
+    for sha, subject, kinds, paths in _parse_log(log):
+        cursor: sqlite3.Cursor = connection.execute(
+            "INSERT OR IGNORE INTO commits (sha, subject, kinds) VALUES (?, ?, ?)",
+            (sha, subject, kinds),
+        )
+        if cursor.rowcount == 0:
+            continue  # Indexed before a rebase or reset moved HEAD back
+        keys: set[str] = {key for path in paths for key in _keys(path)}
+        connection.executemany(
+            "INSERT INTO touched (key, commit_id) VALUES (?, ?)",
+            [(key, cursor.lastrowid) for key in keys],
+        )
+        indexed += 1
+    return indexed
+
+
+def _update(connection: sqlite3.Connection, head: str, repo_dir: str | None) -> None:
+    row: tuple | None = connection.execute(
+        "SELECT value FROM meta WHERE name = 'head'"
+    ).fetchone()
+    last_head: str | None = row[0] if row else None
+    if last_head == head:
+        return
+    max_commits: int = get_int("HISTORY_MAX_COMMITS", 10000)
+    with span("history.index") as index_span, connection:
+        try:
+            indexed: int = _index(
+                connection,
+                f"{last_head}..{head}" if last_head else head,
+                max_commits,
+                repo_dir,
+            )
+        except subprocess.CalledProcessError:
+            # The last indexed commit is gone; index from HEAD again
+            indexed = _index(connection, head, max_commits, repo_dir)
+        connection.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES ('head', ?)", (head,)
+        )
+        index_span.set(commits=indexed)
+
+
+def _connect(common_dir: str) -> sqlite3.Connection:
+    path: str = os.path.join(
+        get_cache_dir(), "history", f"{make_key(common_dir)}.sqlite"
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Other gencommit processes may be indexing the same repository
+    connection: sqlite3.Connection = sqlite3.connect(path, timeout=30)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+@contextmanager
+def _open_index(repo_dir: str | None) -> Iterator[sqlite3.Connection]:
+    common_dir, head = common_dir_and_head(repo_dir)
+    connection: sqlite3.Connection = _connect(common_dir)
+    try:
+        _update(connection, head, repo_dir)
+        yield connection
+    finally:
+        connection.close()
+
+
+def _commits_touching(connection: sqlite3.Connection, key: str) -> list[int]:
+    # The most recent first
+    return [
+        commit_id
+        for (commit_id,) in connection.execute(
+            "SELECT commit_id FROM touched WHERE key = ?"
+            " ORDER BY commit_id DESC LIMIT ?",
+            (key, CANDIDATES_PER_KEY),
+        )
+    ]
+
+
+def _lookup(
+    connection: sqlite3.Connection, statuses: dict[str, str], count: int
+) -> list[str]:
+    # A commit scores 2 per path it shares with the change and 1 per shared
+    # directory, plus 1 if it made the same kinds of change. Ties go to the
+    # more recent commit.
+    scores: dict[int, int] = {}
+    for path in list(statuses)[:MAX_LOOKUP_PATHS]:
+        for key in _keys(path):
+            weight: int = 1 if key.endswith("/") else 2
+            for commit_id in _commits_touching(connection, key):
+                scores[commit_id] = scores.get(commit_id, 0) + weight
+
+    kinds: str = "".join(sorted(set(statuses.values())))
+    candidates: list[int] = sorted(scores, key=lambda i: (scores[i], i), reverse=True)[
+        :CANDIDATES_PER_KEY
+    ]
+    ranked: list[tuple[int, int, str]] = []
+    for commit_id, subject, commit_kinds in connection.execute(
+        f"SELECT id, subject, kinds FROM commits"
+        f" WHERE id IN ({','.join('?' * len(candidates))})",
+        candidates,
+    ):
+        score: int = scores[commit_id] + (commit_kinds == kinds)
+        ranked.append((score, commit_id, subject))
+    ranked.sort(reverse=True)
+
+    # Too little in common: the latest commits still show the house style
+    subjects: list[str] = [subject for _, _, subject in ranked]
+    subjects += [
+        subject
+        for (subject,) in connection.execute(
+            "SELECT subject FROM commits ORDER BY id DESC LIMIT ?", (count * 2,)
+        )
+    ]
+    return list(dict.fromkeys(subjects))[:count]
+
+
+def few_shot_examples(
+    statuses: dict[str, str], repo_dir: str | None = None
+) -> list[str]:
+    """Subjects of earlier commits like the change to `statuses` (path -> A/D/R/M)."""
+    count: int = get_int("HISTORY_EXAMPLES", 0)
+    if count <= 0 or not statuses:
+        return []
+    with span("history") as history_span:
+        try:
+            with _open_index(repo_dir) as connection:
+                examples: list[str] = _lookup(connection, statuses, count)
+        except (subprocess.CalledProcessError, sqlite3.Error, OSError):
+            # No commits yet, or an unusable index: go without examples
+            return []
+        history_span.set(examples=len(examples))
+        return examples
+
+
+def co_changes(paths: Iterable[str], repo_dir: str | None = None) -> dict[str, set[int]]:
+    """Ids of the recent commits that touched each path, for coupling checks."""
+    with span("history"):
+        try:
+            with _open_index(repo_dir) as connection:
+                return {path: set(_commits_touching(connection, path)) for path in paths}
+        except (subprocess.CalledProcessError, sqlite3.Error, OSError):
+            return {}
@@ -0,0 +1,61 @@
+import json
+import threading
+import time
+
+from .cache import DiskCache, make_key
+
+# Rolling per-model request history, shared by every gencommit process through
+# the cache directory. Each sample is [unix time, seconds, succeeded].
+HISTORY_SIZE: int = 50
+# Fewer samples than this are too few to draw conclusions from
+MIN_SAMPLES: int = 5
+
+_lock: threading.Lock = threading.Lock()
+
+
+def _history_cache() -> DiskCache:
+    return DiskCache("latency")
+
+
+def load_history(model: str) -> list[list]:
+    cached: str | None = _history_cache().get(make_key(model))
+    if cached is None:
+        return []
+    try:
+        return json.loads(cached)
+    except ValueError:
+        return []
+
+
+def record_latency(model: str, seconds: float, ok: bool) -> None:
+    with _lock:
+        samples: list[list] = load_history(model)
+        samples.append([int(time.time()), round(seconds, 3), ok])
+        _history_cache().set(make_key(model), json.dumps(samples[-HISTORY_SIZE:]))
+
+
+def _recent(model: str, since: float | None) -> list[list]:
+    return [
+        sample
+        for sample in load_history(model)
+        if since is None or sample[0] >= since
+    ]
+
+
+def latency_percentile(
+    model: str, percentile: int, since: float | None = None
+) -> float | None:
+    durations: list[float] = sorted(
+        seconds for _, seconds, ok in _recent(model, since) if ok
+    )
+    if len(durations) < MIN_SAMPLES:
+        return None
+    index: int = min(len(durations) - 1, len(durations) * percentile // 100)
+    return durations[index]
+
+
+def error_rate(model: str, since: float | None = None) -> float | None:
+    samples: list[list] = _recent(model, since)
+    if len(samples) < MIN_SAMPLES:
+        return None
+    return sum(not ok for _, _, ok in samples) / len(samples)
@@ -1,36 +1,475 @@
-from openai import OpenAI
+import asyncio
+import atexit
+import contextvars
+import random
+import threading
+import time
+import weakref
+from functools import lru_cache
+from typing import Awaitable, Callable
+
+from openai import (
+    APIConnectionError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
 from openai.types.chat import ChatCompletion
 from pydantic import BaseModel
 
-from .config import read_config
+from .cache import make_key
+from .config import get_config, get_int
+from .latency import latency_percentile, record_latency
+from .ratelimit import await_capacity, wait_for_capacity
+from .tokenizer import approx_token_count
+from .trace import Span, span
+
+# Worth another attempt: network failures and timeouts (APITimeoutError is an
+# APIConnectionError), rate limits and 5xx responses
+RETRYABLE_ERRORS: tuple[type[Exception], ...] = (
+    APIConnectionError,
+    RateLimitError,
+    InternalServerError,
+)
+
+# Output limit for callers that don't size it to the response they expect
+DEFAULT_MAX_TOKENS: int = 1024
+
+# Called with (field_name, value) as soon as each top-level field of the
+# structured response is complete, in schema order
+FieldCallback = Callable[[str, object], None]
+
+# Async clients hold connections bound to the loop that created them, so they
+# are pooled per event loop and dropped along with it
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple, AsyncOpenAI]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+# Hedged requests made from sync code run on this one loop, in a thread of
+# its own, so they share its async clients instead of each leaking a new one
+_background_loop: asyncio.AbstractEventLoop | None = None
+_background_lock: threading.Lock = threading.Lock()
 
 
 def chat(
     system_prompt: str,
     user_prompt: str,
     response_model: BaseModel,
+    on_field: FieldCallback | None = None,
+    model: str | None = None,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+) -> BaseModel:
+    # model is a "provider:name" string, MODEL from the config by default
+    model = model or _primary_model()
+    if _hedge_model(model):
+        return _fields_reported(
+            _run_in_background(
+                _hedged_chat(model, system_prompt, user_prompt, response_model, max_tokens)
+            ),
+            response_model,
+            on_field,
+        )
+    return _with_retries(
+        model,
+        lambda: _chat_once(
+            model, system_prompt, user_prompt, response_model, on_field, max_tokens
+        ),
+        _request_tokens(system_prompt, user_prompt, max_tokens),
+    )
+
+
+async def achat(
+    system_prompt: str,
+    user_prompt: str,
+    response_model: BaseModel,
+    on_field: FieldCallback | None = None,
+    model: str | None = None,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+) -> BaseModel:
+    model = model or _primary_model()
+    if _hedge_model(model):
+        return _fields_reported(
+            await _hedged_chat(
+                model, system_prompt, user_prompt, response_model, max_tokens
+            ),
+            response_model,
+            on_field,
+        )
+    return await _awith_retries(
+        model,
+        lambda: _achat_once(
+            model, system_prompt, user_prompt, response_model, on_field, max_tokens
+        ),
+        _request_tokens(system_prompt, user_prompt, max_tokens),
+    )
+
+
+def _chat_once(
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    response_model: BaseModel,
+    on_field: FieldCallback | None,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+) -> BaseModel:
+    provider_params, request_params = _get_params(model)
+    client: OpenAI = _get_client(**provider_params)
+    request: dict = _build_request(
+        system_prompt, user_prompt, response_model, request_params, max_tokens
+    )
+
+    with span(
+        "chat",
+        model=request_params["model"],
+        streamed=on_field is not None,
+        prompt_bytes=len(system_prompt) + len(user_prompt),
+    ) as chat_span:
+        if on_field is None:
+            response: ChatCompletion = client.chat.completions.parse(**request)
+            _record_usage(chat_span, response)
+            return _parsed(model, response)
+
+        fields: _FieldTracker = _FieldTracker(response_model, on_field)
+        with client.chat.completions.stream(**request) as stream:
+            for event in stream:
+                if event.type == "content.delta":
+                    fields.update(event.parsed)
+            response = stream.get_final_completion()
+        _record_usage(chat_span, response)
+    parsed: BaseModel = _parsed(model, response)
+    fields.finish(parsed)
+    return parsed
+
+
+async def _achat_once(
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    response_model: BaseModel,
+    on_field: FieldCallback | None,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+) -> BaseModel:
+    provider_params, request_params = _get_params(model)
+    client: AsyncOpenAI = _get_async_client(**provider_params)
+    request: dict = _build_request(
+        system_prompt, user_prompt, response_model, request_params, max_tokens
+    )
+
+    with span(
+        "achat",
+        model=request_params["model"],
+        streamed=on_field is not None,
+        prompt_bytes=len(system_prompt) + len(user_prompt),
+    ) as chat_span:
+        if on_field is None:
+            response: ChatCompletion = await client.chat.completions.parse(**request)
+            _record_usage(chat_span, response)
+            return _parsed(model, response)
+
+        fields: _FieldTracker = _FieldTracker(response_model, on_field)
+        async with client.chat.completions.stream(**request) as stream:
+            async for event in stream:
+                if event.type == "content.delta":
+                    fields.update(event.parsed)
+            response = await stream.get_final_completion()
+        _record_usage(chat_span, response)
+    parsed: BaseModel = _parsed(model, response)
+    fields.finish(parsed)
+    return parsed
+
+
+def _fields_reported(
+    parsed: BaseModel, response_model: BaseModel, on_field: FieldCallback | None
+) -> BaseModel:
+    # Hedged requests aren't streamed; their fields are reported once the
+    # winner is done
+    if on_field is not None:
+        _FieldTracker(response_model, on_field).finish(parsed)
+    return parsed
+
+
+def _record_usage(chat_span: Span, response: ChatCompletion) -> None:
+    if response.usage is not None:
+        chat_span.set(
+            prompt_tokens=response.usage.prompt_tokens,
+            completion_tokens=response.usage.completion_tokens,
+        )
+
+
+def _parsed(model: str, response: ChatCompletion) -> BaseModel:
+    parsed: BaseModel | None = response.choices[0].message.parsed
+    if parsed is None:
+        # A refusal or output that doesn't match the schema
+        raise ValueError(f"{model} returned no usable response")
+    return parsed
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: concurrent retries against a struggling provider spread out
+    # instead of arriving together
+    base: float = get_int("RETRY_BACKOFF_MS", 250) / 1000
+    return random.uniform(0, base * 2**attempt)
+
+
+def _request_tokens(system_prompt: str, user_prompt: str, max_tokens: int) -> int:
+    # What a provider's tokens-per-minute limit charges for a request
+    return approx_token_count(system_prompt) + approx_token_count(user_prompt) + max_tokens
+
+
+def _rate_limits(model: str) -> tuple[str, int, int] | None:
+    # (bucket, requests/min, tokens/min) for the model's API key, or None when
+    # unlimited. Per provider, e.g. OPENAI_RPM=500, else RATE_LIMIT_RPM.
+    provider: str = model.lower().split(":", 1)[0]
+    prefix: str = "GOOGLE" if provider == "ollama" else provider.upper()
+    rpm: int = get_int(f"{prefix}_RPM", get_int("RATE_LIMIT_RPM", 0))
+    tpm: int = get_int(f"{prefix}_TPM", get_int("RATE_LIMIT_TPM", 0))
+    if not rpm and not tpm:
+        return None
+    provider_params, _ = _get_params(model)
+    # Processes share a bucket exactly when they share a key and endpoint
+    bucket: str = make_key(
+        provider_params["api_key"], provider_params.get("base_url") or provider
+    )[:16]
+    return bucket, rpm, tpm
+
+
+def _with_retries(
+    model: str, call: Callable[[], BaseModel], tokens: int = 0
 ) -> BaseModel:
-    provider_params, request_params = _get_params()
+    retries: int = get_int("RETRIES", 2)
+    limits: tuple[str, int, int] | None = _rate_limits(model)
+    for attempt in range(retries + 1):
+        if limits is not None:
+            # Queueing happens before the clock starts; it says nothing about
+            # the model's latency
+            wait_for_capacity(*limits, tokens)
+        start_time = time.perf_counter()
+        try:
+            result: BaseModel = call()
+        except Exception as e:
+            record_latency(model, time.perf_counter() - start_time, ok=False)
+            if attempt == retries or not isinstance(e, RETRYABLE_ERRORS):
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+        record_latency(model, time.perf_counter() - start_time, ok=True)
+        return result
+
 
-    client: OpenAI = OpenAI(**provider_params)
-    response: ChatCompletion = client.chat.completions.parse(
+async def _awith_retries(
+    model: str, call: Callable[[], Awaitable[BaseModel]], tokens: int = 0
+) -> BaseModel:
+    retries: int = get_int("RETRIES", 2)
+    limits: tuple[str, int, int] | None = _rate_limits(model)
+    for attempt in range(retries + 1):
+        if limits is not None:
+            await await_capacity(*limits, tokens)
+        start_time = time.perf_counter()
+        try:
+            result: BaseModel = await call()
+        except asyncio.CancelledError:
+            # Lost a hedged race; the time so far is a lower bound on its latency,
+            # and leaving it out would bias the percentile towards fast requests
+            record_latency(model, time.perf_counter() - start_time, ok=True)
+            raise
+        except Exception as e:
+            record_latency(model, time.perf_counter() - start_time, ok=False)
+            if attempt == retries or not isinstance(e, RETRYABLE_ERRORS):
+                raise
+            await asyncio.sleep(_backoff(attempt))
+            continue
+        record_latency(model, time.perf_counter() - start_time, ok=True)
+        return result
+
+
+def _hedge_delay(model: str) -> float:
+    # Hedge once the primary is slower than it usually is: its own observed
+    # percentile latency, or a fixed delay until there is enough history
+    observed: float | None = latency_percentile(model, get_int("HEDGE_PERCENTILE", 95))
+    if observed is not None:
+        return observed
+    return get_int("HEDGE_DELAY_MS", 3000) / 1000
+
+
+def _hedge_model(model: str) -> str | None:
+    hedge_model: str | None = get_config().get("HEDGE_MODEL")
+    # Racing a model against itself would only double the load
+    return hedge_model if hedge_model and hedge_model != model else None
+
+
+async def _hedged_chat(
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    response_model: BaseModel,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+) -> BaseModel:
+    models: list[str] = [model, _hedge_model(model)]
+
+    def start(model: str) -> asyncio.Task:
+        return asyncio.create_task(
+            _awith_retries(
+                model,
+                lambda: _achat_once(
+                    model, system_prompt, user_prompt, response_model, None, max_tokens
+                ),
+                _request_tokens(system_prompt, user_prompt, max_tokens),
+            )
+        )
+
+    with span("hedge", primary=models[0], secondary=models[1]) as hedge_span:
+        tasks: list[asyncio.Task] = [start(models[0])]
+        done, _ = await asyncio.wait(tasks, timeout=_hedge_delay(models[0]))
+        # Fire the secondary if the primary is slow or has already failed
+        if not done or tasks[0].exception() is not None:
+            tasks.append(start(models[1]))
+        hedge_span.set(hedged=len(tasks) > 1)
+
+        try:
+            pending: set[asyncio.Task] = set(tasks)
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        hedge_span.set(winner=models[tasks.index(task)])
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # The loser's connection is closed rather than left running
+            for task in tasks:
+                task.cancel()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_background_loop.run_forever, name="gencommit-hedge", daemon=True
+            ).start()
+            atexit.register(_close_background_loop)
+    return _background_loop
+
+
+async def _close_clients(clients: list[AsyncOpenAI]) -> None:
+    await asyncio.gather(*(client.close() for client in clients))
+
+
+def _close_background_loop() -> None:
+    # Closes the pooled connections while their loop still runs
+    clients: list[AsyncOpenAI] = list(_async_clients.get(_background_loop, {}).values())
+    try:
+        asyncio.run_coroutine_threadsafe(
+            _close_clients(clients), _background_loop
+        ).result(timeout=1)
+    except Exception:
+        pass  # Exiting anyway
+    _background_loop.call_soon_threadsafe(_background_loop.stop)
+
+
+async def _in_context(
+    coroutine: Awaitable[BaseModel], context: contextvars.Context
+) -> BaseModel:
+    return await asyncio.get_running_loop().create_task(coroutine, context=context)
+
+
+def _run_in_background(coroutine: Awaitable[BaseModel]) -> BaseModel:
+    # The caller's context goes along, so spans nest under the caller's
+    future = asyncio.run_coroutine_threadsafe(
+        _in_context(coroutine, contextvars.copy_context()), _get_background_loop()
+    )
+    try:
+        return future.result()
+    except BaseException:
+        # Ctrl-C while waiting: don't leave the race running
+        future.cancel()
+        raise
+
+
+def _primary_model() -> str:
+    model: str | None = get_config().get("MODEL")
+    if not model:
+        raise ValueError("MODEL not found in config")
+    return model
+
+
+def _build_request(
+    system_prompt: str,
+    user_prompt: str,
+    response_model: BaseModel,
+    request_params: dict,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+) -> dict:
+    return {
         **request_params,
-        messages=[
+        "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ],
-        max_tokens=1024,
-        temperature=0,
-        response_format=response_model,
+        "max_tokens": max_tokens,
+        "temperature": 0,
+        "response_format": response_model,
+    }
+
+
+class _FieldTracker:
+    # The model writes fields in schema order, so a field is final as soon as
+    # the next one shows up in the partially parsed JSON.
+
+    def __init__(self, response_model: BaseModel, on_field: FieldCallback):
+        self.names: list[str] = list(response_model.model_fields)
+        self.on_field: FieldCallback = on_field
+        self.emitted: int = 0
+
+    def update(self, partial: dict | None) -> None:
+        if not partial:
+            return
+        while self.emitted + 1 < len(self.names) and self.names[self.emitted + 1] in partial:
+            name: str = self.names[self.emitted]
+            self.on_field(name, partial.get(name))
+            self.emitted += 1
+
+    def finish(self, parsed: BaseModel | None) -> None:
+        if parsed is None:
+            return
+        for name in self.names[self.emitted :]:
+            self.on_field(name, getattr(parsed, name))
+        self.emitted = len(self.names)
+
+
+@lru_cache(maxsize=None)
+def _get_client(
+    api_key: str, base_url: str | None = None, timeout: float | None = None
+) -> OpenAI:
+    # One client (and HTTP connection pool) per provider for the whole process.
+    # Retries are ours (with jitter and latency tracking), not the SDK's.
+    return OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+
+
+def _get_async_client(
+    api_key: str, base_url: str | None = None, timeout: float | None = None
+) -> AsyncOpenAI:
+    clients: dict[tuple, AsyncOpenAI] = _async_clients.setdefault(
+        asyncio.get_running_loop(), {}
     )
-    return response.choices[0].message.parsed
+    key: tuple = (api_key, base_url, timeout)
+    if key not in clients:
+        clients[key] = AsyncOpenAI(
+            api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0
+        )
+    return clients[key]
 
 
-def _get_params() -> tuple[dict, dict]:
-    config: dict = read_config()
-    model: str = config.get("MODEL")
-    if not model:
-        raise ValueError("MODEL not found in config")
+def _get_params(model: str | None = None) -> tuple[dict, dict]:
+    config: dict = get_config()
+    if model is None:
+        model = _primary_model()
 
     provider, model_name = model.lower().split(":", 1)
 
@@ -42,13 +481,17 @@ def _get_params() -> tuple[dict, dict]:
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment")
         provider_params["api_key"] = api_key
+        # Any OpenAI-compatible endpoint: a proxy, a local model, the benchmark stub
+        if config.get("OPENAI_BASE_URL"):
+            provider_params["base_url"] = config["OPENAI_BASE_URL"]
     elif provider == "anthropic":
         api_key: str = config.get("ANTHROPIC_API_KEY")
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment")
         provider_params["api_key"] = api_key
         provider_params["base_url"] = "https://api.anthropic.com/v1/"
-    elif provider == "ollama":
+    elif provider in ("google", "ollama"):
+        # Gemini's OpenAI-compatible endpoint; "ollama" is still accepted
         api_key: str = config.get("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY not found in environment")
@@ -59,6 +502,14 @@ def _get_params() -> tuple[dict, dict]:
     else:
         raise ValueError(f"Invalid provider: {provider}")
 
+    # Per-provider timeout in seconds, e.g. ANTHROPIC_TIMEOUT=20
+    timeout_key: str = (
+        "GOOGLE_TIMEOUT" if provider == "ollama" else f"{provider.upper()}_TIMEOUT"
+    )
+    provider_params["timeout"] = float(
+        get_int(timeout_key, get_int("REQUEST_TIMEOUT", 60))
+    )
+
     reasoning_models: list[str] = [
         "gemini-2.5-flash-lite",
         "gemini-2.5-flash",
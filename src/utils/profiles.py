@@ -0,0 +1,70 @@
+from dataclasses import dataclass
+
+from .config import get_config
+
+# RESPONSE_PROFILE (or --response-profile) picks what the model writes back.
+# Output tokens are the slow part of a request, so the leaner profiles skip
+# the scratchpad and put the title first:
+#
+#   full        scratchpad, title, description (the default)
+#   lean        title, description
+#   title       title only
+#   bullets:N   title, description of at most N bullets
+
+# Generous per-field output estimates in tokens: a response cut off by
+# max_tokens is unusable, while a loose limit costs nothing
+RESPONSE_OVERHEAD_TOKENS: int = 32
+TITLE_TOKENS: int = 48
+BULLET_TOKENS: int = 48
+# An uncapped description gets more bullets the larger the diff
+MIN_BULLETS: int = 4
+MAX_BULLETS: int = 16
+PROMPT_TOKENS_PER_BULLET: int = 1000
+# The scratchpad keeps the old fixed limit as its floor
+SCRATCHPAD_MIN_TOKENS: int = 1024
+SCRATCHPAD_MAX_TOKENS: int = 4096
+
+
+@dataclass(frozen=True)
+class ResponseProfile:
+    name: str
+    scratchpad: bool = False
+    description: bool = True
+    max_bullets: int | None = None
+
+
+def parse_profile(value: str) -> ResponseProfile:
+    value = value.strip().lower()
+    if value == "full":
+        return ResponseProfile(value, scratchpad=True)
+    if value == "lean":
+        return ResponseProfile(value)
+    if value == "title":
+        return ResponseProfile(value, description=False)
+    if value.startswith("bullets:"):
+        count: str = value.split(":", 1)[1]
+        if count.isdigit() and int(count) > 0:
+            return ResponseProfile(value, max_bullets=int(count))
+    raise ValueError(
+        f"Invalid response profile {value!r}: use full, lean, title or bullets:N"
+    )
+
+
+def get_profile(value: str | None = None) -> ResponseProfile:
+    # The per-invocation choice, else the config's, else full
+    return parse_profile(value or get_config().get("RESPONSE_PROFILE") or "full")
+
+
+def max_output_tokens(profile: ResponseProfile, prompt_tokens: int) -> int:
+    tokens: int = RESPONSE_OVERHEAD_TOKENS + TITLE_TOKENS
+    if profile.description:
+        bullets: int = profile.max_bullets or min(
+            MAX_BULLETS, MIN_BULLETS + prompt_tokens // PROMPT_TOKENS_PER_BULLET
+        )
+        tokens += bullets * BULLET_TOKENS
+    if profile.scratchpad:
+        # Reasoning about a bigger diff takes more words
+        tokens = min(
+            SCRATCHPAD_MAX_TOKENS, max(SCRATCHPAD_MIN_TOKENS, tokens + prompt_tokens // 10)
+        )
+    return tokens
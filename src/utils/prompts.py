@@ -17,9 +17,25 @@ Follow these guidelines:
 """.strip()
 
 
-def COMMIT_PROMPT_WITH_DESCRIPTION(diffs: str) -> str:
+def _examples_block(examples: list[str] | None) -> str:
+    if not examples:
+        return ""
+    subjects: str = "\n".join(f"- {example}" for example in examples)
     return f"""
-Given the following code changes:
+Earlier commit messages in this repository for similar changes:
+
+<examples>
+{subjects}
+</examples>
+
+Follow their conventions (prefixes, scopes, tense, capitalization) but describe only the changes below.
+
+"""
+
+
+def COMMIT_PROMPT_WITH_DESCRIPTION(diffs: str, examples: list[str] | None = None) -> str:
+    return f"""
+{_examples_block(examples)}Given the following code changes:
 
 <diffs>
 {diffs}
@@ -27,3 +43,66 @@ Given the following code changes:
 
 Please generate a concise and informative git commit message and description based on these changes.
 """.strip()
+
+
+def CHUNK_PROMPT_SYSTEM() -> str:
+    return """
+You are senior engineer reviewing one part of a large git diff. \
+Your task is to summarize what this part of the diff changes so a commit message can be written later from all the parts.
+
+<guidelines>
+Follow these guidelines:
+
+- Write 1-5 hyphenated bullet points, each one line.
+- Focus on functional changes and name the files, modules or symbols involved.
+- Skip formatting noise and mechanical churn unless that is all there is.
+</guidelines>
+""".strip()
+
+
+def CHUNK_PROMPT(diffs: str) -> str:
+    return f"""
+Given the following part of a larger set of code changes:
+
+<diffs>
+{diffs}
+</diffs>
+
+Please summarize the changes in this part.
+""".strip()
+
+
+def COMMIT_PROMPT_FROM_SUMMARIES(
+    summaries: str, examples: list[str] | None = None
+) -> str:
+    return f"""
+{_examples_block(examples)}The changes were too large to show in full, so each part was summarized separately:
+
+<summaries>
+{summaries}
+</summaries>
+
+Please generate a concise and informative git commit message and description covering all of these changes.
+""".strip()
+
+
+def COMMIT_PROMPT_UPDATE(message: str, diffs: str) -> str:
+    return f"""
+This commit message was written for an earlier version of the changes:
+
+<message>
+{message}
+</message>
+
+The commit has since been amended. These are the changes made after the message was written:
+
+<diffs>
+{diffs}
+</diffs>
+
+Please update the commit message and description so they cover the amended commit. Keep what is still accurate and only change what these new changes affect.
+""".strip()
+
+
+# Bump whenever a prompt changes so cached responses from older prompts are ignored
+PROMPT_VERSION: str = "1"
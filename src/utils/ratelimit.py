@@ -0,0 +1,136 @@
+import asyncio
+import fcntl
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator
+
+from .config import get_cache_dir
+from .trace import span
+
+# A token bucket per API key, shared by every gencommit process on the host
+# through a small state file under <CACHE_DIR>/ratelimit. Each bucket holds
+# up to a minute of requests and tokens and refills continuously. Callers
+# queue in the same file and are served first come, first served: only the
+# head of the queue may take capacity, so a burst of processes gets a steady
+# stream of requests instead of a storm of 429s.
+#
+#   {"updated": 1718000000.0, "requests": 12.5, "tokens": 48000.0,
+#    "queue": [["<waiter id>", <last seen>], ...]}
+
+# How often a waiter that isn't at the head of the queue checks again
+POLL_INTERVAL: float = 0.05
+# The head of the queue re-checks at least this often, to keep its place
+MAX_SLEEP: float = 1.0
+# A waiter not seen for this long has died and loses its place
+STALE_AFTER: float = 5.0
+
+
+def _state_path(bucket: str) -> str:
+    return os.path.join(get_cache_dir(), "ratelimit", f"{bucket}.json")
+
+
+@contextmanager
+def _locked_state(bucket: str) -> Iterator[dict]:
+    path: str = _state_path(bucket)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            try:
+                state: dict = json.loads(f.read() or "{}")
+            except ValueError:
+                state = {}
+            yield state
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _refill(state: dict, rpm: int, tpm: int, now: float) -> None:
+    # Both levels are capped at one minute's worth; a fresh bucket starts full
+    elapsed: float = now - state.get("updated", 0.0)
+    state["requests"] = min(rpm, state.get("requests", rpm) + elapsed * rpm / 60)
+    state["tokens"] = min(tpm, state.get("tokens", tpm) + elapsed * tpm / 60)
+    state["updated"] = now
+
+
+def _try_acquire(bucket: str, rpm: int, tpm: int, tokens: int, waiter: str) -> float:
+    # 0 once capacity was taken, otherwise how long to wait before asking again
+    with _locked_state(bucket) as state:
+        now: float = time.time()
+        _refill(state, rpm, tpm, now)
+        queue: list[list] = [
+            entry
+            for entry in state.get("queue", [])
+            if entry[0] == waiter or now - entry[1] < STALE_AFTER
+        ]
+        for entry in queue:
+            if entry[0] == waiter:
+                entry[1] = now
+                break
+        else:
+            queue.append([waiter, now])
+        state["queue"] = queue
+        if queue[0][0] != waiter:
+            return POLL_INTERVAL
+
+        # A request bigger than the whole bucket waits for a full one
+        needed_tokens: float = min(tokens, tpm)
+        waits: list[float] = [0.0]
+        if rpm and state["requests"] < 1:
+            waits.append((1 - state["requests"]) * 60 / rpm)
+        if tpm and state["tokens"] < needed_tokens:
+            waits.append((needed_tokens - state["tokens"]) * 60 / tpm)
+        if max(waits) > 0:
+            return min(max(waits), MAX_SLEEP)
+
+        if rpm:
+            state["requests"] -= 1
+        if tpm:
+            state["tokens"] -= needed_tokens
+        queue.pop(0)
+        return 0.0
+
+
+def _leave(bucket: str, waiter: str) -> None:
+    with _locked_state(bucket) as state:
+        state["queue"] = [entry for entry in state.get("queue", []) if entry[0] != waiter]
+
+
+def wait_for_capacity(bucket: str, rpm: int, tpm: int, tokens: int) -> None:
+    """Block until the shared bucket has room for one request of `tokens`."""
+    waiter: str = uuid.uuid4().hex
+    acquired: bool = False
+    with span("rate_limit", tokens=tokens) as limit_span:
+        start_time: float = time.perf_counter()
+        try:
+            while (delay := _try_acquire(bucket, rpm, tpm, tokens, waiter)) > 0:
+                time.sleep(delay)
+            acquired = True
+        finally:
+            if not acquired:
+                _leave(bucket, waiter)  # Interrupted; don't hold up the queue
+            limit_span.set(waited_ms=round((time.perf_counter() - start_time) * 1000))
+
+
+async def await_capacity(bucket: str, rpm: int, tpm: int, tokens: int) -> None:
+    waiter: str = uuid.uuid4().hex
+    acquired: bool = False
+    with span("rate_limit", tokens=tokens) as limit_span:
+        start_time: float = time.perf_counter()
+        try:
+            while (delay := _try_acquire(bucket, rpm, tpm, tokens, waiter)) > 0:
+                await asyncio.sleep(delay)
+            acquired = True
+        finally:
+            if not acquired:
+                # Cancelled, e.g. the other side of a hedged race won
+                _leave(bucket, waiter)
+            limit_span.set(waited_ms=round((time.perf_counter() - start_time) * 1000))
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from .config import get_int
+from .diff import FormattedDiff, build_diff
+from .git import (
+    CommitInfo,
+    Revisions,
+    commit_tree,
+    list_commits,
+    rev_parse,
+    stream_commit_diff,
+    update_ref,
+)
+from .trivial import TrivialChange, fast_path_enabled
+
+if TYPE_CHECKING:
+    from .schemas import CommitMessage
+
+
+def _generate_for_commit(
+    commit: CommitInfo, use_cache: bool, profile: str | None
+) -> CommitMessage | TrivialChange:
+    from .generate import generate_for_diff
+
+    # A root commit has no parent; its files are all added
+    formatted_diff: FormattedDiff = build_diff(
+        stream_commit_diff(commit.sha),
+        revisions=Revisions(f"{commit.sha}^", commit.sha),
+    )
+    if formatted_diff.trivial is not None and fast_path_enabled():
+        return formatted_diff.trivial
+    return generate_for_diff(
+        formatted_diff,
+        lambda: stream_commit_diff(commit.sha),
+        use_cache=use_cache,
+        profile=profile,
+    )
+
+
+def _full_message(message: CommitMessage | TrivialChange) -> str:
+    if message.commit_description:
+        return f"{message.commit_message}\n\n{message.commit_description}\n"
+    return f"{message.commit_message}\n"
+
+
+def reword(
+    rev_range: str,
+    workers: int | None = None,
+    use_cache: bool = True,
+    profile: str | None = None,
+) -> bool:
+    if workers is None:
+        workers = get_int("REWORD_WORKERS", 8)
+
+    try:
+        commits: list[CommitInfo] = list_commits(rev_range)
+        head: str = rev_parse("HEAD")
+    except subprocess.CalledProcessError:
+        print(f"Invalid revision range: {rev_range}")
+        return False
+    if not commits:
+        print(f"No commits in {rev_range}.")
+        return False
+    if commits[-1].sha != head:
+        # Rewriting a range that HEAD doesn't end on would orphan its descendants
+        print("Reword only supports ranges that end at HEAD (e.g. main..HEAD).")
+        return False
+
+    print(f"Generating messages for {len(commits)} commits with {workers} workers...")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        messages: list[CommitMessage | TrivialChange] = list(
+            executor.map(lambda commit: _generate_for_commit(commit, use_cache, profile), commits)
+        )
+
+    for commit, message in zip(commits, messages):
+        print(f"{commit.sha[:10]} {message.commit_message}")
+    user_input = (
+        input(f"\nRewrite {len(commits)} commits with these messages? (Y/n): ")
+        .strip()
+        .lower()
+    )
+    if user_input not in ["y", ""]:
+        print("Reword cancelled.")
+        return False
+
+    # Replay the range once with plumbing: same trees, authors and dates, new
+    # messages, parents remapped onto the rewritten commits. The index and work
+    # tree are untouched since the final tree is identical.
+    rewritten: dict[str, str] = {}
+    for commit, message in zip(commits, messages):
+        parents: list[str] = [rewritten.get(parent, parent) for parent in commit.parents]
+        rewritten[commit.sha] = commit_tree(commit, parents, _full_message(message))
+
+    update_ref("HEAD", rewritten[head], head, f"gencommit: reword {rev_range}")
+    print(f"Reworded {len(commits)} commits.")
+    return True
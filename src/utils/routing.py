@@ -0,0 +1,87 @@
+import time
+
+from .config import get_config, get_int
+from .latency import error_rate, latency_percentile
+from .tokenizer import byte_bound, count_tokens
+from .trace import span
+
+# MODEL_ROUTES=4000:google:gemini-2.5-flash-lite,30000:openai:gpt-4.1-mini,200000:anthropic:claude-sonnet-4-0
+# Each route is the largest prompt (in tokens) a model should get. A prompt goes
+# to the smallest route that fits, unless recent history says that model is
+# failing or is slower than a bigger one anyway.
+
+
+def _parse_routes(value: str) -> list[tuple[int, str]]:
+    routes: list[tuple[int, str]] = []
+    for route in value.split(","):
+        if not route.strip():
+            continue
+        limit, _, model = route.strip().partition(":")
+        if not limit.isdigit() or ":" not in model:
+            raise ValueError(
+                f"Invalid MODEL_ROUTES entry: {route.strip()}"
+                " (expected limit:provider:model)"
+            )
+        routes.append((int(limit), model))
+    return sorted(routes)
+
+
+def _is_demoted(model: str, bigger_models: list[str], since: float) -> bool:
+    failures: float | None = error_rate(model, since)
+    if failures is not None and failures * 100 >= get_int("ROUTE_MAX_ERROR_PERCENT", 50):
+        return True
+    median: float | None = latency_percentile(model, 50, since)
+    if median is None:
+        return False
+    # Not worth using a small model that is currently slower than a bigger one
+    return any(
+        other_median is not None and other_median < median
+        for other_median in (
+            latency_percentile(other, 50, since) for other in bigger_models
+        )
+    )
+
+
+def configured_models() -> list[str]:
+    routes_value: str | None = get_config().get("MODEL_ROUTES")
+    if routes_value:
+        return [model for _, model in _parse_routes(routes_value)]
+    return [get_config().get("MODEL", "")]
+
+
+def models_key() -> str:
+    # Cached responses are keyed on the configured models, not on the one a
+    # request was routed to: a model demoted for being slow or failing would
+    # otherwise cost a fresh request on exactly the diffs already answered
+    config: dict = get_config()
+    return config.get("MODEL_ROUTES") or config.get("MODEL", "")
+
+
+def route_model(prompt: str) -> str:
+    """Pick the model for a prompt from MODEL_ROUTES, or MODEL without routes."""
+    routes_value: str | None = get_config().get("MODEL_ROUTES")
+    if not routes_value:
+        return get_config().get("MODEL", "")
+    routes: list[tuple[int, str]] = _parse_routes(routes_value)
+
+    with span("route") as route_span:
+        # Byte length bounds the token count, so small prompts skip the tokenizer
+        tokens: int = byte_bound(prompt)
+        if tokens > routes[0][0]:
+            tokens = count_tokens(prompt)
+        candidates: list[str] = [model for limit, model in routes if limit >= tokens]
+        if not candidates:
+            # Bigger than every route; the largest context gets a truncated prompt
+            candidates = [routes[-1][1]]
+
+        # Samples older than the window are ignored, so a demoted model gets
+        # tried again once its bad streak ages out
+        since: float = time.time() - get_int("ROUTE_WINDOW_MINUTES", 60) * 60
+        healthy: list[str] = [
+            model
+            for index, model in enumerate(candidates)
+            if not _is_demoted(model, candidates[index + 1 :], since)
+        ]
+        model: str = (healthy or candidates)[0]
+        route_span.set(tokens=tokens, model=model, demoted=len(candidates) - len(healthy))
+    return model
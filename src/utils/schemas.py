@@ -0,0 +1,70 @@
+from functools import lru_cache
+
+from pydantic import BaseModel, Field, computed_field, create_model
+
+from .profiles import ResponseProfile
+
+
+class CommitMessage(BaseModel):
+    thinking: str = Field(
+        ...,
+        description="A scratchpad to put your concise reasoning and chain of thought after looking at the diffs.",
+    )
+    commit_message: str = Field(
+        ..., description="Brief descriptive commit message in no longer than 10 words"
+    )
+    commit_description: str = Field(
+        ..., description="Hyphenated bullet point list of changes"
+    )
+
+
+# The lean profiles ask for the title first, so it is done as early as possible
+
+
+class LeanCommitMessage(BaseModel):
+    commit_message: str = Field(
+        ..., description="Brief descriptive commit message in no longer than 10 words"
+    )
+    commit_description: str = Field(
+        ..., description="Hyphenated bullet point list of changes"
+    )
+
+
+class CommitTitle(BaseModel):
+    commit_message: str = Field(
+        ..., description="Brief descriptive commit message in no longer than 10 words"
+    )
+
+    # Not asked of the model, but every caller reads both fields
+    @computed_field
+    @property
+    def commit_description(self) -> str:
+        return ""
+
+
+@lru_cache(maxsize=None)
+def response_model(profile: ResponseProfile) -> type[BaseModel]:
+    if profile.scratchpad:
+        return CommitMessage
+    if not profile.description:
+        return CommitTitle
+    if profile.max_bullets is None:
+        return LeanCommitMessage
+    return create_model(
+        f"CommitMessageUpTo{profile.max_bullets}Bullets",
+        __base__=LeanCommitMessage,
+        commit_description=(
+            str,
+            Field(
+                ...,
+                description="Hyphenated bullet point list of at most "
+                f"{profile.max_bullets} of the most important changes",
+            ),
+        ),
+    )
+
+
+class ChunkSummary(BaseModel):
+    summary: str = Field(
+        ..., description="Hyphenated bullet point list summarizing this part of the diff"
+    )
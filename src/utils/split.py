@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from .amend import record_commit
+from .config import get_int
+from .diff import FileDiff, FormattedDiff, build_diff, change_status, iter_file_diffs
+from .git import Revisions, apply_to_index, commit, read_tree, staged_patch, write_tree
+from .trivial import TrivialChange, fast_path_enabled
+
+if TYPE_CHECKING:
+    from .schemas import CommitMessage
+
+# `gencommit --split` turns a staged mix of unrelated changes into several
+# commits. Staged files are grouped when they are coupled (a file and its
+# test, or files that earlier commits often changed together) or sit in the
+# same directory with the same kind of change. Every group's message is
+# generated concurrently from that group's diff alone, then the groups are
+# committed one after another by applying each one's patch to the index.
+#
+# Groups are made of whole files: a commit holding some of a file's hunks
+# and not others would rarely build on its own.
+
+# Files that changed together in at least this many earlier commits, and in
+# at least half of the commits of the less often changed one, are coupled
+COUPLED_COMMITS: int = 2
+
+_TEST_AFFIXES: re.Pattern = re.compile(r"^test_|_test$|_spec$|\.test$|\.spec$")
+_TEST_DIRECTORIES: set[str] = {"test", "tests", "spec", "__tests__"}
+
+
+@dataclass
+class FilePatch:
+    path: str
+    # A(dded), D(eleted), R(enamed), M(odified) or F for formatting only
+    kind: str
+    # This file's part of the staged patch (see git.staged_patch)
+    patch: bytes
+
+
+def _file_patches(raw_patch: bytes) -> list[FilePatch]:
+    file_patches: list[FilePatch] = []
+    for patch in re.split(rb"(?m)^(?=diff --git )", raw_patch):
+        if not patch:
+            continue
+        file_diff: FileDiff = next(
+            iter_file_diffs(patch.decode("utf-8", errors="replace").splitlines())
+        )
+        kind: str = change_status(file_diff)
+        if kind == "M" and file_diff.whitespace_only and not file_diff.binary:
+            kind = "F"
+        file_patches.append(FilePatch(file_diff.path, kind, patch))
+    return file_patches
+
+
+def _stem(path: str) -> str:
+    # "src/test_parser.py", "src/parser.test.ts" and "src/parser.h" -> "parser"
+    name: str = os.path.basename(path)
+    return _TEST_AFFIXES.sub("", name.split(".", 1)[0]) or name
+
+
+def _is_test(path: str) -> bool:
+    name: str = os.path.basename(path).split(".", 1)[0]
+    return bool(_TEST_AFFIXES.search(name)) or not _TEST_DIRECTORIES.isdisjoint(
+        path.split("/")[:-1]
+    )
+
+
+def _same_unit(first: str, second: str) -> bool:
+    # A source file and its header or test: "parser.c" and "parser.h", or
+    # "src/parser.py" and "tests/test_parser.py"
+    if _stem(first) != _stem(second):
+        return False
+    return os.path.dirname(first) == os.path.dirname(second) or (
+        _is_test(first) != _is_test(second)
+    )
+
+
+def _coupled(first: set[int], second: set[int]) -> bool:
+    shared: int = len(first & second)
+    return shared >= COUPLED_COMMITS and 2 * shared >= min(len(first), len(second))
+
+
+def group_files(file_patches: list[FilePatch]) -> list[list[FilePatch]]:
+    from .history import co_changes
+
+    # Union-find over the files; each group keeps the diff's file order
+    parent: list[int] = list(range(len(file_patches)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        parent[find(j)] = find(i)
+
+    history: dict[str, set[int]] = co_changes(
+        file_patch.path for file_patch in file_patches
+    )
+    for i, first in enumerate(file_patches):
+        for j in range(i + 1, len(file_patches)):
+            second: FilePatch = file_patches[j]
+            if (
+                (
+                    os.path.dirname(first.path) == os.path.dirname(second.path)
+                    and first.kind == second.kind
+                )
+                or _same_unit(first.path, second.path)
+                or _coupled(history.get(first.path, set()), history.get(second.path, set()))
+            ):
+                union(i, j)
+
+    groups: dict[int, list[FilePatch]] = {}
+    for i, file_patch in enumerate(file_patches):
+        groups.setdefault(find(i), []).append(file_patch)
+    return list(groups.values())
+
+
+def _generate_for_group(
+    group: list[FilePatch], use_cache: bool, fast_path: bool, profile: str | None
+) -> CommitMessage | TrivialChange:
+    from .generate import generate_for_diff
+
+    diff_text: str = b"".join(file_patch.patch for file_patch in group).decode(
+        "utf-8", errors="replace"
+    )
+    # The index holds every group's changes, but each file is in one group
+    # only, so its index version is the one this group commits
+    formatted_diff: FormattedDiff = build_diff(
+        diff_text, revisions=Revisions("HEAD", "")
+    )
+    if formatted_diff.trivial is not None and fast_path:
+        return formatted_diff.trivial
+    return generate_for_diff(
+        formatted_diff, diff_text.splitlines, use_cache=use_cache, profile=profile
+    )
+
+
+def _full_message(message: CommitMessage | TrivialChange) -> str:
+    if message.commit_description:
+        return f"{message.commit_message}\n\n{message.commit_description}"
+    return message.commit_message
+
+
+def split(
+    commit_args: list[str],
+    workers: int | None = None,
+    use_cache: bool = True,
+    fast_path: bool = True,
+    profile: str | None = None,
+) -> bool:
+    from .generate import warm_up
+
+    if workers is None:
+        workers = get_int("SPLIT_WORKERS", 8)
+    if {"-a", "--all", "--amend"} & set(commit_args):
+        print("--split commits staged changes only; it can't be combined with -a or --amend.")
+        return False
+    fast_path = fast_path and fast_path_enabled()
+
+    try:
+        staged_tree: str = write_tree()
+        file_patches: list[FilePatch] = _file_patches(staged_patch())
+    except subprocess.CalledProcessError:
+        print("Can't read the staged changes; resolve any conflicts first.")
+        return False
+    if not file_patches:
+        print("No changes staged for commit.")
+        return False
+
+    groups: list[list[FilePatch]] = group_files(file_patches)
+    print(f"Generating messages for {len(groups)} groups with {workers} workers...")
+    warm_up()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        messages: list[CommitMessage | TrivialChange] = list(
+            executor.map(
+                lambda group: _generate_for_group(group, use_cache, fast_path, profile),
+                groups,
+            )
+        )
+
+    for number, (group, message) in enumerate(zip(groups, messages), start=1):
+        print(f"\n{number}. {message.commit_message}")
+        for file_patch in group:
+            print(f"     {file_patch.path}")
+    user_input = (
+        input(f"\nCreate {len(groups)} commits with these messages? (Y/n): ")
+        .strip()
+        .lower()
+    )
+    if user_input not in ["y", ""]:
+        print("Split cancelled.")
+        return False
+
+    # Start from HEAD's tree and stage one group at a time. Should a hook or
+    # patch fail, the index goes back to everything that was staged, so what
+    # wasn't committed yet is staged again.
+    committed: int = 0
+    try:
+        read_tree("HEAD")
+        for group, message in zip(groups, messages):
+            apply_to_index(b"".join(file_patch.patch for file_patch in group))
+            commit(commit_args, _full_message(message))
+            record_commit()
+            committed += 1
+    except (subprocess.CalledProcessError, KeyboardInterrupt) as e:
+        read_tree(staged_tree)
+        print(f"Stopped after {committed} of {len(groups)} commits: {e}")
+        return False
+    print(f"Created {committed} commits.")
+    return True
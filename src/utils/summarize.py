@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import contextvars
+import os
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from .cache import DiskCache, make_key
+from .config import get_int
+from .diff import FileDiff, format_file_diff, iter_file_diffs, use_compact_encoding
+from .filters import FileFilter
+from .generate import generate_from_summaries
+from .prompts import CHUNK_PROMPT, CHUNK_PROMPT_SYSTEM, PROMPT_VERSION
+from .routing import models_key, route_model
+from .tokenizer import CHARS_PER_TOKEN, approx_token_count
+from .trace import span
+
+if TYPE_CHECKING:
+    from .schemas import CommitMessage
+
+# Chunks always end after a directory whose path hashes to 0 mod ANCHOR_EVERY.
+# When one directory grows, only the chunks up to the next anchor shift; every
+# other chunk keeps its exact content and is served from the cache.
+ANCHOR_EVERY: int = 4
+
+
+def _is_anchor(directory: str) -> bool:
+    return zlib.crc32(directory.encode("utf-8")) % ANCHOR_EVERY == 0
+
+
+def _file_blocks(file_diff: FileDiff, chunk_tokens: int) -> Iterator[str]:
+    block: str = format_file_diff(file_diff)
+    if approx_token_count(block) <= chunk_tokens:
+        yield block
+        return
+
+    # Split an oversized file into parts at change-line boundaries
+    max_chars: int = chunk_tokens * CHARS_PER_TOKEN
+    part: list[str] = []
+    part_chars: int = 0
+    part_number: int = 1
+    for change in file_diff.changes:
+        if part and part_chars + len(change) > max_chars:
+            yield _format_part(file_diff.path, part_number, part)
+            part, part_chars, part_number = [], 0, part_number + 1
+        part.append(change)
+        part_chars += len(change) + 1
+    if part:
+        yield _format_part(file_diff.path, part_number, part)
+
+
+def _format_part(path: str, part_number: int, changes: list[str]) -> str:
+    return f"File: {path} (part {part_number})\nChanges:\n" + "\n".join(changes) + "\n\n"
+
+
+def iter_chunks(file_diffs: Iterable[FileDiff], chunk_tokens: int) -> Iterator[str]:
+    current: list[str] = []
+    current_tokens: int = 0
+    current_dir: str | None = None
+
+    for file_diff in file_diffs:
+        directory: str = os.path.dirname(file_diff.path)
+        for block in _file_blocks(file_diff, chunk_tokens):
+            block_tokens: int = approx_token_count(block)
+            at_anchor: bool = (
+                current_dir is not None
+                and directory != current_dir
+                and _is_anchor(current_dir)
+            )
+            if current and (at_anchor or current_tokens + block_tokens > chunk_tokens):
+                yield "".join(current)
+                current, current_tokens = [], 0
+            current.append(block)
+            current_tokens += block_tokens
+            current_dir = directory
+
+    if current:
+        yield "".join(current)
+
+
+def _summarize_chunk(chunk: str, use_cache: bool) -> str:
+    from .llm_wrapper import chat
+    from .schemas import ChunkSummary
+
+    cache: DiskCache = DiskCache("chunks")
+    cache_key: str = make_key(PROMPT_VERSION, models_key(), chunk)
+    with span("summarize.chunk", bytes=len(chunk)) as chunk_span:
+        if use_cache:
+            cached: str | None = cache.get(cache_key)
+            chunk_span.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+
+        # Only a miss needs a model
+        model: str = route_model(chunk)
+        response: ChunkSummary = chat(
+            system_prompt=CHUNK_PROMPT_SYSTEM(),
+            user_prompt=CHUNK_PROMPT(chunk),
+            response_model=ChunkSummary,
+            model=model,
+        )
+    cache.set(cache_key, response.summary)
+    return response.summary
+
+
+def _summarize_all(chunks: Iterable[str], use_cache: bool) -> list[str]:
+    workers: int = get_int("SUMMARY_WORKERS", 8)
+    summaries: dict[int, str] = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: dict[Future, int] = {}
+        for index, chunk in enumerate(chunks):
+            # Backpressure: the diff is only read as fast as chunks get
+            # summarized, so at most 2x workers chunks are held in memory
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    summaries[pending.pop(future)] = future.result()
+            # The copied context keeps profile spans nested under the caller's
+            future: Future = executor.submit(
+                contextvars.copy_context().run, _summarize_chunk, chunk, use_cache
+            )
+            pending[future] = index
+        for future, index in pending.items():
+            summaries[index] = future.result()
+    return [summaries[index] for index in sorted(summaries)]
+
+
+def summarize_diff(
+    lines: Iterable[str],
+    use_cache: bool = True,
+    profile: str | None = None,
+    examples: list[str] | None = None,
+    repo_dir: str | None = None,
+) -> CommitMessage:
+    chunk_tokens: int = get_int("SUMMARY_CHUNK_TOKENS", 8000)
+    max_tokens: int = get_int("MAX_TOKENS_ALLOWED", 30000)
+
+    compact: bool = use_compact_encoding()
+    file_filter: FileFilter = FileFilter(repo_dir=repo_dir)
+    try:
+        file_diffs: Iterable[FileDiff] = iter_file_diffs(
+            lines, file_filter=file_filter, keep_hunks=compact
+        )
+        if compact:
+            from .compact import iter_compacted
+
+            file_diffs = iter_compacted(file_diffs)
+        with span("summarize.map") as map_span:
+            summaries: list[str] = _summarize_all(
+                iter_chunks(file_diffs, chunk_tokens), use_cache
+            )
+            map_span.set(chunks=len(summaries))
+    finally:
+        file_filter.close()
+    # Reduce further while the summaries themselves don't fit the final prompt
+    while len(summaries) > 1 and approx_token_count("\n\n".join(summaries)) > max_tokens:
+        groups: list[str] = []
+        group: list[str] = []
+        for summary in summaries:
+            if group and approx_token_count("\n\n".join([*group, summary])) > chunk_tokens:
+                groups.append("\n\n".join(group))
+                group = []
+            group.append(summary)
+        groups.append("\n\n".join(group))
+        if len(groups) == len(summaries):
+            break  # Each summary alone fills a chunk; nothing left to merge
+        summaries = _summarize_all(groups, use_cache)
+
+    return generate_from_summaries(
+        summaries, use_cache, profile=profile, examples=examples
+    )
@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import ast
+import hashlib
+import os
+import re
+import subprocess
+from dataclasses import dataclass
+from typing import Callable
+
+from .config import get_int
+from .diff import FileDiff
+from .git import Revisions
+from .trace import span
+
+# SYMBOLS=on compares the old and new version of every changed Python and
+# JS/TS file and describes the change by symbol ("added function `f`",
+# "changed signature of `User.to_dict` to `(self, full=False)`"). Those lines
+# go first in the prompt; the line diff gets what is left of the budget.
+
+PYTHON_EXTENSIONS: tuple[str, ...] = (".py", ".pyi")
+SCRIPT_EXTENSIONS: tuple[str, ...] = (
+    ".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".mts", ".cts"
+)
+# Bigger files are left to the line diff
+MAX_SOURCE_BYTES: int = 1024 * 1024
+# Below this much source, starting worker processes costs more than it saves
+POOL_MIN_BYTES: int = 512 * 1024
+MAX_SIGNATURE_CHARS: int = 80
+# Past this, the rest of a file's changes are only counted
+MAX_FILE_CHANGES: int = 25
+
+_WHITESPACE: re.Pattern = re.compile(r"\s+")
+_PLURALS: dict[str, str] = {"class": "classes"}
+
+
+@dataclass
+class _Symbol:
+    kind: str
+    name: str
+    signature: str
+    # Digest of what counts as modifying the symbol
+    body: str
+    # Digest of the whole definition apart from its name, to recognize renames
+    content: str
+    line: int
+
+
+def supports(path: str) -> bool:
+    return path.endswith(PYTHON_EXTENSIONS + SCRIPT_EXTENSIONS)
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+_DEFINITIONS: tuple[type, ...] = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def _python_signature(node: ast.FunctionDef | ast.AsyncFunctionDef) -> str:
+    signature: str = f"({ast.unparse(node.args)})"
+    if node.returns is not None:
+        signature += f" -> {ast.unparse(node.returns)}"
+    return signature
+
+
+def _python_symbols(source: str) -> list[_Symbol] | None:
+    try:
+        tree: ast.Module = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    # Symbols are compared by their source lines with all whitespace removed,
+    # so reformatting is not a change. Much faster than comparing ast.dump().
+    lines: list[str] = [_WHITESPACE.sub("", line) for line in source.splitlines()]
+    symbols: list[_Symbol] = []
+
+    def visit(body: list[ast.stmt], prefix: str) -> None:
+        for node in body:
+            if not isinstance(node, _DEFINITIONS):
+                continue
+            start: int = min(d.lineno for d in [node, *node.decorator_list]) - 1
+            text: str = "".join(lines[start : node.end_lineno])
+            # Without the name, so a renamed symbol has the same content
+            content: str = _digest(text.replace(node.name, "", 1))
+            if isinstance(node, ast.ClassDef):
+                bases: list[str] = [ast.unparse(b) for b in node.bases + node.keywords]
+                # The class itself changes only outside its methods and nested classes
+                members: set[int] = {
+                    line
+                    for member in node.body
+                    if isinstance(member, _DEFINITIONS)
+                    for line in range(
+                        min(d.lineno for d in [member, *member.decorator_list]) - 1,
+                        member.end_lineno,
+                    )
+                }
+                own_text: str = "".join(
+                    lines[line]
+                    for line in range(start, node.end_lineno)
+                    if line not in members
+                )
+                symbols.append(
+                    _Symbol(
+                        "class",
+                        prefix + node.name,
+                        f"({', '.join(bases)})",
+                        _digest(own_text),
+                        content,
+                        node.lineno,
+                    )
+                )
+                visit(node.body, f"{prefix}{node.name}.")
+            else:
+                symbols.append(
+                    _Symbol(
+                        "method" if prefix else "function",
+                        prefix + node.name,
+                        _python_signature(node),
+                        _digest(text),
+                        content,
+                        node.lineno,
+                    )
+                )
+
+    visit(tree.body, "")
+    return symbols
+
+
+_SCRIPT_PATTERNS: list[tuple[str, re.Pattern]] = [
+    (
+        "function",
+        re.compile(
+            r"^(?P<indent>\s*)(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*"
+            r"(?P<name>[\w$]+)\s*(?:<[^>]*>)?\s*(?P<signature>\([^)]*\))"
+        ),
+    ),
+    (
+        "class",
+        re.compile(
+            r"^(?P<indent>\s*)(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+"
+            r"(?P<name>[\w$]+)(?P<signature>[^{]*)"
+        ),
+    ),
+    (
+        "function",
+        re.compile(
+            r"^(?P<indent>\s*)(?:export\s+)?(?:const|let|var)\s+(?P<name>[\w$]+)\s*"
+            r"(?::[^=]+)?=\s*(?:async\s+)?(?P<signature>\([^)]*\)|[\w$]+)\s*(?::[^=]+)?=>"
+        ),
+    ),
+    (
+        "type",
+        re.compile(
+            r"^(?P<indent>\s*)(?:export\s+)?(?:declare\s+)?(?:interface|type|enum)\s+"
+            r"(?P<name>[\w$]+)(?P<signature>)"
+        ),
+    ),
+]
+_SCRIPT_METHOD: re.Pattern = re.compile(
+    r"^(?P<indent>\s+)"
+    r"(?:(?:public|private|protected|static|async|readonly|override|get|set)\s+)*"
+    r"(?P<name>[\w$]+)\s*(?:<[^>]*>)?\s*(?P<signature>\([^)]*\))\s*(?::[^{]+)?\{"
+)
+_NOT_METHODS: frozenset[str] = frozenset(
+    ["if", "for", "while", "switch", "catch", "function", "return", "with"]
+)
+
+
+def _script_symbols(source: str) -> list[_Symbol]:
+    # Line-based: good enough for conventionally formatted code, and never
+    # fails on syntax it doesn't know
+    lines: list[str] = source.splitlines()
+    starts: list[tuple[int, str, str, str]] = []  # (line, kind, name, signature)
+    class_name: str | None = None
+    class_indent: int = 0
+    for index, line in enumerate(lines):
+        stripped: str = line.strip()
+        if class_name is not None and stripped:
+            # A class ends at the first line indented no deeper than itself
+            if len(line) - len(line.lstrip()) <= class_indent:
+                class_name = None
+                if stripped.startswith("}"):
+                    continue
+        if class_name is not None:
+            match: re.Match | None = _SCRIPT_METHOD.match(line)
+            if match and match.group("name") not in _NOT_METHODS:
+                name: str = f"{class_name}.{match.group('name')}"
+                starts.append((index, "method", name, match.group("signature")))
+                continue
+        for kind, pattern in _SCRIPT_PATTERNS:
+            match = pattern.match(line)
+            if match:
+                name = match.group("name")
+                starts.append((index, kind, name, match.group("signature")))
+                if kind == "class":
+                    class_name = match.group("name")
+                    class_indent = len(match.group("indent"))
+                break
+
+    symbols: list[_Symbol] = []
+    for position, (index, kind, name, signature) in enumerate(starts):
+        # A symbol's body runs to the next symbol; whitespace doesn't count
+        end: int = starts[position + 1][0] if position + 1 < len(starts) else len(lines)
+        first_line: str = _WHITESPACE.sub("", lines[index])
+        body: str = _WHITESPACE.sub("", "".join(lines[index + 1 : end]))
+        own_name: str = name.rpartition(".")[2]
+        symbols.append(
+            _Symbol(
+                kind,
+                name,
+                " ".join(signature.split()),
+                _digest(first_line + body),
+                _digest(first_line.replace(own_name, "", 1) + body),
+                index + 1,
+            )
+        )
+    return symbols
+
+
+def _parser(path: str) -> Callable[[str], list[_Symbol] | None]:
+    return _python_symbols if path.endswith(PYTHON_EXTENSIONS) else _script_symbols
+
+
+def _short(signature: str) -> str:
+    if len(signature) <= MAX_SIGNATURE_CHARS:
+        return signature
+    return signature[: MAX_SIGNATURE_CHARS - 3] + "..."
+
+
+def _find_renames(
+    before: dict[str, _Symbol], after: dict[str, _Symbol], classes: bool
+) -> dict[str, str]:
+    renames: dict[str, str] = {}
+    for name, symbol in after.items():
+        if name in before or (symbol.kind == "class") != classes:
+            continue
+        for old_name, old_symbol in before.items():
+            if (
+                old_name not in after
+                and old_name not in renames
+                and old_symbol.kind == symbol.kind
+                and old_symbol.content == symbol.content
+            ):
+                renames[old_name] = name
+                break
+    return renames
+
+
+def file_symbol_changes(
+    path: str, old: str | None, new: str | None
+) -> list[str] | None:
+    """Describe how the symbols of one file changed; None if either side won't parse."""
+    parse: Callable[[str], list[_Symbol] | None] = _parser(path)
+    old_symbols: list[_Symbol] | None = parse(old) if old is not None else []
+    new_symbols: list[_Symbol] | None = parse(new) if new is not None else []
+    if old_symbols is None or new_symbols is None:
+        return None
+
+    before: dict[str, _Symbol] = {symbol.name: symbol for symbol in old_symbols}
+    after: dict[str, _Symbol] = {symbol.name: symbol for symbol in new_symbols}
+
+    # A symbol that disappeared and one that appeared with the same content
+    # were renamed. Classes go first, so the members of a renamed class are
+    # then compared by name like any other.
+    renames: dict[str, str] = _find_renames(before, after, classes=True)
+    for old_name, name in renames.items():
+        for member in [m for m in before if m.startswith(f"{old_name}.")]:
+            before.setdefault(name + member[len(old_name) :], before.pop(member))
+    renames.update(_find_renames(before, after, classes=False))
+
+    # (sort key, verb, kind, name, detail): the new file's order, removed last
+    changes: list[tuple[tuple[int, int], str, str, str, str]] = [
+        ((0, after[name].line), "renamed", after[name].kind, old_name, f" to `{name}`")
+        for old_name, name in renames.items()
+    ]
+    for name, symbol in after.items():
+        previous: _Symbol | None = before.get(name)
+        if name in renames.values():
+            continue
+        position: tuple[int, int] = (0, symbol.line)
+        if previous is None:
+            changes.append((position, "added", symbol.kind, name, ""))
+        elif previous.signature != symbol.signature:
+            verb: str = "changed bases of" if symbol.kind == "class" else "changed signature of"
+            detail: str = f" to `{_short(symbol.signature)}`"
+            changes.append((position, verb, symbol.kind, name, detail))
+        elif previous.body != symbol.body:
+            changes.append((position, "modified", symbol.kind, name, ""))
+    changes += [
+        ((1, symbol.line), "removed", symbol.kind, name, "")
+        for name, symbol in before.items()
+        if name not in after and name not in renames
+    ]
+    changes.sort()
+    more: int = max(len(changes) - MAX_FILE_CHANGES, 0)
+    return _describe(changes[:MAX_FILE_CHANGES]) + ([f"{more} more"] if more else [])
+
+
+def _describe(changes: list[tuple[tuple[int, int], str, str, str, str]]) -> list[str]:
+    # Runs of the same plain change are listed together:
+    # "added functions `a`, `b`", "modified method `C.d`"
+    descriptions: list[str] = []
+    run: list[str] = []
+    for index, (_, verb, kind, name, detail) in enumerate(changes):
+        if detail:
+            descriptions.append(f"{verb} {kind} `{name}`{detail}")
+            continue
+        run.append(f"`{name}`")
+        following: tuple | None = changes[index + 1] if index + 1 < len(changes) else None
+        if following is None or following[1:3] != (verb, kind) or following[4]:
+            plural: str = _PLURALS.get(kind, f"{kind}s") if len(run) > 1 else kind
+            descriptions.append(f"{verb} {plural} {', '.join(run)}")
+            run = []
+    return descriptions
+
+
+def _file_symbol_changes(job: tuple[str, str | None, str | None]) -> list[str] | None:
+    return file_symbol_changes(*job)
+
+
+class _BlobReader:
+    # One `git cat-file --batch` process serves every blob of the diff
+
+    def __init__(self, repo_dir: str | None):
+        self.repo_dir: str | None = repo_dir
+        location: list[str] = ["-C", repo_dir] if repo_dir else []
+        self.process: subprocess.Popen = subprocess.Popen(
+            ["git", *location, "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self.top_level: str | None = None
+
+    def read(self, revision: str | None, path: str) -> str | None:
+        if revision is None:
+            return self._read_working_tree(path)
+        self.process.stdin.write(f"{revision}:{path}\n".encode("utf-8"))
+        self.process.stdin.flush()
+        header: list[bytes] = self.process.stdout.readline().split()
+        if len(header) != 3 or header[1] != b"blob":
+            return None  # Missing on this side: added or deleted
+        size: int = int(header[2])
+        content: bytes = self.process.stdout.read(size + 1)[:size]
+        if size > MAX_SOURCE_BYTES:
+            raise ValueError(f"{path} is too large")
+        return content.decode("utf-8", errors="replace")
+
+    def _read_working_tree(self, path: str) -> str | None:
+        if self.top_level is None:
+            # Diff paths are relative to the top of the repository
+            self.top_level = subprocess.check_output(
+                ["git", "rev-parse", "--show-toplevel"], cwd=self.repo_dir, text=True
+            ).strip()
+        full_path: str = os.path.join(self.top_level, path)
+        if not os.path.isfile(full_path):
+            return None
+        if os.path.getsize(full_path) > MAX_SOURCE_BYTES:
+            raise ValueError(f"{path} is too large")
+        with open(full_path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+    def close(self) -> None:
+        self.process.stdin.close()
+        self.process.wait()
+
+
+def symbol_changes(
+    file_diffs: list[FileDiff], revisions: Revisions
+) -> dict[str, list[str]]:
+    """Symbol-level changes per path, for the files that can be parsed."""
+    with span("symbols") as symbols_span:
+        jobs: list[tuple[str, str | None, str | None]] = []
+        reader: _BlobReader = _BlobReader(revisions.repo_dir)
+        try:
+            for file_diff in file_diffs:
+                if (
+                    file_diff.filtered is not None
+                    or file_diff.binary
+                    or not supports(file_diff.path)
+                ):
+                    continue
+                try:
+                    old: str | None = reader.read(
+                        revisions.old, file_diff.old_path or file_diff.path
+                    )
+                    new: str | None = reader.read(revisions.new, file_diff.path)
+                except ValueError:
+                    continue
+                jobs.append((file_diff.path, old, new))
+        finally:
+            reader.close()
+
+        source_bytes: int = sum(len(old or "") + len(new or "") for _, old, new in jobs)
+        workers: int = min(get_int("SYMBOL_WORKERS", os.cpu_count() or 1), len(jobs))
+        if workers > 1 and source_bytes >= POOL_MIN_BYTES:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results: list[list[str] | None] = list(
+                    executor.map(_file_symbol_changes, jobs, chunksize=4)
+                )
+        else:
+            workers = 1
+            results = [_file_symbol_changes(job) for job in jobs]
+
+        changes: dict[str, list[str]] = {
+            path: result for (path, _, _), result in zip(jobs, results) if result
+        }
+        symbols_span.set(
+            files=len(jobs),
+            described=len(changes),
+            source_bytes=source_bytes,
+            workers=workers,
+        )
+    return changes
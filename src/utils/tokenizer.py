@@ -0,0 +1,80 @@
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from .config import get_config, get_cache_dir
+from .trace import span
+
+if TYPE_CHECKING:
+    import tiktoken
+
+TOKENIZER_MODEL: str = "gpt-4o"
+# Rough characters-per-token ratio for code; errs on the side of overcounting
+CHARS_PER_TOKEN: int = 3
+
+
+def get_tokenizer_dir() -> str:
+    return get_config().get("TOKENIZER_DIR") or os.path.join(
+        get_cache_dir(), "tiktoken"
+    )
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> "tiktoken.Encoding | None":
+    # tiktoken keeps downloaded BPE files in TIKTOKEN_CACHE_DIR. Pointing it at a
+    # directory we own means the ranks are fetched at most once and every later
+    # load is a local file read, even with no network.
+    tokenizer_dir: str = get_tokenizer_dir()
+    os.makedirs(tokenizer_dir, exist_ok=True)
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", tokenizer_dir)
+
+    with span("tokenizer.load") as load_span:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+        except Exception:
+            # Offline with nothing cached yet; callers fall back to approximate counts
+            load_span.set(fallback=True)
+            return None
+
+
+def byte_bound(text: str) -> int:
+    # Every BPE token covers at least one byte, so this never undercounts
+    return len(text.encode("utf-8"))
+
+
+def approx_token_count(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def count_tokens(text: str) -> int:
+    encoding: "tiktoken.Encoding | None" = get_encoding()
+    if encoding is None:
+        return approx_token_count(text)
+    return len(encoding.encode_ordinary(text))
+
+
+def count_tokens_batch(texts: list[str]) -> list[int]:
+    encoding: "tiktoken.Encoding | None" = get_encoding()
+    with span("tokenize") as tokenize_span:
+        if encoding is None:
+            counts: list[int] = [approx_token_count(text) for text in texts]
+        else:
+            counts = [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+        tokenize_span.set(texts=len(texts), tokens=sum(counts))
+    return counts
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if byte_bound(text) <= max_tokens:
+        return text
+    encoding: "tiktoken.Encoding | None" = get_encoding()
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    with span("truncate", bytes=byte_bound(text)) as truncate_span:
+        tokens: list[int] = encoding.encode_ordinary(text)
+        truncate_span.set(tokens=len(tokens))
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
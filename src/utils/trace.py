@@ -0,0 +1,216 @@
+import atexit
+import contextvars
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+# Phase timing for `--profile` and GENCOMMIT_PROFILE. Instrumented code wraps
+# each phase in `with span("name", key=value) as s:` and may add counts with
+# `s.set(...)`. While tracing is off, span() hands back one shared no-op object,
+# so the instrumentation costs a global lookup and a method call per phase.
+
+_tracer: "_Tracer | None" = None
+# Names of the spans enclosing the current one
+_parents: contextvars.ContextVar[tuple[str, ...]] = contextvars.ContextVar(
+    "gencommit_trace_parents", default=()
+)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+    def set(self, **attrs: object) -> None:
+        pass
+
+
+_NOOP_SPAN: _NoopSpan = _NoopSpan()
+
+
+@dataclass
+class SpanRecord:
+    name: str
+    start_ns: int
+    duration_ns: int
+    parents: tuple[str, ...]
+    thread: int
+    attrs: dict[str, object] = field(default_factory=dict)
+
+
+class _Span:
+    def __init__(self, tracer: "_Tracer", name: str, attrs: dict[str, object]):
+        self.tracer: _Tracer = tracer
+        self.name: str = name
+        self.attrs: dict[str, object] = attrs
+
+    def __enter__(self) -> "_Span":
+        self.parents: tuple[str, ...] = _parents.get()
+        self.token: contextvars.Token = _parents.set((*self.parents, self.name))
+        self.start_ns: int = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        duration_ns: int = time.perf_counter_ns() - self.start_ns
+        _parents.reset(self.token)
+        if exc_type is not None and not issubclass(exc_type, SystemExit):
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(
+            SpanRecord(
+                self.name,
+                self.start_ns - self.tracer.start_ns,
+                duration_ns,
+                self.parents,
+                threading.get_ident(),
+                self.attrs,
+            )
+        )
+
+    def set(self, **attrs: object) -> None:
+        self.attrs.update(attrs)
+
+
+Span = _Span | _NoopSpan
+
+
+class _Tracer:
+    def __init__(self, summary: bool, output: str | None, collect: str | None):
+        self.summary: bool = summary
+        self.output: str | None = output
+        self.collect: str | None = collect
+        self.start_ns: int = time.perf_counter_ns()
+        self.started_at: float = time.time()
+        self.records: list[SpanRecord] = []
+        self.lock: threading.Lock = threading.Lock()
+
+    def record(self, span_record: SpanRecord) -> None:
+        with self.lock:
+            self.records.append(span_record)
+
+    def finish(self) -> None:
+        total_ns: int = time.perf_counter_ns() - self.start_ns
+        records: list[SpanRecord] = sorted(self.records, key=lambda r: r.start_ns)
+        if self.summary:
+            _print_summary(records, total_ns)
+        if self.output:
+            if self.output.endswith(".jsonl"):
+                _write_jsonl(self.output, records, self.started_at, "w")
+            else:
+                _write_chrome_trace(self.output, records)
+            print(f"Wrote trace to {self.output}", file=sys.stderr)
+        if self.collect:
+            _write_jsonl(self.collect, records, self.started_at, "a")
+
+
+def enable(summary: bool = True, output: str | None = None) -> None:
+    """Start recording spans; the summary and trace files are written at exit.
+
+    GENCOMMIT_PROFILE=<path> additionally appends every run to a JSONL file.
+    """
+    global _tracer
+    collect: str | None = os.environ.get("GENCOMMIT_PROFILE")
+    if _tracer is not None or not (summary or output or collect):
+        return
+    _tracer = _Tracer(summary, output, collect and os.path.expanduser(collect))
+    atexit.register(_tracer.finish)
+
+
+def span(name: str, **attrs: object) -> Span:
+    if _tracer is None:
+        return _NOOP_SPAN
+    return _Span(_tracer, name, attrs)
+
+
+def _format_attrs(attrs: dict[str, object]) -> str:
+    return " ".join(f"{key}={value}" for key, value in attrs.items())
+
+
+def _tree_position(
+    folded: dict[tuple[str, ...], list[SpanRecord]], path: tuple[str, ...]
+) -> list[int]:
+    # Sorts every line right below its parent, siblings by first start. A
+    # parent with no record (still open at exit) takes its child's position.
+    return [
+        folded[path[: end + 1]][0].start_ns if path[: end + 1] in folded else 0
+        for end in range(len(path))
+    ]
+
+
+def _print_summary(records: list[SpanRecord], total_ns: int) -> None:
+    # Repeated spans under the same parents (one per file, chunk, ...) are
+    # folded into one line with their count, total time and summed numeric
+    # attributes; each line is printed below its parent
+    folded: dict[tuple[str, ...], list[SpanRecord]] = {}
+    for span_record in records:
+        folded.setdefault((*span_record.parents, span_record.name), []).append(span_record)
+
+    print(f"\ngencommit profile ({total_ns / 1e6:.1f}ms total)", file=sys.stderr)
+    for path in sorted(folded, key=lambda path: _tree_position(folded, path)):
+        group: list[SpanRecord] = folded[path]
+        depth: int = len(path) - 1
+        name: str = path[-1]
+        duration_ms: float = sum(r.duration_ns for r in group) / 1e6
+        attrs: dict[str, object] = dict(group[0].attrs)
+        if len(group) > 1:
+            for key in attrs:
+                values: list[object] = [r.attrs.get(key) for r in group]
+                if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                    attrs[key] = sum(values)
+            name = f"{name} x{len(group)}"
+        label: str = f"{'  ' * depth}{name}"
+        print(
+            f"  {label:<32} {duration_ms:9.1f}ms  {_format_attrs(attrs)}".rstrip(),
+            file=sys.stderr,
+        )
+
+
+def _write_jsonl(
+    path: str, records: list[SpanRecord], started_at: float, mode: str
+) -> None:
+    import json
+
+    run_id: str = f"{int(started_at * 1000)}-{os.getpid()}"
+    with open(path, mode) as f:
+        for span_record in records:
+            f.write(
+                json.dumps(
+                    {
+                        "run": run_id,
+                        "name": span_record.name,
+                        "start_ms": span_record.start_ns / 1e6,
+                        "duration_ms": span_record.duration_ns / 1e6,
+                        "parents": span_record.parents,
+                        "thread": span_record.thread,
+                        "attrs": span_record.attrs,
+                    },
+                    default=str,
+                )
+                + "\n"
+            )
+
+
+def _write_chrome_trace(path: str, records: list[SpanRecord]) -> None:
+    # Loadable in chrome://tracing and Perfetto
+    import json
+
+    events: list[dict] = [
+        {
+            "name": span_record.name,
+            "cat": "gencommit",
+            "ph": "X",
+            "ts": span_record.start_ns / 1e3,
+            "dur": span_record.duration_ns / 1e3,
+            "pid": os.getpid(),
+            "tid": span_record.thread,
+            "args": span_record.attrs,
+        }
+        for span_record in records
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
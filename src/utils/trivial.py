@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass
+
+from .config import get_config, get_int
+from .diff import SECTIONED_EXTENSIONS, FileDiff
+
+# Commits that need no model to describe: version bumps, lockfile updates,
+# formatting, renames and deletions. classify() looks at the parsed diff and
+# returns a ready message only when every file is one of these, and only when
+# it saw the whole change (nothing trimmed, no overlong lines).
+
+VERSION_FILES: frozenset[str] = frozenset(
+    [
+        "pyproject.toml",
+        "setup.py",
+        "setup.cfg",
+        "package.json",
+        "Cargo.toml",
+        "__init__.py",
+        "version.py",
+        "_version.py",
+        "__version__.py",
+        "VERSION",
+        "version.txt",
+    ]
+)
+# In INI-style files, the sections that hold the project's own version
+# rather than a dependency's ([dependencies.serde] version = "1.0.100")
+VERSION_SECTIONS: frozenset[str] = frozenset(
+    ["package", "project", "tool.poetry", "metadata", "workspace.package"]
+)
+# More kinds of change than this in one commit deserves a real description
+MAX_KINDS: int = 2
+
+_VERSION_LINE: re.Pattern = re.compile(
+    r"""^[-+] [\s"']*(?:__version__|version|VERSION)\b[\s"']*[:=]\s*["']?"""
+    r"""(?P<version>\d+(?:\.\d+)+[\w.+-]*)["']?,?$"""
+)
+_PLAIN_VERSION: re.Pattern = re.compile(r"^[-+] (?P<version>\d+(?:\.\d+)+[\w.+-]*)$")
+
+
+@dataclass
+class TrivialChange:
+    kind: str
+    commit_message: str
+    commit_description: str
+
+
+def fast_path_enabled() -> bool:
+    return get_config().get("FAST_PATH", "on") != "off"
+
+
+def _change_lines(file_diff: FileDiff) -> list[str] | None:
+    # Every +/- line of the file, or None if some were not kept or cut short
+    lines: list[str] = [c for c in file_diff.changes if c[:2] in ("+ ", "- ")]
+    if len(lines) != file_diff.total_changes:
+        return None
+    if file_diff.longest_line > get_int("MAX_LINE_LENGTH", 300) - 1:
+        return None
+    return lines
+
+
+def _version_bump(file_diff: FileDiff, lines: list[str]) -> tuple[str, str] | None:
+    if os.path.basename(file_diff.path) not in VERSION_FILES:
+        return None
+    if not lines or file_diff.additions != file_diff.deletions:
+        return None
+    if os.path.splitext(file_diff.path)[1] in SECTIONED_EXTENSIONS and not (
+        file_diff.sections <= VERSION_SECTIONS
+    ):
+        return None  # Another section's version, or no section in sight
+    versions: dict[str, list[str]] = {"-": [], "+": []}
+    for line in lines:
+        match: re.Match | None = _VERSION_LINE.match(line) or _PLAIN_VERSION.match(line)
+        if match is None:
+            return None
+        versions[line[0]].append(match.group("version"))
+    if versions["-"] == versions["+"]:
+        return None
+    return versions["-"][0], versions["+"][0]
+
+
+def _file_kind(file_diff: FileDiff) -> tuple[str, str] | None:
+    # (kind, description bullet) for a file that is a trivial change
+    if file_diff.deleted_file:
+        return "delete", f"Delete {file_diff.path}"
+    if file_diff.old_path is not None and not file_diff.total_changes:
+        return "rename", f"Rename {file_diff.old_path} to {file_diff.path}"
+    if file_diff.filtered == "lockfile":
+        counts: str = (
+            f" (+{file_diff.additions}/-{file_diff.deletions} lines)"
+            if file_diff.total_changes
+            else ""
+        )
+        return "lockfile", f"Update {file_diff.path}{counts}"
+    if file_diff.filtered is not None or file_diff.binary or file_diff.new_file:
+        return None
+
+    lines: list[str] | None = _change_lines(file_diff)
+    if not lines:
+        return None
+    bump: tuple[str, str] | None = _version_bump(file_diff, lines)
+    if bump is not None:
+        return "version", f"Bump version in {file_diff.path} from {bump[0]} to {bump[1]}"
+    if file_diff.whitespace_only:
+        return "format", f"Reformat {file_diff.path}"
+    return None
+
+
+def _common_dir(paths: list[str]) -> str:
+    return os.path.commonpath([os.path.dirname(path) for path in paths])
+
+
+def _title(kind: str, files: list[FileDiff], bullets: list[str]) -> str:
+    paths: list[str] = [file_diff.path for file_diff in files]
+    count: int = len(files)
+    if kind == "version":
+        versions: set[str] = {bullet.rsplit(" ", 1)[1] for bullet in bullets}
+        return f"Bump version to {versions.pop()}" if len(versions) == 1 else "Bump versions"
+    if kind == "lockfile":
+        return f"Update {os.path.basename(paths[0])}" if count == 1 else "Update lockfiles"
+    if kind == "format":
+        return f"Reformat {paths[0]}" if count == 1 else f"Reformat {count} files"
+    if kind == "rename":
+        if count == 1:
+            return bullets[0]
+        old_names: list[str] = [os.path.basename(f.old_path) for f in files]
+        destination: str = _common_dir(paths)
+        if old_names == [os.path.basename(path) for path in paths] and destination:
+            return f"Move {count} files to {destination}"
+        return f"Rename {count} files"
+    if count == 1:
+        return f"Delete {paths[0]}"
+    directory: str = _common_dir(paths)
+    return f"Delete {count} files in {directory}" if directory else f"Delete {count} files"
+
+
+def classify(file_diffs: list[FileDiff]) -> TrivialChange | None:
+    """A message for the whole change if it is trivial, else None."""
+    groups: dict[str, tuple[list[FileDiff], list[str]]] = {}
+    for file_diff in file_diffs:
+        kind_and_bullet: tuple[str, str] | None = _file_kind(file_diff)
+        if kind_and_bullet is None:
+            return None
+        kind, bullet = kind_and_bullet
+        files, bullets = groups.setdefault(kind, ([], []))
+        files.append(file_diff)
+        bullets.append(bullet)
+    if not groups or len(groups) > MAX_KINDS:
+        return None
+
+    # The most meaningful kind leads the title
+    order: list[str] = ["version", "lockfile", "format", "rename", "delete"]
+    kinds: list[str] = sorted(groups, key=order.index)
+    titles: list[str] = [_title(kind, *groups[kind]) for kind in kinds]
+    title: str = titles[0] + "".join(f" and {t[0].lower()}{t[1:]}" for t in titles[1:])
+    description: str = "\n".join(
+        f"- {bullet}" for kind in kinds for bullet in groups[kind][1]
+    )
+    return TrivialChange("+".join(kinds), title, description)
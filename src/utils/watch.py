@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import subprocess
+
+from .cache import DiskCache, make_key
+from .config import get_config, get_int
+from .diff import FormattedDiff, build_diff
+from .git import Revisions, git_path, rev_parse, stream_diff, write_tree
+from .profiles import get_profile
+from .prompts import PROMPT_VERSION
+from .trivial import fast_path_enabled
+
+POLL_INTERVAL: float = 0.2
+
+
+def speculative_key(head: str, tree: str, profile: str | None = None) -> str:
+    config: dict = get_config()
+    return make_key(
+        PROMPT_VERSION,
+        config.get("MODEL", ""),
+        config.get("MODEL_ROUTES", ""),
+        config.get("DIFF_FORMAT", "full"),
+        config.get("SYMBOLS", "off"),
+        config.get("FAST_PATH", "on"),
+        config.get("HISTORY_EXAMPLES", "0"),
+        get_profile(profile).name,
+        head,
+        tree,
+    )
+
+
+def get_speculative_message(head: str, profile: str | None = None) -> dict | None:
+    # Looked up by the CLI before doing any work of its own. Watch mode uses
+    # the configured profile, so another one never matches.
+    cache: DiskCache = DiskCache("speculative")
+    if not os.path.isdir(cache.directory):
+        return None  # Never watched; skip the write-tree spawn
+    try:
+        tree: str = write_tree()
+        if tree == rev_parse(f"{head}^{{tree}}"):
+            return None  # Nothing staged; the CLI says so itself
+    except subprocess.CalledProcessError:
+        return None
+    key: str = speculative_key(head, tree, profile)
+    cached: str | None = cache.get(key)
+    return json.loads(cached) if cached is not None else None
+
+
+def _staged_state() -> tuple[str, str] | None:
+    try:
+        head: str = rev_parse("HEAD")
+        tree: str = write_tree()
+        # Nothing staged, as after every commit: no message to prepare
+        if tree == rev_parse(f"{head}^{{tree}}"):
+            return None
+        return head, tree
+    except subprocess.CalledProcessError:
+        # No commits yet, or the index has unresolved conflicts
+        return None
+
+
+async def _generate(head: str, tree: str) -> None:
+    from .generate import agenerate_for_diff
+
+    formatted_diff: FormattedDiff = await asyncio.to_thread(
+        build_diff, stream_diff("--staged"), revisions=Revisions("HEAD", "")
+    )
+    if formatted_diff.trivial is not None and fast_path_enabled():
+        fields: dict = {
+            "commit_message": formatted_diff.trivial.commit_message,
+            "commit_description": formatted_diff.trivial.commit_description,
+        }
+    else:
+        message = await agenerate_for_diff(
+            formatted_diff, lambda: stream_diff("--staged")
+        )
+        fields = message.model_dump()
+    DiskCache("speculative").set(speculative_key(head, tree), json.dumps(fields))
+    print(f"Ready: {fields['commit_message']}")
+
+
+async def _watch(index_path: str, debounce: float) -> None:
+    last_stat: tuple[int, int] | None = None
+    changed_at: float | None = None
+    last_state: tuple[str, str] | None = None
+    task: asyncio.Task | None = None
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+
+    while True:
+        try:
+            stat: os.stat_result = os.stat(index_path)
+            current_stat: tuple[int, int] | None = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            current_stat = None
+        if current_stat != last_stat:
+            last_stat = current_stat
+            changed_at = loop.time()
+
+        # Wait for `git add` bursts to settle before starting a request
+        if changed_at is not None and loop.time() - changed_at >= debounce:
+            changed_at = None
+            state: tuple[str, str] | None = await asyncio.to_thread(_staged_state)
+            if state is not None and state != last_state:
+                last_state = state
+                head, tree = state
+                if task is not None and not task.done():
+                    task.cancel()  # Superseded by the newer staged tree
+                if DiskCache("speculative").get(speculative_key(head, tree)) is None:
+                    task = asyncio.create_task(_generate(head, tree))
+                    task.add_done_callback(_report_failure)
+
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+def _report_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error generating commit message: {task.exception()}")
+
+
+def watch() -> bool:
+    try:
+        index_path: str = git_path("index")
+    except subprocess.CalledProcessError:
+        print("Not a git repository.")
+        return False
+
+    debounce: float = get_int("WATCH_DEBOUNCE_MS", 500) / 1000
+    print(f"Watching {index_path} for staged changes (Ctrl-C to stop)")
+    try:
+        asyncio.run(_watch(index_path, debounce))
+    except KeyboardInterrupt:
+        pass
+    return True
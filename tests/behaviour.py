@@ -0,0 +1,294 @@
+import os
+import sys
+import tempfile
+import traceback
+import tracemalloc
+from typing import Callable
+
+# Behavioural checks for the diff heuristics: fixed diffs go through the same
+# functions the CLI uses and the results are asserted. No model, no network.
+# Run from the repo root:
+#
+#   python -m tests.behaviour
+
+CHECKS: list[Callable[[], None]] = []
+
+
+def check(function: Callable[[], None]) -> Callable[[], None]:
+    CHECKS.append(function)
+    return function
+
+
+def _diff(path: str, hunk: str, header: str = "") -> str:
+    # A one-file `git diff` with the given hunk body ("@@" line included)
+    return (
+        f"diff --git a/{path} b/{path}\n{header}"
+        f"--- a/{path}\n+++ b/{path}\n{hunk.strip(chr(10))}\n"
+    )
+
+
+def _trivial_kind(diff_text: str) -> str | None:
+    from src.utils.diff import build_diff
+
+    trivial = build_diff(diff_text).trivial
+    return trivial.kind if trivial is not None else None
+
+
+def _compacted(diff_text: str) -> list[str]:
+    from src.utils.compact import compact_file_diffs
+    from src.utils.diff import iter_file_diffs
+
+    file_diffs = list(iter_file_diffs(diff_text.splitlines(), keep_hunks=True))
+    compact_file_diffs(file_diffs)
+    return [change for file_diff in file_diffs for change in file_diff.changes]
+
+
+# Compact encoding (user-017)
+
+
+@check
+def python_block_change_is_shown() -> None:
+    # `return 1` leaves the if block and `return 2` enters it
+    changes: list[str] = _compacted(
+        _diff(
+            "src/flag.py",
+            """
+@@ -1,4 +1,4 @@ def flag(x):
+ def flag(x):
+     if x:
+-        return 1
+-    return 2
++        return 2
++    return 1
+""",
+        )
+    )
+    assert "-         return 1" in changes and "+     return 1" in changes, changes
+    assert not any(change.startswith("~") for change in changes), changes
+
+
+@check
+def reindented_javascript_is_counted() -> None:
+    changes: list[str] = _compacted(
+        _diff(
+            "src/app.js",
+            """
+@@ -1,4 +1,4 @@
+ function f() {
+-  if (x) {
+-  return 1;
++    if (x) {
++        return 1;
+ }
+""",
+        )
+    )
+    assert changes == ["~ 2 lines changed whitespace only"], changes
+
+
+@check
+def python_reorder_at_same_indent_is_counted() -> None:
+    changes: list[str] = _compacted(
+        _diff(
+            "src/order.py",
+            """
+@@ -1,4 +1,4 @@
+ def setup():
+-    load_config()
+     connect()
++    load_config()
+""",
+        )
+    )
+    assert changes[-1] == "~ 1 line reordered", changes
+
+
+# Trivial changes (user-019)
+
+
+@check
+def reformat_is_trivial() -> None:
+    diff_text: str = _diff(
+        "src/app.js",
+        """
+@@ -1,3 +1,3 @@
+ function f() {
+-  return foo( 1,2 );
++  return foo(1, 2);
+ }
+""",
+    )
+    assert _trivial_kind(diff_text) == "format"
+
+
+@check
+def space_inside_string_is_a_change() -> None:
+    diff_text: str = _diff(
+        "src/join.py",
+        """
+@@ -1,2 +1,2 @@
+ def render(items):
+-    return ", ".join(items)
++    return ",".join(items)
+""",
+    )
+    assert _trivial_kind(diff_text) is None
+
+
+@check
+def space_between_operators_is_a_change() -> None:
+    diff_text: str = _diff(
+        "src/neg.c",
+        """
+@@ -1,3 +1,3 @@
+ int f(int a, int b) {
+-  return a - -b;
++  return a --b;
+ }
+""",
+    )
+    assert _trivial_kind(diff_text) is None
+
+
+@check
+def dependency_version_is_not_a_version_bump() -> None:
+    diff_text: str = _diff(
+        "Cargo.toml",
+        """
+@@ -10,3 +10,3 @@ edition = "2021"
+ [dependencies.serde]
+-version = "1.0.100"
++version = "1.0.200"
+ features = ["derive"]
+""",
+    )
+    assert _trivial_kind(diff_text) is None
+
+
+@check
+def version_without_its_section_is_not_a_version_bump() -> None:
+    diff_text: str = _diff(
+        "pyproject.toml",
+        """
+@@ -40,3 +40,3 @@
+ name = "lib"
+-version = "1.0.0"
++version = "1.1.0"
+ optional = true
+""",
+    )
+    assert _trivial_kind(diff_text) is None
+
+
+@check
+def package_version_is_a_version_bump() -> None:
+    diff_text: str = _diff(
+        "Cargo.toml",
+        """
+@@ -1,4 +1,4 @@
+ [package]
+ name = "app"
+-version = "1.0.0"
++version = "1.1.0"
+ edition = "2021"
+""",
+    )
+    assert _trivial_kind(diff_text) == "version"
+
+
+@check
+def reformat_check_memory_is_bounded() -> None:
+    from src.utils.diff import iter_file_diffs
+
+    # A 20 MB new file, in one run of added lines
+    def lines():
+        yield "diff --git a/dump.sql b/dump.sql"
+        yield "new file mode 100644"
+        yield "--- /dev/null"
+        yield "+++ b/dump.sql"
+        yield "@@ -0,0 +1,200000 @@"
+        for i in range(200_000):
+            yield f"+INSERT INTO t VALUES ({i}, 'row {i} with some padding text to be long');"
+
+    tracemalloc.start()
+    try:
+        file_diff = next(iter_file_diffs(lines()))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert not file_diff.whitespace_only
+    assert peak < 5 * 1024 * 1024, f"peak {peak / 1024 / 1024:.1f} MB"
+
+
+# Splitting staged changes (user-025)
+
+
+def _groups(diff_text: str) -> list[list[str]]:
+    from src.utils.split import _file_patches, group_files
+
+    return [
+        [file_patch.path for file_patch in group]
+        for group in group_files(_file_patches(diff_text.encode("utf-8")))
+    ]
+
+
+def _one_line_change(path: str) -> str:
+    return _diff(path, "@@ -1 +1 @@\n-old = 1\n+new = 1")
+
+
+@check
+def source_and_test_are_grouped() -> None:
+    groups: list[list[str]] = _groups(
+        _one_line_change("src/parser.py")
+        + _one_line_change("docs/guide.md")
+        + _one_line_change("tests/test_parser.py")
+    )
+    assert groups == [
+        ["src/parser.py", "tests/test_parser.py"],
+        ["docs/guide.md"],
+    ], groups
+
+
+@check
+def same_directory_groups_by_kind() -> None:
+    groups: list[list[str]] = _groups(
+        _one_line_change("src/api.py")
+        + _diff("src/new.py", "@@ -0,0 +1 @@\n+x = 1", header="new file mode 100644\n")
+        + _one_line_change("src/cli.py")
+        + _diff(
+            "src/style.py",
+            "@@ -1 +1 @@\n-x=foo( 1,2 )\n+x = foo(1, 2)",
+        )
+    )
+    assert groups == [
+        ["src/api.py", "src/cli.py"],
+        ["src/new.py"],
+        ["src/style.py"],
+    ], groups
+
+
+def run_checks() -> bool:
+    passed: bool = True
+    for function in CHECKS:
+        try:
+            function()
+            print(f"OK   {function.__name__}")
+        except Exception:
+            passed = False
+            print(f"FAIL {function.__name__}")
+            traceback.print_exc()
+    return passed
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as home:
+        # Before anything under src is imported: the config location is
+        # resolved at import time
+        os.environ["HOME"] = home
+        os.environ.pop("XDG_CACHE_HOME", None)
+        with open(os.path.join(home, ".gen-commit"), "w") as f:
+            f.write("MODEL=openai:gencommit-check\nOPENAI_API_KEY=sk-check\n")
+        if not run_checks():
+            print("\nBehaviour checks failed.")
+            sys.exit(1)
+    print("\nAll behaviour checks passed.")
@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from tests.corpus import DEFAULT_SIZES, SIZES, build_synthetic_repo, fixture_cases
+from tests.stub_server import StubServer
+
+# Offline end-to-end benchmark: the CLI pipeline, stage by stage, against a
+# local stub LLM server. Run from the repo root:
+#
+#   python -m tests.benchmark [--sizes 1KB,10MB] [--full] [--latency 0.2]
+#                             [--output results.json] [--baseline previous.json]
+
+STAGES: list[str] = ["config", "git", "format_diff", "tokenize", "request", "commit"]
+# Stage timings below this are too noisy to compare between runs
+NOISE_FLOOR_SECONDS: float = 0.005
+BENCH_IDENTITY: dict[str, str] = {
+    "GIT_AUTHOR_NAME": "gencommit bench",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_NAME": "gencommit bench",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+}
+
+
+class _StageTimer:
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = time.perf_counter() - start_time
+
+
+def _isolate(home: str, base_url: str) -> None:
+    # Must run before anything under src is imported: the config location is
+    # resolved at import time
+    os.environ["HOME"] = home
+    os.environ.pop("XDG_CACHE_HOME", None)
+    os.environ.update(BENCH_IDENTITY)
+    with open(os.path.join(home, ".gen-commit"), "w") as f:
+        f.write(
+            "MODEL=openai:gencommit-bench\n"
+            "OPENAI_API_KEY=sk-bench\n"
+            f"OPENAI_BASE_URL={base_url}\n"
+        )
+
+
+def _run_fixture(diff_text: str) -> dict[str, float]:
+    from src.utils.config import get_config
+    from src.utils.diff import FormattedDiff, build_diff
+    from src.utils.generate import _prepare_request, _request_commit_message
+    from src.utils.profiles import ResponseProfile, get_profile
+
+    timer: _StageTimer = _StageTimer()
+    with timer.stage("config"):
+        get_config.cache_clear()
+        get_config()
+    with timer.stage("format_diff"):
+        formatted_diff: FormattedDiff = build_diff(diff_text)
+    with timer.stage("tokenize"):
+        profile: ResponseProfile = get_profile(None)
+        system_prompt, user_prompt, model, cache_key = _prepare_request(
+            formatted_diff.text, profile
+        )
+    with timer.stage("request"):
+        _request_commit_message(
+            system_prompt, user_prompt, model, cache_key, False, None, profile
+        )
+    return timer.durations
+
+
+def _run_repo(repo_dir: str) -> dict[str, float]:
+    from src.utils.config import get_config
+    from src.utils.diff import FormattedDiff, build_diff
+    from src.utils.generate import _prepare_request, _request_commit_message
+    from src.utils.git import DiffSnapshot, commit
+    from src.utils.profiles import ResponseProfile, get_profile
+
+    timer: _StageTimer = _StageTimer()
+    with timer.stage("config"):
+        get_config.cache_clear()
+        get_config()
+    # The patch streams into the formatter, so reading it is part of
+    # format_diff; "git" is the spawn and the file list
+    with timer.stage("git"):
+        snapshot: DiffSnapshot = DiffSnapshot("--staged")
+        snapshot.files
+    with timer.stage("format_diff"):
+        formatted_diff: FormattedDiff = build_diff(snapshot.lines())
+    with timer.stage("tokenize"):
+        profile: ResponseProfile = get_profile(None)
+        system_prompt, user_prompt, model, cache_key = _prepare_request(
+            formatted_diff.text, profile
+        )
+    with timer.stage("request"):
+        message = _request_commit_message(
+            system_prompt, user_prompt, model, cache_key, False, None, profile
+        )
+    with timer.stage("commit"):
+        commit(
+            ["-q", "--no-verify"],
+            f"{message.commit_message}\n\n{message.commit_description}",
+        )
+
+    # Put the change back in the index for the next run
+    subprocess.run(["git", "reset", "-q", "--soft", "HEAD~1"], check=True)
+    return timer.durations
+
+
+def _diff_bytes(repo_dir: str) -> int:
+    # Counted in chunks so measuring a huge diff doesn't inflate peak RSS
+    with subprocess.Popen(
+        ["git", "diff", "--staged"], cwd=repo_dir, stdout=subprocess.PIPE
+    ) as process:
+        return sum(len(chunk) for chunk in iter(lambda: process.stdout.read(1 << 20), b""))
+
+
+def _peak_rss_mb() -> float:
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, kilobytes on Linux
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def _summarize_runs(
+    name: str, kind: str, diff_bytes: int, files: int, runs: list[dict[str, float]]
+) -> dict:
+    stages: dict[str, float | None] = {
+        stage: (
+            statistics.median(run[stage] for run in runs) if stage in runs[0] else None
+        )
+        for stage in STAGES
+    }
+    return {
+        "name": name,
+        "kind": kind,
+        "diff_bytes": diff_bytes,
+        "files": files,
+        "runs": len(runs),
+        "stages": stages,
+        "total": sum(duration for duration in stages.values() if duration is not None),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _print_case(case: dict) -> None:
+    timings: str = " ".join(
+        f"{stage}={case['stages'][stage] * 1000:.1f}ms"
+        for stage in STAGES
+        if case["stages"][stage] is not None
+    )
+    print(
+        f"{case['name']:<22} {case['diff_bytes'] / 1024:>10.1f}KB "
+        f"total={case['total'] * 1000:.1f}ms {timings} rss={case['peak_rss_mb']}MB"
+    )
+
+
+def run_benchmarks(sizes: list[str], runs: int, latency: float) -> dict:
+    """Benchmark the fixture diffs and synthetic repos of the given sizes."""
+
+    cases: list[dict] = []
+    with tempfile.TemporaryDirectory() as tmp_dir, StubServer(latency=latency) as stub:
+        home: str = os.path.join(tmp_dir, "home")
+        os.makedirs(home)
+        _isolate(home, stub.base_url)
+
+        for fixture in fixture_cases():
+            case: dict = _summarize_runs(
+                fixture.name,
+                "fixture",
+                len(fixture.diff_text.encode("utf-8")),
+                fixture.diff_text.count("diff --git"),
+                [_run_fixture(fixture.diff_text) for _ in range(runs)],
+            )
+            _print_case(case)
+            cases.append(case)
+
+        original_dir: str = os.getcwd()
+        for size in sizes:
+            repo_dir: str = os.path.join(tmp_dir, f"repo-{size}")
+            files: int = build_synthetic_repo(repo_dir, SIZES[size])
+            diff_bytes: int = _diff_bytes(repo_dir)
+            os.chdir(repo_dir)
+            try:
+                # Very large cases are slow enough that one run is representative
+                case_runs: int = runs if SIZES[size] <= SIZES["10MB"] else 1
+                case = _summarize_runs(
+                    f"synthetic {size}",
+                    "synthetic",
+                    diff_bytes,
+                    files,
+                    [_run_repo(repo_dir) for _ in range(case_runs)],
+                )
+            finally:
+                os.chdir(original_dir)
+            _print_case(case)
+            cases.append(case)
+
+        requests: int = stub.requests
+
+    from src.utils.config import read_version_from_pyproject
+
+    return {
+        "version": read_version_from_pyproject(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "git": subprocess.run(
+            ["git", "--version"], capture_output=True, text=True
+        ).stdout.strip(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "latency_seconds": latency,
+        "stub_requests": requests,
+        "cases": cases,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return a line for every stage that got slower than baseline by more than tolerance."""
+
+    previous: dict[str, dict] = {case["name"]: case for case in baseline["cases"]}
+    regressions: list[str] = []
+    for case in results["cases"]:
+        old_case: dict | None = previous.get(case["name"])
+        if old_case is None:
+            continue
+        for stage in STAGES:
+            new: float | None = case["stages"].get(stage)
+            old: float | None = old_case["stages"].get(stage)
+            if new is None or old is None or max(new, old) < NOISE_FLOOR_SECONDS:
+                continue
+            if new > old * (1 + tolerance):
+                regressions.append(
+                    f"{case['name']}: {stage} {old * 1000:.1f}ms -> {new * 1000:.1f}ms"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    arg_parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Offline gencommit benchmark against a local stub LLM server"
+    )
+    arg_parser.add_argument(
+        "--sizes",
+        default=",".join(DEFAULT_SIZES),
+        help=f"Comma-separated synthetic diff sizes from {', '.join(SIZES)}",
+    )
+    arg_parser.add_argument(
+        "--full", action="store_true", help="Run every size, up to hundreds of MB"
+    )
+    arg_parser.add_argument("--runs", type=int, default=3)
+    arg_parser.add_argument(
+        "--latency", type=float, default=0.0, help="Stub server delay in seconds"
+    )
+    arg_parser.add_argument("--output", default="benchmark-results.json")
+    arg_parser.add_argument("--baseline", help="Previous results to compare against")
+    arg_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown per stage before it counts as a regression",
+    )
+    args = arg_parser.parse_args()
+
+    sizes: list[str] = list(SIZES) if args.full else args.sizes.split(",")
+    unknown: list[str] = [size for size in sizes if size not in SIZES]
+    if unknown:
+        arg_parser.error(f"Unknown sizes: {', '.join(unknown)}")
+
+    results: dict = run_benchmarks(sizes, args.runs, args.latency)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions: list[str] = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against baseline.")
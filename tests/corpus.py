@@ -0,0 +1,365 @@
+import os
+import random
+import subprocess
+from dataclasses import dataclass
+from typing import Iterator
+
+# Synthetic files are split into modules of this size, so large cases have
+# realistic file counts instead of one enormous file
+SYNTHETIC_FILE_BYTES: int = 128 * 1024
+# Every Nth line of a synthetic module is rewritten in the staged change
+CHANGE_EVERY: int = 8
+
+SIZES: dict[str, int] = {
+    "1KB": 1024,
+    "100KB": 100 * 1024,
+    "1MB": 1024**2,
+    "10MB": 10 * 1024**2,
+    "100MB": 100 * 1024**2,
+    "300MB": 300 * 1024**2,
+}
+DEFAULT_SIZES: list[str] = ["1KB", "100KB", "1MB", "10MB"]
+
+
+@dataclass
+class FixtureCase:
+    name: str
+    diff_text: str
+
+
+class FakeGitDiffs:
+    """Collection of fake git diffs for testing gencommit performance."""
+
+    @staticmethod
+    def small_python_change() -> str:
+        """Small Python file modification."""
+        return """diff --git a/src/main.py b/src/main.py
+index 1234567..abcdefg 100644
+--- a/src/main.py
++++ b/src/main.py
+@@ -10,7 +10,8 @@ def calculate_total(items):
+     total = 0
+     for item in items:
+-        total += item.price
++        # Apply discount if available
++        total += item.price * (1 - item.discount)
+     return total
+ 
+ def process_order(order):"""
+
+    @staticmethod
+    def medium_javascript_refactor() -> str:
+        """Medium-sized JavaScript refactoring."""
+        return """diff --git a/frontend/components/UserProfile.js b/frontend/components/UserProfile.js
+index abcd123..efgh456 100644
+--- a/frontend/components/UserProfile.js
++++ b/frontend/components/UserProfile.js
+@@ -1,15 +1,22 @@
+-import React from 'react';
++import React, { useState, useEffect } from 'react';
++import { fetchUserData } from '../api/users';
+ 
+-const UserProfile = ({ user }) => {
++const UserProfile = ({ userId }) => {
++  const [user, setUser] = useState(null);
++  const [loading, setLoading] = useState(true);
++
++  useEffect(() => {
++    const loadUser = async () => {
++      try {
++        const userData = await fetchUserData(userId);
++        setUser(userData);
++      } catch (error) {
++        console.error('Failed to load user:', error);
++      } finally {
++        setLoading(false);
++      }
++    };
++    loadUser();
++  }, [userId]);
++
++  if (loading) return <div>Loading...</div>;
+   return (
+     <div className="user-profile">
+       <h2>{user.name}</h2>
+-      <p>{user.email}</p>
++      <p>Email: {user.email}</p>
++      <p>Joined: {new Date(user.createdAt).toLocaleDateString()}</p>
+     </div>
+   );
+ };"""
+
+    @staticmethod
+    def large_database_migration() -> str:
+        """Large database migration with multiple tables."""
+        return """diff --git a/migrations/001_add_user_preferences.sql b/migrations/001_add_user_preferences.sql
+new file mode 100644
+index 0000000..1234567
+--- /dev/null
++++ b/migrations/001_add_user_preferences.sql
+@@ -0,0 +1,45 @@
++-- Add user preferences table
++CREATE TABLE user_preferences (
++    id SERIAL PRIMARY KEY,
++    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
++    theme VARCHAR(20) DEFAULT 'light',
++    language VARCHAR(10) DEFAULT 'en',
++    timezone VARCHAR(50) DEFAULT 'UTC',
++    email_notifications BOOLEAN DEFAULT true,
++    push_notifications BOOLEAN DEFAULT true,
++    marketing_emails BOOLEAN DEFAULT false,
++    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
++    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
++);
++
++-- Add indexes for better query performance
++CREATE INDEX idx_user_preferences_user_id ON user_preferences(user_id);
++CREATE INDEX idx_user_preferences_theme ON user_preferences(theme);
++CREATE INDEX idx_user_preferences_language ON user_preferences(language);
++
++-- Add trigger to update updated_at timestamp
++CREATE OR REPLACE FUNCTION update_updated_at_column()
++RETURNS TRIGGER AS $$
++BEGIN
++    NEW.updated_at = CURRENT_TIMESTAMP;
++    RETURN NEW;
++END;
++$$ language 'plpgsql';
++
++CREATE TRIGGER update_user_preferences_updated_at
++    BEFORE UPDATE ON user_preferences
++    FOR EACH ROW
++    EXECUTE FUNCTION update_updated_at_column();
++
++-- Insert default preferences for existing users
++INSERT INTO user_preferences (user_id)
++SELECT id FROM users WHERE id NOT IN (SELECT user_id FROM user_preferences);
++
++-- Add new columns to users table
++ALTER TABLE users ADD COLUMN last_login_at TIMESTAMP;
++ALTER TABLE users ADD COLUMN login_count INTEGER DEFAULT 0;
++ALTER TABLE users ADD COLUMN is_premium BOOLEAN DEFAULT false;
++
++-- Create index on new columns
++CREATE INDEX idx_users_last_login ON users(last_login_at);
++CREATE INDEX idx_users_is_premium ON users(is_premium);"""
+
+    @staticmethod
+    def config_file_changes() -> str:
+        """Configuration file updates."""
+        return """diff --git a/config/database.yml b/config/database.yml
+index abc123..def456 100644
+--- a/config/database.yml
++++ b/config/database.yml
+@@ -1,8 +1,12 @@
+ development:
+   adapter: postgresql
+   encoding: unicode
+-  database: myapp_development
++  database: myapp_dev
+   pool: 5
+-  username: postgres
+-  password: password
++  username: <%= ENV['DB_USERNAME'] %>
++  password: <%= ENV['DB_PASSWORD'] %>
+   host: localhost
++  port: 5432
++  timeout: 5000
++  prepared_statements: false
++  advisory_locks: true
+
+diff --git a/config/redis.conf b/config/redis.conf
+index 789abc..012def 100644
+--- a/config/redis.conf
++++ b/config/redis.conf
+@@ -50,10 +50,15 @@ save 900 1
+ save 300 10
+ save 60 10000
+ 
+-maxmemory 2gb
++maxmemory 4gb
+ maxmemory-policy allkeys-lru
++maxmemory-samples 5
+ 
+ # Network
+ bind 127.0.0.1
+-port 6379
++port <%= ENV['REDIS_PORT'] || 6379 %>
+ timeout 0
++tcp-keepalive 300
++tcp-backlog 511
++
++# Security
++requirepass <%= ENV['REDIS_PASSWORD'] %>"""
+
+    @staticmethod
+    def multi_file_feature() -> str:
+        """Multiple files changed for a new feature."""
+        return """diff --git a/src/api/auth.py b/src/api/auth.py
+new file mode 100644
+index 0000000..1234567
+--- /dev/null
++++ b/src/api/auth.py
+@@ -0,0 +1,25 @@
++from flask import Blueprint, request, jsonify
++from werkzeug.security import check_password_hash
++from models.user import User
++from utils.jwt_handler import generate_token
++
++auth_bp = Blueprint('auth', __name__)
++
++@auth_bp.route('/login', methods=['POST'])
++def login():
++    data = request.get_json()
++    email = data.get('email')
++    password = data.get('password')
++    
++    user = User.query.filter_by(email=email).first()
++    
++    if user and check_password_hash(user.password_hash, password):
++        token = generate_token(user.id)
++        return jsonify({
++            'success': True,
++            'token': token,
++            'user': user.to_dict()
++        })
++    
++    return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+
+diff --git a/src/models/user.py b/src/models/user.py
+index abc123..def456 100644
+--- a/src/models/user.py
++++ b/src/models/user.py
+@@ -1,4 +1,5 @@
+ from sqlalchemy import Column, Integer, String, DateTime, Boolean
++from werkzeug.security import generate_password_hash
+ from database import db
+ import datetime
+ 
+@@ -8,8 +9,18 @@ class User(db.Model):
+     email = Column(String(120), unique=True, nullable=False)
+     password_hash = Column(String(128), nullable=False)
+     is_active = Column(Boolean, default=True)
++    is_verified = Column(Boolean, default=False)
+     created_at = Column(DateTime, default=datetime.datetime.utcnow)
++    last_login = Column(DateTime)
+ 
+     def __repr__(self):
+         return f'<User {self.email}>'
++    
++    def set_password(self, password):
++        self.password_hash = generate_password_hash(password)
++    
++    def to_dict(self):
++        return {
++            'id': self.id,
++            'email': self.email,
++            'is_active': self.is_active
++        }
+
+diff --git a/tests/test_auth.py b/tests/test_auth.py
+new file mode 100644
+index 0000000..7890abc
+--- /dev/null
++++ b/tests/test_auth.py
+@@ -0,0 +1,20 @@
++import pytest
++from app import create_app
++from models.user import User
++
++@pytest.fixture
++def client():
++    app = create_app('testing')
++    with app.test_client() as client:
++        yield client
++
++def test_login_success(client):
++    # Create test user
++    user = User(email='test@example.com')
++    user.set_password('password123')
++    
++    response = client.post('/api/auth/login', json={
++        'email': 'test@example.com',
++        'password': 'password123'
++    })
++    assert response.status_code == 200"""
+
+
+def fixture_cases() -> list[FixtureCase]:
+    """The hand-written diffs: the small end of the corpus."""
+    return [
+        FixtureCase("Small Python Change", FakeGitDiffs.small_python_change()),
+        FixtureCase("Medium JS Refactor", FakeGitDiffs.medium_javascript_refactor()),
+        FixtureCase("Large DB Migration", FakeGitDiffs.large_database_migration()),
+        FixtureCase("Config File Changes", FakeGitDiffs.config_file_changes()),
+        FixtureCase("Multi-file Feature", FakeGitDiffs.multi_file_feature()),
+    ]
+
+
+def _synthetic_line(rng: random.Random, index: int) -> str:
+    indent: str = "    " * rng.randint(0, 3)
+    kind: int = rng.randint(0, 4)
+    if kind == 0:
+        return f"{indent}value_{index} = compute_{rng.randrange(500)}(items[{index}], scale={rng.random():.4f})\n"
+    if kind == 1:
+        return f"{indent}if record.status_{rng.randrange(50)} == {rng.randrange(10000)}:\n"
+    if kind == 2:
+        return f"{indent}# Adjust the {rng.choice(('cache', 'queue', 'index', 'buffer'))} for batch {index}\n"
+    if kind == 3:
+        return f"{indent}return handler_{rng.randrange(200)}.process(payload, retries={rng.randint(1, 5)})\n"
+    return f"{indent}logger.debug(\"step %d of %d\", {index}, {rng.randrange(100000)})\n"
+
+
+def _synthetic_module(rng: random.Random, size: int) -> Iterator[str]:
+    written: int = 0
+    index: int = 0
+    while written < size:
+        line: str = _synthetic_line(rng, index)
+        written += len(line)
+        index += 1
+        yield line
+
+
+def build_synthetic_repo(repo_dir: str, target_bytes: int, seed: int = 0) -> int:
+    """Create a repo whose staged diff is roughly target_bytes; returns the file count.
+
+    A base revision of generated Python modules is committed, then every
+    CHANGE_EVERY-th line is rewritten and staged. Output is deterministic for
+    a given seed, so results are comparable between runs.
+    """
+    subprocess.run(["git", "init", "-q", repo_dir], check=True)
+    # With context lines the hunks cover the whole module, and each rewritten
+    # line appears twice, so the diff comes out ~1.2x the base size
+    base_bytes: int = max(target_bytes * 5 // 6, 256)
+    file_count: int = max(1, -(-base_bytes // SYNTHETIC_FILE_BYTES))
+    file_bytes: int = -(-base_bytes // file_count)
+
+    paths: list[str] = []
+    for number in range(file_count):
+        path: str = os.path.join(f"pkg_{number // 64}", f"module_{number}.py")
+        os.makedirs(os.path.join(repo_dir, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(repo_dir, path), "w") as f:
+            f.writelines(_synthetic_module(random.Random(seed * 1_000_003 + number), file_bytes))
+        paths.append(path)
+    _git(repo_dir, "add", "-A")
+    _git(repo_dir, "commit", "-q", "-m", "Base revision")
+
+    rng: random.Random = random.Random(seed)
+    for path in paths:
+        full_path: str = os.path.join(repo_dir, path)
+        with open(full_path) as f:
+            lines: list[str] = f.readlines()
+        for index in range(rng.randrange(CHANGE_EVERY), len(lines), CHANGE_EVERY):
+            lines[index] = _synthetic_line(rng, index)
+        with open(full_path, "w") as f:
+            f.writelines(lines)
+    _git(repo_dir, "add", "-A")
+    return file_count
+
+
+def _git(repo_dir: str, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com", *args],
+        cwd=repo_dir,
+        check=True,
+    )
@@ -0,0 +1,114 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES: list[str] = ["tiktoken", "openai", "pydantic"]
+
+# Allowed wall time on top of a bare `python -c pass`, per CLI path
+STARTUP_BUDGET_SECONDS: float = 0.15
+RUNS: int = 5
+
+RUNNER: str = """
+import atexit
+import sys
+
+atexit.register(
+    lambda: sys.stderr.write(
+        "HEAVY:" + ",".join(m for m in {heavy!r} if m in sys.modules) + "\\n"
+    )
+)
+sys.argv = ["gencommit", *{args!r}]
+from src.gencommit import gencommit
+
+gencommit()
+"""
+
+
+def _run(args: list[str], cwd: str, home: str, stdin: str = "") -> tuple[float, str]:
+    env: dict[str, str] = {**os.environ, "HOME": home, "PYTHONPATH": REPO_ROOT}
+    start_time = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", RUNNER.format(heavy=HEAVY_MODULES, args=args)],
+        cwd=cwd,
+        env=env,
+        input=stdin,
+        capture_output=True,
+        text=True,
+    )
+    duration: float = time.perf_counter() - start_time
+    heavy: str = ""
+    for line in result.stderr.splitlines():
+        if line.startswith("HEAVY:"):
+            heavy = line[len("HEAVY:") :]
+    return duration, heavy
+
+
+def _median(
+    args: list[str], cwd: str, home: str, stdin: str = "", cleanup: str = ""
+) -> tuple[float, str]:
+    durations: list[float] = []
+    heavy: str = ""
+    for _ in range(RUNS):
+        duration, heavy = _run(args, cwd, home, stdin)
+        durations.append(duration)
+        if cleanup and os.path.exists(cleanup):
+            os.remove(cleanup)
+    return statistics.median(durations), heavy
+
+
+def _baseline() -> float:
+    durations: list[float] = []
+    for _ in range(RUNS):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        durations.append(time.perf_counter() - start_time)
+    return statistics.median(durations)
+
+
+def benchmark_startup_paths() -> bool:
+    """Measure cold-start time of the CLI paths that should never load heavy modules."""
+
+    baseline: float = _baseline()
+    print(f"Interpreter baseline: {baseline * 1000:.1f}ms")
+
+    passed: bool = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        empty_home: str = os.path.join(tmp_dir, "empty-home")
+        config_home: str = os.path.join(tmp_dir, "home")
+        repo_dir: str = os.path.join(tmp_dir, "repo")
+        for path in (empty_home, config_home, repo_dir):
+            os.makedirs(path)
+        with open(os.path.join(config_home, ".gen-commit"), "w") as f:
+            f.write("MODEL=openai:gpt-4o\nOPENAI_API_KEY=sk-test\n")
+        subprocess.run(["git", "init", "-q", repo_dir], check=True)
+
+        written_config: str = os.path.join(empty_home, ".gen-commit")
+        paths: list[tuple[str, list[str], str, str, str]] = [
+            ("--version", ["--version"], config_home, "", ""),
+            ("--init (no config)", ["--init"], empty_home, "", written_config),
+            ("--init (cancelled)", ["--init"], config_home, "n\n", ""),
+            ("no changes staged", [], config_home, "", ""),
+        ]
+        for test_name, args, home, stdin, cleanup in paths:
+            duration, heavy = _median(args, repo_dir, home, stdin, cleanup)
+            overhead: float = duration - baseline
+            ok: bool = overhead <= STARTUP_BUDGET_SECONDS and not heavy
+            passed = passed and ok
+            print(
+                f"{'OK  ' if ok else 'FAIL'} {test_name:<20} {duration * 1000:7.1f}ms "
+                f"(+{overhead * 1000:.1f}ms)"
+                + (f" loaded {heavy}" if heavy else "")
+            )
+
+    return passed
+
+
+if __name__ == "__main__":
+    if not benchmark_startup_paths():
+        print("\nStartup regression detected.")
+        sys.exit(1)
+    print("\nAll startup paths within budget.")
@@ -0,0 +1,169 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A stand-in for an OpenAI-compatible chat completions endpoint. It answers
+# every structured-output request with placeholder values for the schema's
+# fields after a configurable delay, so benchmarks measure gencommit itself
+# rather than a provider's latency on the day.
+
+STREAM_CHUNK_CHARS: int = 8
+
+
+def _placeholder(name: str, schema: dict) -> object:
+    if schema.get("type") == "integer":
+        return 0
+    if schema.get("type") == "boolean":
+        return False
+    if name == "commit_message":
+        return "Update synthetic modules"
+    return f"Stub {name.replace('_', ' ')}"
+
+
+def _response_content(request: dict) -> str:
+    schema: dict = (
+        request.get("response_format", {}).get("json_schema", {}).get("schema", {})
+    )
+    properties: dict = schema.get("properties", {})
+    return json.dumps(
+        {name: _placeholder(name, spec) for name, spec in properties.items()}
+    )
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, small replies
+    # would wait ~40ms on the client's delayed ACK
+    disable_nagle_algorithm = True
+    server: "_StubHTTPServer"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        request: dict = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+
+        content: str = _response_content(request)
+        completion: dict = {
+            "id": f"stub-{self.server.requests}",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+        }
+        if request.get("stream"):
+            self._stream(completion, content)
+            return
+
+        body: bytes = json.dumps(
+            {
+                **completion,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": len(json.dumps(request["messages"])) // 4,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": (len(json.dumps(request["messages"])) + len(content)) // 4,
+                },
+            }
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, completion: dict, content: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        deltas: list[dict] = [
+            {"content": content[start : start + STREAM_CHUNK_CHARS]}
+            for start in range(0, len(content), STREAM_CHUNK_CHARS)
+        ]
+        for index, delta in enumerate([*deltas, {}]):
+            chunk: dict = {
+                **completion,
+                "object": "chat.completion.chunk",
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": delta,
+                        "finish_reason": None if index < len(deltas) else "stop",
+                    }
+                ],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: str) -> None:
+        encoded: bytes = data.encode("utf-8")
+        self.wfile.write(f"{len(encoded):x}\r\n".encode() + encoded + b"\r\n")
+        self.wfile.flush()
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], latency: float):
+        super().__init__(address, _StubHandler)
+        self.latency: float = latency
+        self.requests: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+
+class StubServer:
+    """Runs the stub on a background thread; use as a context manager."""
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        self.server: _StubHTTPServer = _StubHTTPServer(("127.0.0.1", port), latency)
+        self.thread: threading.Thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self) -> int:
+        return self.server.requests
+
+    def __enter__(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    arg_parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description="Serve a stand-in OpenAI-compatible endpoint"
+    )
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds to wait before answering"
+    )
+    args = arg_parser.parse_args()
+
+    with StubServer(latency=args.latency, port=args.port) as stub:
+        print(f"Stub LLM server listening on {stub.base_url}")
+        try:
+            stub.thread.join()
+        except KeyboardInterrupt:
+            pass